@@ -0,0 +1,496 @@
+# -*- coding: utf-8 -*-
+
+# Run the Better Oblique filter over UFO or designspace sources without Glyphs:
+#
+#   python betterObliqueBatch.py --angle 10 MyFont-Regular.ufo MyFont.designspace
+#
+# Each glyph is read, sheared and written back by a worker process, so the throughput
+# scales with the number of processes (-j). Glyphs are streamed through the workers with a
+# bounded number in flight, so the memory use doesn't grow with the size of the font.
+
+from __future__ import division, print_function
+
+import sys
+import os
+if os.path.join(os.path.dirname(os.path.abspath(__file__)), 'site-packages') not in sys.path:
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'site-packages'))
+from betterObliqueFilter import shear_contours, shear_master_contours, find_contour_collisions, DEFAULT_TOLERANCE
+from betterObliqueCache import ShearCache, DEFAULT_MAX_SIZE
+import betterObliqueStats
+
+from fontTools.designspaceLib import DesignSpaceDocument
+from fontTools.ufoLib import UFOReader
+
+import argparse
+import itertools
+import math
+import multiprocessing
+import shutil
+import threading
+from collections import deque
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+OPTICAL_CORRECTIONS = ('none', 'thin', 'medium', 'thick')
+
+# Number of glyphs buffered between the steps of the pipeline, and the number of chunks of CHUNK_SIZE
+# glyphs in flight per worker process.
+QUEUE_SIZE = 16
+CHUNK_SIZE = 8
+
+
+class FontInfo(object):
+    pass
+
+
+class GlyphRecord(object):
+    # A glyph object for glifLib that records the outline through the point pen protocol.
+
+    def __init__(self):
+        self.contours = []
+        self.components = []
+        self._contour = None
+
+    def beginPath(self, identifier=None, **kwargs):
+        self._contour = {'identifier': identifier, 'points': []}
+
+    def addPoint(self, pt, segmentType=None, smooth=False, name=None, identifier=None, **kwargs):
+        self._contour['points'].append((pt[0], pt[1], segmentType or 'offcurve', smooth, name, identifier))
+
+    def endPath(self):
+        self.contours.append(self._contour)
+        self._contour = None
+
+    def addComponent(self, baseGlyphName, transformation, identifier=None, **kwargs):
+        self.components.append((baseGlyphName, transformation, identifier))
+
+    def drawPoints(self, point_pen):
+        for contour in self.contours:
+            point_pen.beginPath(identifier=contour['identifier'])
+            for x, y, node_type, smooth, name, identifier in contour['points']:
+                point_pen.addPoint((x, y), segmentType=None if node_type == 'offcurve' else node_type, smooth=smooth, name=name, identifier=identifier)
+            point_pen.endPath()
+        for base_glyph_name, transformation, identifier in self.components:
+            point_pen.addComponent(base_glyph_name, transformation, identifier=identifier)
+
+    def nodes(self):
+        return [[point[:3] for point in contour['points']] for contour in self.contours]
+
+    def shear(self, shear_angle, **kwargs):
+        self.set_results(shear_contours(self.nodes(), shear_angle, **kwargs))
+
+    def set_results(self, results):
+        for contour, (nodes, compatible) in zip(self.contours, results):
+            if compatible:
+                # Keep the point attributes when the structure has not changed.
+                contour['points'] = [(x, y, node_type) + point[3:] for (x, y, node_type), point in zip(nodes, contour['points'])]
+            else:
+                contour['points'] = [(x, y, node_type, False, None, None) for x, y, node_type in nodes]
+
+    def set_contours(self, results):
+        # Replaces the contours with the results of remove_overlaps(). The contours passed through keep
+        # their attributes. The new ones have none, except that their nodes are smooth where they were.
+        smooth_points = set(((x, y) for contour in self.contours for x, y, node_type, smooth, _, _ in contour['points'] if smooth))
+        contours = []
+        for nodes, index in results:
+            if index is not None:
+                contours.append(self.contours[index])
+            else:
+                contours.append({'identifier': None, 'points': [(x, y, node_type, node_type != 'offcurve' and (x, y) in smooth_points, None, None) for x, y, node_type in nodes]})
+        self.contours = contours
+
+
+_glyph_sets = {}
+
+def get_glyph_set(ufo_path, layer_name=None, writing=False):
+    # Glyph sets are opened once per worker process. The glyphs are written through a glyph set of their
+    # own, as GlyphSet is not thread-safe and run_pipeline() reads and writes in separate threads.
+    key = (ufo_path, layer_name, writing)
+    if key not in _glyph_sets:
+        _glyph_sets[key] = UFOReader(ufo_path, validate=False).getGlyphSet(layer_name)
+    return _glyph_sets[key]
+
+
+_cache = None
+
+_record_stats = False
+
+def init_process(cache_dir=None, cache_size=DEFAULT_MAX_SIZE, cache_used=None, stats=False):
+    # Sets up the main process and each worker process. Every process has its own ShearCache, and
+    # cache_used is the running size of the cache, shared by the processes (see ShearCache).
+    global _cache, _record_stats
+    _record_stats = stats
+    _cache = ShearCache(cache_dir, max_size=cache_size, size=cache_used) if cache_dir else None
+
+def init_worker_process(*args):
+    # The worker processes keep no stats of their own, e.g. inherited from the main process by fork.
+    # run_task() records each glyph alone and returns the record to the main process.
+    betterObliqueStats.disable()
+    init_process(*args)
+
+def get_cache():
+    return _cache
+
+
+class GlyphTask(object):
+    # Shear a glyph in a layer of a UFO. A task is read, sheared and written in separate steps, so that
+    # the steps of successive glyphs can overlap (see run_pipeline()).
+
+    def __init__(self, ufo_path, layer_name, glyph_name, options):
+        self.ufo_path = ufo_path
+        self.layer_name = layer_name
+        self.glyph_name = glyph_name
+        self.options = options
+
+    def read(self):
+        glyph = GlyphRecord()
+        get_glyph_set(self.ufo_path, self.layer_name).readGlyph(self.glyph_name, glyph, glyph)
+        return glyph
+
+    def shear(self, glyph):
+        # Returns the warnings about the glyph.
+        warnings = []
+        if glyph.contours:
+            options = dict(self.options)
+            check_collisions = options.pop('check_collisions', False)
+            overlaps = options.pop('remove_overlaps', False)
+            contours = glyph.nodes()
+            glyph.shear(cache=get_cache(), **options)
+            if check_collisions:
+                warnings.extend(format_collisions(find_contour_collisions(glyph.nodes(), contours)))
+            if overlaps:
+                from betterObliqueOverlaps import remove_overlaps
+                glyph.set_contours(remove_overlaps(glyph.nodes()))
+        return warnings
+
+    def write(self, glyph):
+        if glyph.contours:
+            get_glyph_set(self.ufo_path, self.layer_name, writing=True).writeGlyph(self.glyph_name, glyph, glyph.drawPoints)
+
+
+class MasterGlyphTask(object):
+    # Shear a glyph in all the sources at once, so that the results stay compatible.
+
+    def __init__(self, sources, glyph_name, options):
+        self.sources = sources
+        self.glyph_name = glyph_name
+        self.options = options
+
+    def read(self):
+        glyphs = []
+        for ufo_path, layer_name, _, _ in self.sources:
+            glyph = GlyphRecord()
+            get_glyph_set(ufo_path, layer_name).readGlyph(self.glyph_name, glyph, glyph)
+            glyphs.append(glyph)
+        return glyphs
+
+    def shear(self, glyphs):
+        # Returns the warnings about the glyph.
+        warnings = []
+        if any((glyph.contours for glyph in glyphs)):
+            options = dict(self.options)
+            std_vw = options.pop('std_vw')
+            std_hw = options.pop('std_hw')
+            check_collisions = options.pop('check_collisions', False)
+            # Removing the overlaps would break the compatibility; main() does not allow it.
+            options.pop('remove_overlaps', None)
+            options['stems'] = [(source_std_vw if std_vw is None else std_vw, source_std_hw if std_hw is None else std_hw) for _, _, source_std_vw, source_std_hw in self.sources]
+            contours_list = [glyph.nodes() for glyph in glyphs]
+            for glyph, results in zip(glyphs, shear_master_contours(contours_list, cache=get_cache(), **options)):
+                glyph.set_results(results)
+            if check_collisions:
+                for (ufo_path, layer_name, _, _), glyph, contours in zip(self.sources, glyphs, contours_list):
+                    source_name = os.path.basename(ufo_path) if layer_name is None else '{0} ({1})'.format(os.path.basename(ufo_path), layer_name)
+                    warnings.extend(format_collisions(find_contour_collisions(glyph.nodes(), contours), source_name))
+        return warnings
+
+    def write(self, glyphs):
+        if any((glyph.contours for glyph in glyphs)):
+            for (ufo_path, layer_name, _, _), glyph in zip(self.sources, glyphs):
+                get_glyph_set(ufo_path, layer_name, writing=True).writeGlyph(self.glyph_name, glyph, glyph.drawPoints)
+
+
+def format_error(e):
+    return '{0}: {1}'.format(type(e).__name__, e)
+
+def format_collisions(collisions, source_name=None):
+    suffix = '' if source_name is None else ' in {0}'.format(source_name)
+    return ['contours {0} and {1} collide after shearing{2}'.format(i, j, suffix) for i, j in collisions]
+
+def run_task(task):
+    # Read, shear and write the glyph of the task. Returns (glyph name, error, stats, warnings).
+    with betterObliqueStats.record(task.glyph_name, local=_record_stats) as glyph_stats:
+        try:
+            data = task.read()
+            warnings = task.shear(data)
+            task.write(data)
+        except Exception as e:
+            return task.glyph_name, format_error(e), glyph_stats, []
+    return task.glyph_name, None, glyph_stats, warnings
+
+def run_task_chunk(tasks):
+    return [run_task(task) for task in tasks]
+
+def run_pipeline(tasks, queue_size=QUEUE_SIZE):
+    # Run the tasks in a single process, with the glyphs read and written in threads of their own so that
+    # reading, shearing and writing overlap. The bounded queues between the steps keep at most about
+    # 2 * queue_size glyphs in memory. Yields (glyph name, error, stats, warnings) as the glyphs are written.
+    read_queue = queue.Queue(maxsize=queue_size)
+    write_queue = queue.Queue(maxsize=queue_size)
+    done_queue = queue.Queue()
+
+    def read_glyphs():
+        try:
+            for task in tasks:
+                try:
+                    read_queue.put((task, task.read(), None))
+                except Exception as e:
+                    read_queue.put((task, None, format_error(e)))
+        finally:
+            read_queue.put(None)
+
+    def write_glyphs():
+        while True:
+            item = write_queue.get()
+            if item is None:
+                break
+            task, data, glyph_stats, warnings = item
+            try:
+                task.write(data)
+            except Exception as e:
+                done_queue.put((task.glyph_name, format_error(e), glyph_stats, warnings))
+            else:
+                done_queue.put((task.glyph_name, None, glyph_stats, warnings))
+
+    reader = threading.Thread(target=read_glyphs)
+    writer = threading.Thread(target=write_glyphs)
+    reader.daemon = writer.daemon = True
+    reader.start()
+    writer.start()
+    try:
+        while True:
+            item = read_queue.get()
+            if item is None:
+                break
+            task, data, error = item
+            if error is not None:
+                done_queue.put((task.glyph_name, error, None, []))
+            else:
+                with betterObliqueStats.record(task.glyph_name) as glyph_stats:
+                    try:
+                        warnings = task.shear(data)
+                    except Exception as e:
+                        error = format_error(e)
+                if error is not None:
+                    done_queue.put((task.glyph_name, error, glyph_stats, []))
+                else:
+                    write_queue.put((task, data, glyph_stats, warnings))
+            while not done_queue.empty():
+                yield done_queue.get()
+    finally:
+        write_queue.put(None)
+        writer.join()
+    while not done_queue.empty():
+        yield done_queue.get()
+
+def run_pool(pool, tasks, processes, queue_size=QUEUE_SIZE, chunk_size=CHUNK_SIZE):
+    # Run the tasks in the worker processes. Unlike Pool.imap_unordered(), which consumes all the tasks up
+    # front, at most queue_size chunks per process are in flight, so the memory stays bounded however many
+    # glyphs there are. Yields (glyph name, error, stats, warnings) in the order of the tasks.
+    pending = deque()
+    tasks = iter(tasks)
+    while True:
+        chunk = list(itertools.islice(tasks, chunk_size))
+        if chunk:
+            pending.append(pool.apply_async(run_task_chunk, (chunk,)))
+        if pending and (not chunk or len(pending) >= processes * queue_size):
+            for result in pending.popleft().get():
+                yield result
+        elif not chunk:
+            break
+
+def run_tasks(tasks, name, pool=None, processes=1, log=None):
+    # Run the tasks and return the number of glyphs that failed.
+    if pool is None:
+        results = run_pipeline(tasks)
+    else:
+        results = run_pool(pool, tasks, processes)
+    number_of_errors = 0
+    stats = betterObliqueStats.get_stats()
+    for glyph_name, error, glyph_stats, warnings in results:
+        # The records made in the worker processes are collected here.
+        if pool is not None and stats is not None and glyph_stats is not None:
+            stats.add(glyph_stats)
+        if log:
+            for warning in warnings:
+                log('{0}: {1}: warning: {2}'.format(name, glyph_name, warning))
+        if error is not None:
+            number_of_errors += 1
+            if log:
+                log('{0}: {1}: {2}'.format(name, glyph_name, error))
+    return number_of_errors
+
+def read_stems(ufo_path):
+    info = FontInfo()
+    UFOReader(ufo_path, validate=False).readInfo(info)
+    vstems = getattr(info, 'postscriptStemSnapV', None)
+    hstems = getattr(info, 'postscriptStemSnapH', None)
+    std_vw = vstems[0] if vstems else 40.0
+    std_hw = hstems[0] if hstems else 40.0
+    return std_vw, std_hw
+
+def shear_ufo(ufo_path, layer_names, options, pool=None, processes=1, log=None):
+    # Shear the given layers of the UFO in place. Returns the number of glyphs that failed.
+    options = dict(options)
+    std_vw, std_hw = read_stems(ufo_path)
+    if options.get('std_vw') is None:
+        options['std_vw'] = std_vw
+    if options.get('std_hw') is None:
+        options['std_hw'] = std_hw
+    reader = UFOReader(ufo_path, validate=False)
+    # The tasks are made lazily, as the glyphs are processed.
+    tasks = (GlyphTask(ufo_path, layer_name, glyph_name, options) for layer_name in layer_names for glyph_name in reader.getGlyphSet(layer_name).keys())
+    return run_tasks(tasks, os.path.basename(ufo_path), pool=pool, processes=processes, log=log)
+
+def shear_sources(sources, options, name, pool=None, processes=1, log=None):
+    # Shear the (ufo_path, layer_name) sources in place, processing each glyph in all the sources
+    # that have it at once. Returns the number of glyphs that failed.
+    sources = [(ufo_path, layer_name) + read_stems(ufo_path) for ufo_path, layer_name in sources]
+    glyph_sources = {}
+    for source in sources:
+        for glyph_name in UFOReader(source[0], validate=False).getGlyphSet(source[1]).keys():
+            glyph_sources.setdefault(glyph_name, []).append(source)
+    tasks = (MasterGlyphTask(glyph_sources[glyph_name], glyph_name, options) for glyph_name in sorted(glyph_sources))
+    return run_tasks(tasks, name, pool=pool, processes=processes, log=log)
+
+def make_output_path(input_path, output_dir=None, suffix='-Oblique'):
+    input_path = os.path.normpath(input_path)
+    stem, ext = os.path.splitext(os.path.basename(input_path))
+    return os.path.join(output_dir or os.path.dirname(input_path), stem + suffix + ext)
+
+def copy_ufo(source_path, output_path):
+    if os.path.abspath(source_path) == os.path.abspath(output_path):
+        raise ValueError('The output would overwrite the source: {0}'.format(source_path))
+    if os.path.exists(output_path):
+        shutil.rmtree(output_path)
+    shutil.copytree(source_path, output_path)
+
+def process_ufo(input_path, options, output_dir=None, suffix='-Oblique', pool=None, processes=1, log=None):
+    output_path = make_output_path(input_path, output_dir=output_dir, suffix=suffix)
+    copy_ufo(input_path, output_path)
+    number_of_errors = shear_ufo(output_path, (None,), options, pool=pool, processes=processes, log=log)
+    return output_path, number_of_errors
+
+def process_designspace(input_path, options, output_dir=None, suffix='-Oblique', multi_master=False, pool=None, processes=1, log=None):
+    document = DesignSpaceDocument.fromfile(input_path)
+    output_path = make_output_path(input_path, output_dir=output_dir, suffix=suffix)
+    # Sparse sources may refer to other layers in the same UFO, so each UFO is copied once.
+    ufo_layers = {}
+    for source in document.sources:
+        ufo_layers.setdefault(os.path.normpath(source.path), []).append(source.layerName)
+    output_ufo_paths = {}
+    number_of_errors = 0
+    for ufo_path, layer_names in ufo_layers.items():
+        output_ufo_paths[ufo_path] = make_output_path(ufo_path, output_dir=os.path.dirname(output_path), suffix=suffix)
+        copy_ufo(ufo_path, output_ufo_paths[ufo_path])
+        if multi_master:
+            continue
+        number_of_errors += shear_ufo(output_ufo_paths[ufo_path], sorted(set(layer_names), key=lambda name: name or ''), options, pool=pool, processes=processes, log=log)
+    if multi_master:
+        sources = []
+        for source in document.sources:
+            if (output_ufo_paths[os.path.normpath(source.path)], source.layerName) not in sources:
+                sources.append((output_ufo_paths[os.path.normpath(source.path)], source.layerName))
+        number_of_errors += shear_sources(sources, options, os.path.basename(input_path), pool=pool, processes=processes, log=log)
+    for source in document.sources:
+        source.path = output_ufo_paths[os.path.normpath(source.path)]
+        source.filename = os.path.relpath(source.path, os.path.dirname(output_path))
+    document.write(output_path)
+    return output_path, number_of_errors
+
+def make_argument_parser():
+    parser = argparse.ArgumentParser(description='Skew UFO or designspace sources with the Better Oblique filter.')
+    parser.add_argument('inputs', nargs='+', metavar='INPUT', help='.ufo or .designspace sources')
+    parser.add_argument('-a', '--angle', type=float, required=True, help='oblique angle in degrees')
+    parser.add_argument('-c', '--optical-correction', choices=OPTICAL_CORRECTIONS, default='thin', help='optical correction (default: %(default)s)')
+    parser.add_argument('-s', '--strength', type=float, default=1.0, help='strength of the optical correction from 0.0 to 1.0 (default: %(default)s)')
+    parser.add_argument('--curve-segments-only', action='store_true', help='offset curve segments only')
+    parser.add_argument('--vertical', action='store_true', help='skew vertically')
+    parser.add_argument('--no-keep-center', dest='keep_center', action='store_false', help='do not keep the center of each glyph')
+    parser.add_argument('--apply-without-skewing', action='store_true', help='apply the optical correction only')
+    parser.add_argument('--std-vw', type=float, help='override postscriptStemSnapV[0] of the sources')
+    parser.add_argument('--std-hw', type=float, help='override postscriptStemSnapH[0] of the sources')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help='maximum deviation of the offset curves in font units, which determines how finely curves are subdivided (default: %(default)s)')
+    parser.add_argument('--multi-master', action='store_true', help='process each glyph in all the sources of a designspace together, so that the results stay compatible')
+    parser.add_argument('--cache-dir', help='directory to cache the sheared outlines in, so that unchanged glyphs are not recomputed')
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_MAX_SIZE // (1024 * 1024), help='maximum size of the cache in MiB (default: %(default)s)')
+    parser.add_argument('--check-collisions', action='store_true', help='report the contours that collide after shearing but did not before, e.g. when neighbouring strokes have been offset into each other')
+    parser.add_argument('--remove-overlaps', action='store_true', help='remove the overlaps of the contours after shearing, e.g. where neighbouring strokes have been offset into each other; requires pyclipper')
+    parser.add_argument('--stats', metavar='FILE', help='record the time spent in each stage and counters per glyph, and write them to the JSON file')
+    parser.add_argument('-o', '--output-dir', help='directory to write the results to (default: next to each input)')
+    parser.add_argument('--suffix', default='-Oblique', help='suffix appended to the output file names (default: %(default)s)')
+    parser.add_argument('-j', '--processes', type=int, default=multiprocessing.cpu_count(), help='number of worker processes (default: %(default)s)')
+    return parser
+
+def main(args=None):
+    parser = make_argument_parser()
+    args = parser.parse_args(args)
+    if args.remove_overlaps:
+        if args.multi_master:
+            parser.error('--remove-overlaps cannot be used with --multi-master, as it does not keep the sources compatible')
+        try:
+            import pyclipper
+        except ImportError:
+            parser.error('--remove-overlaps requires pyclipper')
+    options = {
+        'shear_angle': math.radians(args.angle),
+        'std_vw': args.std_vw,
+        'std_hw': args.std_hw,
+        'optical_correction': args.optical_correction,
+        'strength': args.strength,
+        'curve_segments_only': args.curve_segments_only,
+        'vertical': args.vertical,
+        'center': args.keep_center,
+        'skip_shear': args.apply_without_skewing,
+        'tolerance': args.tolerance,
+        'check_collisions': args.check_collisions,
+        'remove_overlaps': args.remove_overlaps,
+    }
+    def log(message):
+        print(message, file=sys.stderr)
+    if args.output_dir and not os.path.isdir(args.output_dir):
+        os.makedirs(args.output_dir)
+    if args.stats:
+        betterObliqueStats.enable()
+    # The worker processes record the stats too when enabled, e.g. by the environment variable. The cache
+    # is passed by its directory and limit, and its size is measured once here for all the processes.
+    cache_size = args.cache_size * 1024 * 1024
+    cache_used = None
+    if args.cache_dir:
+        cache_used = ShearCache(args.cache_dir, max_size=cache_size).total_size()
+        if args.processes > 1:
+            cache_used = multiprocessing.Value('q', cache_used)
+    initargs = (args.cache_dir, cache_size, cache_used, betterObliqueStats.get_stats() is not None)
+    init_process(*initargs)
+    pool = multiprocessing.Pool(args.processes, initializer=init_worker_process, initargs=initargs) if args.processes > 1 else None
+    number_of_errors = 0
+    try:
+        for input_path in args.inputs:
+            if os.path.splitext(input_path)[1].lower() == '.designspace':
+                output_path, n = process_designspace(input_path, options, output_dir=args.output_dir, suffix=args.suffix, multi_master=args.multi_master, pool=pool, processes=args.processes, log=log)
+            else:
+                output_path, n = process_ufo(input_path, options, output_dir=args.output_dir, suffix=args.suffix, pool=pool, processes=args.processes, log=log)
+            number_of_errors += n
+            print(output_path)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    if args.stats:
+        betterObliqueStats.get_stats().dump(args.stats)
+    return 1 if number_of_errors > 0 else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+
+# Content-addressed on-disk cache of sheared outlines.
+#
+# An entry is keyed by a hash of the input contours and every parameter of the filter, and stores
+# the resulting node lists in a small binary file:
+#
+#   magic 'BOC1', uint32 number of contours, then for each contour:
+#   uint8 compatible flag, uint32 number of nodes, and (uint8 type, float64 x, float64 y) per node.
+#
+# Files are laid out as <directory>/<first two hex digits>/<rest of the key>. Hits refresh the
+# modification time, and the least recently used entries are removed when the total size exceeds
+# the limit.
+
+from __future__ import division
+
+import hashlib
+import os
+import struct
+import tempfile
+
+CACHE_VERSION = 6
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+MAGIC = b'BOC1'
+NODE_TYPES = ('move', 'line', 'curve', 'qcurve', 'offcurve')
+NODE_TYPE_CODES = dict(((node_type, i) for i, node_type in enumerate(NODE_TYPES)))
+
+def pack_contours(contours):
+    chunks = [struct.pack('<I', len(contours))]
+    for nodes, compatible in contours:
+        chunks.append(struct.pack('<BI', 1 if compatible else 0, len(nodes)))
+        for x, y, node_type in nodes:
+            chunks.append(struct.pack('<Bdd', NODE_TYPE_CODES[node_type], x, y))
+    return b''.join(chunks)
+
+def unpack_contours(data):
+    offset = 0
+    number_of_contours, = struct.unpack_from('<I', data, offset)
+    offset += 4
+    contours = []
+    for _ in range(number_of_contours):
+        compatible, number_of_nodes = struct.unpack_from('<BI', data, offset)
+        offset += 5
+        nodes = []
+        for _ in range(number_of_nodes):
+            code, x, y = struct.unpack_from('<Bdd', data, offset)
+            offset += 17
+            nodes.append((x, y, NODE_TYPES[code]))
+        contours.append((nodes, bool(compatible)))
+    return contours
+
+
+class ShearCache(object):
+
+    def __init__(self, directory, max_size=DEFAULT_MAX_SIZE, size=None):
+        # The total size of the entries is kept as a running total, so that the directory is only scanned
+        # to evict entries. Unless given, it is measured on the first put(). Processes that write to the
+        # same directory share the total as a multiprocessing.Value, so that each of them sees the entries
+        # written by the others.
+        self.directory = directory
+        self.max_size = max_size
+        self._size = size
+
+    def key(self, contours, params):
+        # The parameters are sorted by name so that the key doesn't depend on the order of the keywords.
+        h = hashlib.sha1()
+        h.update(repr((CACHE_VERSION, sorted(params.items()))).encode('utf-8'))
+        for nodes in contours:
+            h.update(struct.pack('<I', len(nodes)))
+            for x, y, node_type in nodes:
+                h.update(struct.pack('<Bdd', NODE_TYPE_CODES[node_type], x, y))
+        return h.hexdigest()
+
+    def path_for_key(self, key):
+        return os.path.join(self.directory, key[:2], key[2:])
+
+    def get(self, contours, params):
+        path = self.path_for_key(self.key(contours, params))
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path, None)
+        except (IOError, OSError):
+            return None
+        if data[:4] != MAGIC:
+            return None
+        try:
+            return unpack_contours(data[4:])
+        except (struct.error, IndexError):
+            return None
+
+    def put(self, contours, params, results):
+        path = self.path_for_key(self.key(contours, params))
+        data = MAGIC + pack_contours(results)
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                if not os.path.isdir(directory):
+                    raise
+        # An entry that is overwritten, e.g. by another process that sheared the same glyph, is only
+        # counted once.
+        try:
+            old_size = os.path.getsize(path)
+        except OSError:
+            old_size = 0
+        # Write to a temporary file first so that concurrent readers never see a partial entry.
+        fd, temp_path = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            getattr(os, 'replace', os.rename)(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        if self.add_size(len(data) - old_size) > self.max_size:
+            self.evict()
+
+    def add_size(self, n):
+        # Adds n bytes to the running total and returns it.
+        if hasattr(self._size, 'get_lock'):
+            with self._size.get_lock():
+                self._size.value += n
+                return self._size.value
+        if self._size is None:
+            # The new entry is already counted by total_size().
+            self._size = self.total_size()
+        else:
+            self._size += n
+        return self._size
+
+    def set_size(self, size):
+        if hasattr(self._size, 'get_lock'):
+            with self._size.get_lock():
+                self._size.value = size
+        else:
+            self._size = size
+
+    def entries(self):
+        # Yields (mtime, size, path) of every entry in the cache.
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            subdirectory = os.path.join(self.directory, name)
+            if len(name) != 2 or not os.path.isdir(subdirectory):
+                continue
+            for entry_name in os.listdir(subdirectory):
+                path = os.path.join(subdirectory, entry_name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield stat.st_mtime, stat.st_size, path
+
+    def total_size(self):
+        return sum((size for _, size, _ in self.entries()))
+
+    def evict(self, target_size=None):
+        # Remove the least recently used entries until the cache shrinks to 90% of the limit.
+        if target_size is None:
+            target_size = self.max_size * 0.9
+        entries = sorted(self.entries())
+        size = sum((size for _, size, _ in entries))
+        for _, entry_size, path in entries:
+            if size <= target_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            size -= entry_size
+        self.set_size(size)
+
+    def clear(self):
+        self.evict(target_size=0)
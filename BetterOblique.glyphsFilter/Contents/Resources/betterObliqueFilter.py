@@ -6,16 +6,39 @@ import beziers.point
 import beziers.path
 import beziers.line
 import beziers.cubicbezier
+import beziers.quadraticbezier
 import beziers.affinetransformation
+from beziers.utils.curvefitter import B0, B1, B2, B3
+from beziers.utils.pointindex import PointIndex
+from beziers.utils.linesweep import overlapping_pairs
+
+import betterObliqueStats
+from betterObliqueStats import clock
 
 from fontTools.pens.pointPen import SegmentToPointPen
 
 import math
 import cmath
-import sys
+import itertools
+
+try:
+    from GlyphsApp import *
+    from GlyphsApp.plugins import *
+except ImportError:
+    # Running headless (e.g. betterObliqueBatch.py); the stand-in provides the objects used here.
+    from betterObliqueGlyphs import *
+
+# Maximum deviation of the offset curves in font units, which drives the subdivision in offset_path().
+DEFAULT_TOLERANCE = 1.0
+MAX_SUBDIVISION_DEPTH = 6
+OFFSET_ERROR_SAMPLES = (0.25, 0.5, 0.75)
 
-from GlyphsApp import *
-from GlyphsApp.plugins import *
+# Number of samples per segment and refinement passes when joining subdivided segments.
+JOIN_FIT_SAMPLES = 8
+JOIN_FIT_ITERATIONS = 2
+
+# Intersections this close to the ends of segments (in time) still count when contours touch.
+COLLISION_EPSILON = 1e-9
 
 def mean_angle(*radians):
     # Averages/Mean angle - Rosetta Code
@@ -47,12 +70,24 @@ def shear_matrix(shear_angle, vertical=False):
         return ((1, 0, 0), (math.tan(shear_angle), 1, 0), (0, 0, 1))
     return ((1, math.tan(shear_angle), 0), (0, 1, 0), (0, 0, 1))
 
+def shear_transform(shear_angle, vertical=False):
+    # shear_matrix() in the (a, b, c, d, tx, ty) form of GSPath.applyTransform().
+    if vertical:
+        return (1.0, math.tan(shear_angle), 0.0, 1.0, 0.0, 0.0)
+    return (1.0, 0.0, math.tan(shear_angle), 1.0, 0.0, 0.0)
+
+def translate_transform(transform, dx, dy):
+    a, b, c, d, tx, ty = transform
+    return (a, b, c, d, tx + dx, ty + dy)
+
 def expected_stem_scale(stem_angle, shear_angle, stem_size=1.0, vertical=False):
     # Make a stem with the given angle, and return the width after transformation.
-    segment = beziers.line.Line(beziers.point.Point(0.0, 0.0), beziers.point.Point(0.0, stem_size))
-    segment = segment.rotated(beziers.point.Point(0.0, 0.0), stem_angle)
-    segment = segment.transformed(beziers.affinetransformation.AffineTransformation(shear_matrix(shear_angle, vertical=vertical)))
-    return segment.length / stem_size
+    # The stem is (0, stem_size) rotated by stem_angle, i.e. stem_size * (-sin, cos), thus the ratio
+    # doesn't depend on stem_size, and the width after shear_matrix() is obtained analytically.
+    x, y = -math.sin(stem_angle), math.cos(stem_angle)
+    if vertical:
+        return math.hypot(x, y + math.tan(shear_angle) * x)
+    return math.hypot(x + math.tan(shear_angle) * y, y)
 
 def target_stem_scale(shear_angle, vertical=False, mode=None):
     if mode == 'thick':
@@ -63,6 +98,21 @@ def target_stem_scale(shear_angle, vertical=False, mode=None):
         return 1.0 / expected_stem_scale(math.pi - shear_angle, shear_angle, vertical=vertical)
     return 1.0 / ((expected_stem_scale(0.0, shear_angle, vertical=vertical) + expected_stem_scale(math.pi / 2.0, shear_angle, vertical=vertical)) / 2.0)
 
+def make_stem_scale_func(shear_angle, vertical=False, mode=None):
+    # Returns a function equivalent to target_stem_scale() / expected_stem_scale() for the given stem angle,
+    # with the parts that only depend on the shear angle and the mode computed in advance.
+    target_scale = target_stem_scale(shear_angle, vertical=vertical, mode=mode)
+    tan_shear = math.tan(shear_angle)
+    if vertical:
+        def stem_scale_func(stem_angle):
+            x, y = -math.sin(stem_angle), math.cos(stem_angle)
+            return target_scale / math.hypot(x, y + tan_shear * x)
+    else:
+        def stem_scale_func(stem_angle):
+            x, y = -math.sin(stem_angle), math.cos(stem_angle)
+            return target_scale / math.hypot(x + tan_shear * y, y)
+    return stem_scale_func
+
 def angle_diff(a, b):
     return math.atan2(math.sin(b - a), math.cos(b - a))
 
@@ -73,9 +123,80 @@ def make_distance_vector(d):
         d = beziers.point.Point(d[0], d[1])
     return d
 
-def join_cubic_bezier_segments(s1, s2, use_glyphs=True):
+def end_tangents(segment):
+    # Unit tangents pointing into the segment at both ends, which skip retracted handles.
+    points = segment.points
+    start_tangent = next((p - points[0] for p in points[1:] if p != points[0]), beziers.point.Point(0.0, 0.0))
+    end_tangent   = next((p - points[-1] for p in reversed(points[:-1]) if p != points[-1]), beziers.point.Point(0.0, 0.0))
+    return start_tangent.toUnitVector(), end_tangent.toUnitVector()
+
+def fit_cubic_bezier_segments(segments, tangents=None, samples=JOIN_FIT_SAMPLES, iterations=JOIN_FIT_ITERATIONS):
+    # Fit a single cubic bezier segment to the given consecutive segments by least squares, keeping the
+    # end points and the tangent directions at both ends. This follows CurveFit.estimateLengths() and
+    # CurveFit.newtonRaphsonFind() (Schneider's algorithm, as in Inkscape), but works on plain floats
+    # since creating Point objects for every sample dominates the time otherwise.
+    if tangents is None:
+        tangents = (end_tangents(segments[0])[0], end_tangents(segments[-1])[1])
+    (t1x, t1y), (t2x, t2y) = [(t.x, t.y) for t in tangents]
+    points = [(segments[0][0].x, segments[0][0].y)]
+    ts = [i / samples for i in range(1, samples + 1)]
+    for segment in segments:
+        points.extend(zip(*segment.pointsAtTimes(ts)))
+    (p0x, p0y), (p3x, p3y) = points[0], points[-1]
+    
+    # Chord length parameterization.
+    u = [0.0]
+    for (ax, ay), (bx, by) in zip(points, points[1:]):
+        u.append(u[-1] + math.hypot(bx - ax, by - ay))
+    if u[-1] == 0.0:
+        return beziers.cubicbezier.CubicBezier(segments[0][0], segments[0][0], segments[-1][-1], segments[-1][-1])
+    u = [v / u[-1] for v in u]
+    
+    for iteration in range(iterations + 1):
+        # Solve the 2x2 normal equations for the lengths of the handles.
+        c00 = c01 = c11 = x0 = x1 = 0.0
+        for (px, py), t in zip(points, u):
+            b0, b1, b2, b3 = B0(t), B1(t), B2(t), B3(t)
+            a1x, a1y, a2x, a2y = t1x * b1, t1y * b1, t2x * b2, t2y * b2
+            c00 += a1x * a1x + a1y * a1y
+            c01 += a1x * a2x + a1y * a2y
+            c11 += a2x * a2x + a2y * a2y
+            sx = px - p0x * (b0 + b1) - p3x * (b2 + b3)
+            sy = py - p0y * (b0 + b1) - p3y * (b2 + b3)
+            x0 += a1x * sx + a1y * sy
+            x1 += a2x * sx + a2y * sy
+        det = c00 * c11 - c01 * c01
+        if det != 0.0:
+            alpha_l, alpha_r = (x0 * c11 - x1 * c01) / det, (c00 * x1 - c01 * x0) / det
+        else:
+            alpha_l = alpha_r = x0 / (c00 + c01) if c00 + c01 != 0.0 else 0.0
+        if alpha_l < 1.0e-6 or alpha_r < 1.0e-6:
+            alpha_l = alpha_r = math.hypot(p3x - p0x, p3y - p0y) / 3.0
+        p1x, p1y = p0x + t1x * alpha_l, p0y + t1y * alpha_l
+        p2x, p2y = p3x + t2x * alpha_r, p3y + t2y * alpha_r
+        if iteration == iterations:
+            break
+        
+        # Move each parameter to the nearest point on the curve by a Newton-Raphson step.
+        for i in range(1, len(points) - 1):
+            (px, py), t = points[i], u[i]
+            mt = 1.0 - t
+            qx = B0(t) * p0x + B1(t) * p1x + B2(t) * p2x + B3(t) * p3x
+            qy = B0(t) * p0y + B1(t) * p1y + B2(t) * p2y + B3(t) * p3y
+            dx = 3.0 * (mt * mt * (p1x - p0x) + 2.0 * mt * t * (p2x - p1x) + t * t * (p3x - p2x))
+            dy = 3.0 * (mt * mt * (p1y - p0y) + 2.0 * mt * t * (p2y - p1y) + t * t * (p3y - p2y))
+            ddx = 6.0 * (mt * (p2x - 2.0 * p1x + p0x) + t * (p3x - 2.0 * p2x + p1x))
+            ddy = 6.0 * (mt * (p2y - 2.0 * p1y + p0y) + t * (p3y - 2.0 * p2y + p1y))
+            numerator = (qx - px) * dx + (qy - py) * dy
+            denominator = dx * dx + dy * dy + (qx - px) * ddx + (qy - py) * ddy
+            if denominator > 0.0:
+                u[i] = min(1.0, max(0.0, t - numerator / denominator))
+    
+    return beziers.cubicbezier.CubicBezier(segments[0][0], beziers.point.Point(p1x, p1y), beziers.point.Point(p2x, p2y), segments[-1][-1])
+
+def join_cubic_bezier_segments(s1, s2, use_glyphs=False, tangents=None):
     assert(s1[3] == s2[0])
-    # Glyphs applies more sophisticated curve fitting when removing a node.
+    # Glyphs applies similar curve fitting when removing a node, which is kept here for comparison.
     if use_glyphs:
         layer = GSLayer()
         pen = layer.getPen()
@@ -89,89 +210,37 @@ def join_cubic_bezier_segments(s1, s2, use_glyphs=True):
         p = beziers.point.Point(path.nodes[1].x, path.nodes[1].y)
         q = beziers.point.Point(path.nodes[2].x, path.nodes[2].y)
         return beziers.cubicbezier.CubicBezier(s1[0], p, q, s2[3])
-    # Approximate the two cubic bezier segments according to the following approach:
+    # Simply undoing the subdivision doesn't work as the segments have been offset individually:
     #   Retrieve the initial cubic Bézier curve subdivided in two Bézier curves - Mathematics Stack Exchange
     #   https://math.stackexchange.com/questions/877725/retrieve-the-initial-cubic-bézier-curve-subdivided-in-two-bézier-curves
-    # However, the approximation doesn't look good enough to maintain the thickness after offsetting in general.
-    # The way defcon joins segments when deleting nodes looks similar, thus it doesn't help me either:
-    #   defcon/Lib/defcon/tools/bezierMath.py
-    #   https://github.com/robotools/defcon/blob/master/Lib/defcon/tools/bezierMath.py#L12
-    k = s2[1].distanceFrom(s2[0]) / s1[2].distanceFrom(s1[3])
-    p = s1[1] * (1 + k) - s1[0] * k
-    q = (s2[2] * (1 + k) - s2[3]) / k
-    return beziers.cubicbezier.CubicBezier(s1[0], p, q, s2[3])
-
-def offset_path(path, distance, subdivide=True, curve_segments_only=False):
-    
-    segments = path.asSegments()
-    original_number_of_segments = len(segments)
-    
-    # Make a function that returns a offset distance.
-    if isinstance(distance, (int, float)):
-        distance = (distance, distance)
-    if not callable(distance):
-        dx, dy = distance[0], distance[1]
-        def constant_distance_func(segment, index, count):
-            return beziers.point.Point(dx, dy)
-        distance = constant_distance_func
-
-    # Add a midpoint to each steep curve to compensate errors when offsetting.
-    original_points_in_segments = None 
-    if subdivide:
-        original_points_in_segments = set()
-        for segment in segments:
-            original_points_in_segments.add(segment[0])
-            original_points_in_segments.add(segment[-1])
-        needs_split = True
-        pass_in_progress = 1 # FIXME: splitting at extrema seems to create funky joins.
-        while needs_split:
-            splitted_segments = []
-            has_splitted = False
-            for i, segment in enumerate(segments):
-                has_performed_split_in_segment = False
-                if isinstance(segment, beziers.cubicbezier.CubicBezier):
-                    if pass_in_progress > 0:
-                        # Keep splitting at midpoint if the curvature is still steep.
-                        mid_point = segment.pointAtTime(0.5)
-                        start_angle, end_angle = beziers.line.Line(segment[0], mid_point).endAngle, beziers.line.Line(mid_point, segment[-1]).startAngle
-                        if abs(angle_diff(start_angle, end_angle)) > math.radians(20.0):
-                            splitted_segments.extend(segment.splitAtTime(0.5))
-                            has_performed_split_in_segment = True
-                    elif pass_in_progress == 0:
-                        # Pomax recommends to split at extrema of each segment as a first pass.
-                        #   Curve offsetting - A Primer on Bézier Curves
-                        #   https://pomax.github.io/bezierinfo/#offsetting
-                        extrema_times = segment.findExtremes()
-                        if extrema_times and len(extrema_times) > 0:
-                            t0 = 0.0
-                            sub_segment_to_be_splitted = segment
-                            for t1 in sorted(extrema_times):
-                                splitted_sub_segments = sub_segment_to_be_splitted.splitAtTime(t1 - t0)
-                                splitted_segments.append(splitted_sub_segments[0])
-                                sub_segment_to_be_splitted = splitted_sub_segments[1]
-                                t0 = t1
-                            splitted_segments.append(sub_segment_to_be_splitted)
-                            has_performed_split_in_segment = True
-                if not has_performed_split_in_segment:
-                    splitted_segments.append(segment)
-                has_splitted = has_splitted or has_performed_split_in_segment
-            segments = splitted_segments
-            needs_split = has_splitted or pass_in_progress == 0
-            pass_in_progress += 1
-    
+    # The approximation doesn't maintain the thickness after offsetting in general, thus refit the curve instead.
+    return fit_cubic_bezier_segments((s1, s2), tangents=tangents)
+
+def original_junctions(provenance, number_of_segments):
+    # Tells whether the end point of each segment is an original one, i.e. not made by subdivision.
+    if provenance is None:
+        return [True] * number_of_segments
+    return [t1 == 1.0 for _, _, t1 in provenance]
+
+def translate_segments(segments, distance, provenance=None, curve_segments_only=False):
+    # Returns the translated segments. With curve_segments_only, only the points made by subdivision
+    # (see subdivide_segments() for the provenance) and the BCPs next to them are translated.
     number_of_segments = len(segments)
+    is_original = original_junctions(provenance, number_of_segments)
     
     # Offset paths based on the approximation proposed by Tiller and Hanson. Each corner will have a miter joint.
     #   Control points of offset bezier curve - Mathematics Stack Exchange
     #   https://math.stackexchange.com/questions/465782/control-points-of-offset-bezier-curve
-    translation_dict = {}
+    # Points are looked up by their quantized coordinates (see PointIndex) rather than by Point.__hash__.
+    translation_dict = PointIndex()
+    glyph_stats = betterObliqueStats.current()
     for i in range(number_of_segments):
         s1, s2 = segments[i], segments[(i + 1) % number_of_segments]
         d1 = make_distance_vector(distance(s1.endAngle,   i, number_of_segments))
         d2 = make_distance_vector(distance(s2.startAngle, i, number_of_segments))
         d0 = make_distance_vector(distance(mean_angle(s1.endAngle, s2.startAngle), i, number_of_segments))
         if True:
-            if not curve_segments_only or s2[0] not in original_points_in_segments:
+            if not curve_segments_only or not is_original[i]:
                 p1  = s2[0]
                 s1a = s1.endAngle - math.pi / 2.0
                 s1e = beziers.point.Point(s1[-1].x + math.cos(s1a) * d1.x, s1[-1].y + math.sin(s1a) * d1.y)
@@ -184,29 +253,24 @@ def offset_path(path, distance, subdivide=True, curve_segments_only=False):
                 if p2 is None or s1.endAngle == s2.startAngle or abs(math.degrees(angle_diff(s2.startAngle, s1.endAngle))) < 8.0:
                     nominal_angle = mean_angle(s1.endAngle, s2.startAngle) - math.pi / 2.0
                     p2 = beziers.point.Point(p1.x + math.cos(nominal_angle) * d0.x, p1.y + math.sin(nominal_angle) * d0.y)
+                    if glyph_stats is not None:
+                        glyph_stats.count('miter_fallbacks')
                 translation_dict[p1] = p2
         if isinstance(s1, beziers.cubicbezier.CubicBezier):
             # Always offset BCPs in subdivided segments when curve_segments_only is on.
-            if not curve_segments_only or s1[3] not in original_points_in_segments:
+            if not curve_segments_only or not is_original[i]:
                 nominal_angle = mean_angle(beziers.line.Line(s1[1], s1[2]).endAngle, beziers.line.Line(s1[2], s1[3]).startAngle) - math.pi / 2.0
                 p1 = s1[2]
                 p2 = beziers.point.Point(p1.x + math.cos(nominal_angle) * d1.x, p1.y + math.sin(nominal_angle) * d1.y)
                 translation_dict[p1] = p2
         if isinstance(s2, beziers.cubicbezier.CubicBezier):
             # Always offset BCPs in subdivided segments when curve_segments_only is on.
-            if not curve_segments_only or s2[0] not in original_points_in_segments:
+            if not curve_segments_only or not is_original[i]:
                 nominal_angle = mean_angle(beziers.line.Line(s2[0], s2[1]).endAngle, beziers.line.Line(s2[1], s2[2]).startAngle) - math.pi / 2.0
                 p1 = s2[1]
                 p2 = beziers.point.Point(p1.x + math.cos(nominal_angle) * d2.x, p1.y + math.sin(nominal_angle) * d2.y)
                 translation_dict[p1] = p2
         
-    # Find subdivided points and store their translated points into a set.
-    if subdivide:
-        translated_points_to_be_removed = set()
-        for original_point, translated_point in translation_dict.items():
-            if original_point not in original_points_in_segments:
-                translated_points_to_be_removed.add(translated_point)
-    
     # Translate points in all segments.
     new_segments = []
     for segment in segments:
@@ -214,30 +278,143 @@ def offset_path(path, distance, subdivide=True, curve_segments_only=False):
             new_segments.append(beziers.cubicbezier.CubicBezier(translation_dict.get(segment[0], segment[0]), translation_dict.get(segment[1], segment[1]), translation_dict.get(segment[2], segment[2]), translation_dict.get(segment[3], segment[3])))
         elif isinstance(segment, beziers.line.Line):
             new_segments.append(beziers.line.Line(translation_dict.get(segment[0], segment[0]), translation_dict.get(segment[1], segment[1])))
-    segments = new_segments
     
-    # Remove subdivided points.
+    return new_segments
+
+def offset_point(x, y, angle, d):
+    a = angle - math.pi / 2.0
+    return (x + math.cos(a) * d.x, y + math.sin(a) * d.y)
+
+def estimate_offset_error(segment, distance, index, count):
+    # Estimate how far the offset made by translate_segments() deviates from the exact offset curve.
+    # For a single segment, it amounts to the control polygon translated as proposed by Tiller and Hanson,
+    # which is compared with the exact offset at a few samples.
+    (x0, y0), (x1, y1), (x2, y2), (x3, y3) = [(p.x, p.y) for p in segment.points]
+    start_angle, end_angle = math.atan2(y1 - y0, x1 - x0), math.atan2(y3 - y2, x3 - x2)
+    d1 = make_distance_vector(distance(start_angle, index, count))
+    d2 = make_distance_vector(distance(end_angle,   index, count))
+    q0 = offset_point(x0, y0, start_angle, d1)
+    q1 = offset_point(x1, y1, mean_angle(start_angle, math.atan2(y2 - y1, x2 - x1)), d1)
+    q2 = offset_point(x2, y2, mean_angle(math.atan2(y2 - y1, x2 - x1), end_angle), d2)
+    q3 = offset_point(x3, y3, end_angle, d2)
+    error = 0.0
+    for t in OFFSET_ERROR_SAMPLES:
+        mt = 1.0 - t
+        b0, b1, b2, b3 = mt * mt * mt, 3.0 * mt * mt * t, 3.0 * mt * t * t, t * t * t
+        c0, c1, c2 = 3.0 * mt * mt, 6.0 * mt * t, 3.0 * t * t
+        x, y = b0 * x0 + b1 * x1 + b2 * x2 + b3 * x3, b0 * y0 + b1 * y1 + b2 * y2 + b3 * y3
+        angle = math.atan2(c0 * (y1 - y0) + c1 * (y2 - y1) + c2 * (y3 - y2), c0 * (x1 - x0) + c1 * (x2 - x1) + c2 * (x3 - x2))
+        ex, ey = offset_point(x, y, angle, make_distance_vector(distance(angle, index, count)))
+        ax = b0 * q0[0] + b1 * q1[0] + b2 * q2[0] + b3 * q3[0]
+        ay = b0 * q0[1] + b1 * q1[1] + b2 * q2[1] + b3 * q3[1]
+        error = max(error, math.hypot(ax - ex, ay - ey))
+    return error
+
+def subdivide_segments(segments, distance, tolerance=DEFAULT_TOLERANCE, max_depth=MAX_SUBDIVISION_DEPTH):
+    # Split each curve at its midpoint until the estimated offset error falls below the tolerance.
+    # Returns the pieces and their provenance; see subdivide_compatible_segments().
+    segments_list, provenance = subdivide_compatible_segments([segments], [distance], tolerance=tolerance, max_depth=max_depth)
+    return segments_list[0], provenance
+
+def subdivide_compatible_segments(segments_list, distances, tolerance=DEFAULT_TOLERANCE, max_depth=MAX_SUBDIVISION_DEPTH):
+    # Subdivide the corresponding segments of compatible contours (e.g. those of the masters of a glyph)
+    # in the same way, each with its own distance function. A piece is split at its midpoint when the
+    # estimated offset error of any of them exceeds the tolerance, and only the pieces made by the last
+    # split are examined again.
+    # Returns the pieces of each contour, and their shared provenance, i.e. (index of the parent segment,
+    # t0, t1) for each piece. The range is exact as the splits are done at the midpoint, thus t1 == 1.0
+    # tells the last piece.
+    # FIXME: splitting at extrema as recommended by Pomax seems to create funky joins.
+    #   Curve offsetting - A Primer on Bézier Curves
+    #   https://pomax.github.io/bezierinfo/#offsetting
+    number_of_segments = len(segments_list[0])
+    subdivided_segments_list, provenance = [[] for _ in segments_list], []
+    glyph_stats = betterObliqueStats.current()
+    for i, segments in enumerate(zip(*segments_list)):
+        if not isinstance(segments[0], beziers.cubicbezier.CubicBezier):
+            for subdivided_segments, segment in zip(subdivided_segments_list, segments):
+                subdivided_segments.append(segment)
+            provenance.append((i, 0.0, 1.0))
+            continue
+        worklist = [(segments, 0, 0.0, 1.0)]
+        while worklist:
+            pieces, depth, t0, t1 = worklist.pop()
+            if depth < max_depth and any((estimate_offset_error(piece, distance, i, number_of_segments) > tolerance for piece, distance in zip(pieces, distances))):
+                halves = [piece.splitAtTime(0.5) for piece in pieces]
+                if glyph_stats is not None:
+                    glyph_stats.count('splits')
+                t = (t0 + t1) / 2.0
+                worklist.append((tuple((right for _, right in halves)), depth + 1, t,  t1))
+                worklist.append((tuple((left  for left, _ in halves)),  depth + 1, t0, t))
+            else:
+                for subdivided_segments, piece in zip(subdivided_segments_list, pieces):
+                    subdivided_segments.append(piece)
+                provenance.append((i, t0, t1))
+    return subdivided_segments_list, provenance
+
+def merge_subdivided_segments(segments, provenance, original_segments):
+    # Join the pieces of each parent segment back into one in a single pass. The pieces are fitted
+    # together, keeping the tangents of the parent as the offset curve is parallel to it.
+    merged_segments = []
+    glyph_stats = betterObliqueStats.current()
+    for parent, group in itertools.groupby(zip(segments, provenance), key=lambda item: item[1][0]):
+        pieces = [segment for segment, _ in group]
+        if len(pieces) == 1:
+            merged_segments.append(pieces[0])
+        else:
+            merged_segments.append(fit_cubic_bezier_segments(pieces, tangents=end_tangents(original_segments[parent])))
+            if glyph_stats is not None:
+                glyph_stats.count('joins', len(pieces) - 1)
+    return merged_segments
+
+def make_distance_func(distance):
+    # Make a function that returns a offset distance.
+    if isinstance(distance, (int, float)):
+        distance = (distance, distance)
+    if not callable(distance):
+        dx, dy = distance[0], distance[1]
+        def constant_distance_func(segment, index, count):
+            return beziers.point.Point(dx, dy)
+        distance = constant_distance_func
+    return distance
+
+def is_compatible_segments(segments_list):
+    return all((len(segments) == len(segments_list[0]) for segments in segments_list)) and all((len(set((type(segment) for segment in segments))) == 1 for segments in zip(*segments_list)))
+
+def offset_path(path, distance, subdivide=True, curve_segments_only=False, tolerance=DEFAULT_TOLERANCE):
+    return offset_compatible_paths([path], [distance], subdivide=subdivide, curve_segments_only=curve_segments_only, tolerance=tolerance)[0]
+
+def offset_compatible_paths(paths, distances, subdivide=True, curve_segments_only=False, tolerance=DEFAULT_TOLERANCE):
+    # Offset compatible paths, e.g. those of the masters of a glyph, each with its own distance. The paths
+    # share the subdivision and the merge plan, so that the results stay compatible with each other.
+    segments_list = [path.asSegments() for path in paths]
+    if not is_compatible_segments(segments_list):
+        raise ValueError('The paths are not compatible.')
+    distances = [make_distance_func(distance) for distance in distances]
+    glyph_stats = betterObliqueStats.current()
+    
+    # Subdivide steep curves to compensate errors when offsetting.
+    original_segments_list, provenance = segments_list, None
     if subdivide:
-        while len(segments) > original_number_of_segments:
-            new_segments = []
-            skip_next = False
-            number_of_segments = len(segments)
-            for i in range(number_of_segments):
-                if skip_next:
-                    skip_next = False
-                    continue
-                s1, s2 = segments[i], segments[(i + 1) % number_of_segments]
-                if s1[-1] in translated_points_to_be_removed:
-                    if isinstance(s1, beziers.cubicbezier.CubicBezier) and isinstance(s2, beziers.cubicbezier.CubicBezier):
-                        s1 = join_cubic_bezier_segments(s1, s2)
-                        skip_next = True
-                    else:
-                        s1 = beziers.cubicbezier.Line(s1[0], s2[-1])
-                        skip_next = True
-                new_segments.append(s1)
-            segments = new_segments
+        t = glyph_stats and clock()
+        segments_list, provenance = subdivide_compatible_segments(segments_list, distances, tolerance=tolerance)
+        if glyph_stats is not None:
+            glyph_stats.add_time('subdivide', clock() - t)
     
-    return beziers.path.BezierPath.fromSegments(segments)
+    paths = []
+    for segments, distance, original_segments in zip(segments_list, distances, original_segments_list):
+        t = glyph_stats and clock()
+        segments = translate_segments(segments, distance, provenance, curve_segments_only)
+        if glyph_stats is not None:
+            glyph_stats.add_time('translate', clock() - t)
+        # Remove subdivided points.
+        if subdivide:
+            t = glyph_stats and clock()
+            segments = merge_subdivided_segments(segments, provenance, original_segments)
+            if glyph_stats is not None:
+                glyph_stats.add_time('merge', clock() - t)
+        paths.append(beziers.path.BezierPath.fromSegments(segments))
+    return paths
 
 def draw(path, pen):
     segments = path.asSegments()
@@ -254,10 +431,70 @@ def draw(path, pen):
 def draw_points(path, point_pen):
     draw(path, SegmentToPointPen(point_pen))
 
+def make_nodes_from_bezier_path(path):
+    # Produce the same node list as draw_points() does through SegmentToPointPen.
+    segments = path.asSegments()
+    if len(segments) == 0:
+        return []
+    nodes = [(segments[0][0].x, segments[0][0].y, 'move')]
+    for segment in segments:
+        if isinstance(segment, beziers.line.Line):
+            nodes.append((segment[1].x, segment[1].y, 'line'))
+        elif isinstance(segment, beziers.cubicbezier.CubicBezier):
+            nodes.append((segment[1].x, segment[1].y, 'offcurve'))
+            nodes.append((segment[2].x, segment[2].y, 'offcurve'))
+            nodes.append((segment[3].x, segment[3].y, 'curve'))
+    if path.closed:
+        if len(nodes) > 1 and nodes[0][:2] == nodes[-1][:2]:
+            nodes[0] = nodes.pop()
+        else:
+            nodes[0] = (nodes[0][0], nodes[0][1], 'line')
+    return nodes
+
+def make_segment(start, offcurves, end):
+    Point = beziers.point.Point
+    if len(offcurves) == 0:
+        return beziers.line.Line(Point(start[0], start[1]), Point(end[0], end[1]))
+    elif len(offcurves) == 1:
+        return beziers.quadraticbezier.QuadraticBezier(Point(start[0], start[1]), Point(*offcurves[0]), Point(end[0], end[1]))
+    elif len(offcurves) == 2:
+        return beziers.cubicbezier.CubicBezier(Point(start[0], start[1]), Point(*offcurves[0]), Point(*offcurves[1]), Point(end[0], end[1]))
+    raise ValueError('Unknown segment type')
+
+def make_segments_from_nodes(nodes, closed=True):
+    # Build the segments from (x, y, type) nodes in a single pass. The result is the same as that of
+    # BezierPath.fromNodelist().asSegments(), without making Node objects and the intermediate lists:
+    # segments start at the first on-curve node, and a closed contour always gets a closing segment.
+    nodes = nodes if isinstance(nodes, list) else list(nodes)
+    if len(nodes) == 0:
+        return []
+    first_oncurve = -1
+    for i, node in enumerate(nodes):
+        if node[2] != 'offcurve':
+            first_oncurve = i
+            break
+    first = nodes[first_oncurve]
+    segments = []
+    start, offcurves = first, []
+    for node in itertools.chain(nodes[first_oncurve + 1:], nodes[:first_oncurve]):
+        node_type = node[2]
+        if node_type == 'offcurve':
+            offcurves.append((node[0], node[1]))
+        elif node_type == 'line' or node_type == 'curve':
+            segments.append(make_segment(start, offcurves, node))
+            start, offcurves = node, []
+    if closed:
+        segments.append(make_segment(start, offcurves, first))
+    return segments
+
+def make_bezier_path_from_nodes(nodes, closed=True):
+    path = beziers.path.BezierPath.fromSegments(make_segments_from_nodes(nodes, closed=closed))
+    path.closed = closed
+    return path
+
 def make_bezier_path_from_glyphs_path(gspath):
-    layer = GSLayer()
-    layer.paths.append(gspath.copy())
-    return beziers.path.BezierPath.fromGlyphsLayer(layer)[0]
+    # The coordinates and the types are read straight from the nodes, without copying the path into a layer.
+    return make_bezier_path_from_nodes([(node.position.x, node.position.y, node.type) for node in gspath.nodes], closed=gspath.closed)
 
 def offset_glyphs_path(gspath, distance):
     layer = GSLayer()
@@ -265,17 +502,24 @@ def offset_glyphs_path(gspath, distance):
     draw_points(path, layer.getPointPen())
     gspath.nodes = layer.paths[0].nodes
 
-def shear_path(path, shear_angle, std_vw, std_hw, mode='medium', strength=1.0, curve_segments_only=False, vertical=False, skip_shear=False):
+def make_shear_distance_func(shear_angle, std_vw, std_hw, mode='medium', strength=1.0, vertical=False):
+    
+    stem_scale_func = make_stem_scale_func(shear_angle, vertical=vertical, mode=mode)
 
     def distance_func(angle, index, count):
         stem_angle = angle + math.pi / 2.0
-        stem_scale = target_stem_scale(shear_angle, vertical=vertical, mode=mode) / expected_stem_scale(stem_angle, shear_angle, vertical=vertical)
+        stem_scale = stem_scale_func(stem_angle)
         stem_width = gradual_distance_from_angle(std_vw, std_hw, stem_angle)
         stem_diff  = ((stem_width - stem_width * stem_scale) / 2.0) * strength
         return stem_diff
     
+    return distance_func
+
+def shear_path(path, shear_angle, std_vw, std_hw, mode='medium', strength=1.0, curve_segments_only=False, vertical=False, skip_shear=False, tolerance=DEFAULT_TOLERANCE):
+    
     if mode != 'none':
-        path = offset_path(path, distance_func, curve_segments_only=curve_segments_only)
+        distance_func = make_shear_distance_func(shear_angle, std_vw, std_hw, mode=mode, strength=strength, vertical=vertical)
+        path = offset_path(path, distance_func, curve_segments_only=curve_segments_only, tolerance=tolerance)
     
     if not skip_shear:
         t = beziers.affinetransformation.AffineTransformation(shear_matrix(shear_angle, vertical=vertical))
@@ -300,50 +544,418 @@ def calc_comparable_path_string(gspath):
     layer.paths.append(gspath.copy())
     return layer.compareString()
 
+def calc_comparable_types_string(node_types):
+    # The signature of a contour, one character per node.
+    return ''.join(('o' if node_type == OFFCURVE else 'c' if node_type == CURVE else 'l') for node_type in node_types)
+
+def calc_comparable_nodes_string(nodes):
+    return calc_comparable_types_string((node[2] for node in nodes))
+
+def calc_gspath_signature(gspath):
+    # Same as calc_comparable_nodes_string(), straight from the nodes of the path.
+    return calc_comparable_types_string((node.type for node in gspath.nodes))
+
+def calc_prefix_table(pattern):
+    # The KMP prefix function of the pattern.
+    table = [0] * len(pattern)
+    k = 0
+    for i in range(1, len(pattern)):
+        while k > 0 and pattern[i] != pattern[k]:
+            k = table[k - 1]
+        if pattern[i] == pattern[k]:
+            k += 1
+        table[i] = k
+    return table
+
+def make_rotation_reference(nodes):
+    # The signature of a contour and its prefix table, which the results are matched against. The masters
+    # of a glyph share them, as their contours have the same signature (see offset_compatible_nodes()).
+    signature = calc_comparable_nodes_string(nodes)
+    return signature, calc_prefix_table(signature)
+
+def find_rotation(reference, target, table=None):
+    # Returns n such that list_shift() of the target by n has the same signature as the reference, or -1.
+    # The reference is searched in the doubled target with KMP, which takes linear time. Among several
+    # matches (e.g. for symmetric contours) the last one is taken, which is the rotation that searching
+    # the target in the doubled reference would find first. table is the prefix table of the reference,
+    # if already made.
+    number_of_nodes = len(reference)
+    if len(target) != number_of_nodes:
+        return -1
+    if reference == target:
+        return 0
+    if table is None:
+        table = calc_prefix_table(reference)
+    rotation = -1
+    k = 0
+    for i in range(2 * number_of_nodes - 1):
+        c = target[i - number_of_nodes if i >= number_of_nodes else i]
+        while k > 0 and c != reference[k]:
+            k = table[k - 1]
+        if c == reference[k]:
+            k += 1
+            if k == number_of_nodes:
+                rotation = i - number_of_nodes + 1
+                k = table[k - 1]
+    return rotation
+
+def fix_nodes_compatibility(reference_nodes, target_nodes, reference=None):
+    # Same as fix_path_compatibility() but for node lists; returns the rotated nodes or None. reference is
+    # the result of make_rotation_reference() for the reference nodes, if already made.
+    signature, table = reference or make_rotation_reference(reference_nodes)
+    rotation = find_rotation(signature, calc_comparable_nodes_string(target_nodes), table)
+    glyph_stats = betterObliqueStats.current()
+    if rotation == 0:
+        return target_nodes
+    elif rotation > 0:
+        if glyph_stats is not None:
+            glyph_stats.count('rotation_fixes')
+        return list_shift(target_nodes, rotation)
+    if glyph_stats is not None:
+        glyph_stats.count('incompatible_contours')
+    return None
+
 def fix_path_compatibility(reference_gspath, target_gspath):
     # Match the start node between the two compatible paths.
     # Find the first valid start node and make it first in the list.
-    reference_structure = calc_comparable_path_string(reference_gspath)
-    target_structure = calc_comparable_path_string(target_gspath)
-    if reference_structure == target_structure:
+    return fix_path_rotation(calc_gspath_signature(reference_gspath), target_gspath)
+
+def fix_path_rotation(reference_signature, target_gspath):
+    # fix_path_compatibility() with the signature of the reference path (see calc_gspath_signature()).
+    rotation = find_rotation(reference_signature, calc_gspath_signature(target_gspath))
+    glyph_stats = betterObliqueStats.current()
+    if rotation == 0:
         return True
-    elif len(reference_structure) == len(target_structure):
-        r = reference_structure.replace('_', '') * 2
-        t = target_structure.replace('_', '')
-        number_of_nodes = len(reference_structure)
-        closest_index = r.find(t)
-        if closest_index >= 0:
-            target_gspath.nodes = list_shift(target_gspath.nodes, (-closest_index - 1) % number_of_nodes)
-            return True
+    elif rotation > 0:
+        target_gspath.nodes = list_shift(list(target_gspath.nodes), rotation)
+        if glyph_stats is not None:
+            glyph_stats.count('rotation_fixes')
+        return True
+    if glyph_stats is not None:
+        glyph_stats.count('incompatible_contours')
     return False
 
-def shear_gspath(gspath, shear_angle, std_vw, std_hw, mode='medium', strength=1.0, curve_segments_only=False, vertical=False, skip_shear=False):
+def shear_gspath(gspath, shear_angle, std_vw, std_hw, mode='medium', strength=1.0, curve_segments_only=False, vertical=False, skip_shear=False, tolerance=DEFAULT_TOLERANCE):
     layer = GSLayer()
-    orig_gspath = gspath.copy()
+    # Only the signature of the original path is needed to fix the compatibility, so the path is not copied.
+    orig_signature = calc_gspath_signature(gspath)
     orig_node_names = tuple((node.name for node in gspath.nodes))
-    path = shear_path(make_bezier_path_from_glyphs_path(gspath), shear_angle, std_vw, std_hw, mode=mode, strength=strength, curve_segments_only=curve_segments_only, vertical=vertical, skip_shear=skip_shear)
-    first_node = path.asSegments()[-1][0]
-    first_node_position = (first_node.x, first_node.y)
+    path = shear_path(make_bezier_path_from_glyphs_path(gspath), shear_angle, std_vw, std_hw, mode=mode, strength=strength, curve_segments_only=curve_segments_only, vertical=vertical, skip_shear=skip_shear, tolerance=tolerance)
+    glyph_stats = betterObliqueStats.current()
+    t = glyph_stats and clock()
     draw_points(path, layer.getPointPen())
+    if glyph_stats is not None:
+        glyph_stats.add_time('draw', clock() - t)
     if len(layer.paths) > 0 and layer.paths[0]:
         gspath.nodes = layer.paths[0].nodes
         # Try fixing path compatibility afterwards and keep the node names when possible.
-        if fix_path_compatibility(orig_gspath, gspath):
+        t = glyph_stats and clock()
+        compatible = fix_path_rotation(orig_signature, gspath)
+        if glyph_stats is not None:
+            glyph_stats.add_time('compatibility', clock() - t)
+        if compatible:
             for i, orig_node_name in enumerate(orig_node_names):
                 gspath.nodes[i].name = orig_node_name
+            return True
+    return False
+
+def calc_gspath_nodes(gspath):
+    # The start node of an open path is marked as 'move' like in the point pen protocol.
+    nodes = [(node.position.x, node.position.y, node.type) for node in gspath.nodes]
+    if not gspath.closed and len(nodes) > 0:
+        nodes[0] = (nodes[0][0], nodes[0][1], 'move')
+    return nodes
+
+def set_gspath_nodes(gspath, nodes, keep_names=True):
+    orig_node_names = tuple((node.name for node in gspath.nodes))
+    gspath.nodes = [GSNode((x, y), 'line' if node_type == 'move' else node_type) for x, y, node_type in nodes]
+    if keep_names:
+        for i, orig_node_name in enumerate(orig_node_names):
+            gspath.nodes[i].name = orig_node_name
+
+def offset_nodes(nodes, shear_angle, std_vw, std_hw, mode='medium', strength=1.0, curve_segments_only=False, vertical=False, tolerance=DEFAULT_TOLERANCE):
+    # Apply the optical correction of shear_path() to the nodes without skewing them. Nodes are
+    # (x, y, type) tuples, and the type is one of 'move', 'line', 'curve', 'qcurve' and 'offcurve'.
+    # Returns the new nodes and whether they are compatible with the original ones so that node
+    # attributes can be kept.
+    if len(nodes) == 0 or mode == 'none' or any((node[2] == 'qcurve' for node in nodes)):
+        # offset_path() only deals with lines and cubic curves.
+        return list(nodes), True
+    closed = nodes[0][2] != 'move'
+    path = shear_path(make_bezier_path_from_nodes(nodes, closed=closed), shear_angle, std_vw, std_hw, mode=mode, strength=strength, curve_segments_only=curve_segments_only, vertical=vertical, skip_shear=True, tolerance=tolerance)
+    return make_offset_nodes(nodes, path, closed)
+
+def make_offset_nodes(nodes, path, closed, reference=None):
+    # Returns the nodes of the offset path, rotated to match the original nodes if possible, and whether they match.
+    # See fix_nodes_compatibility() for reference.
+    glyph_stats = betterObliqueStats.current()
+    t = glyph_stats and clock()
+    new_nodes = make_nodes_from_bezier_path(path)
+    if not closed and len(new_nodes) > 0:
+        new_nodes[0] = (new_nodes[0][0], new_nodes[0][1], 'move')
+    if glyph_stats is not None:
+        glyph_stats.add_time('draw', clock() - t)
+        t = clock()
+    compatible_nodes = fix_nodes_compatibility(nodes, new_nodes, reference)
+    if glyph_stats is not None:
+        glyph_stats.add_time('compatibility', clock() - t)
+    if compatible_nodes is None:
+        return new_nodes, False
+    return compatible_nodes, True
+
+def offset_compatible_nodes(nodes_list, shear_angle, stems, mode='medium', strength=1.0, curve_segments_only=False, vertical=False, tolerance=DEFAULT_TOLERANCE):
+    # offset_nodes() for compatible contours of the masters of a glyph, with (std_vw, std_hw) for each
+    # in stems. They share the subdivision and the merge plan (see offset_compatible_paths()).
+    nodes = nodes_list[0]
+    if len(nodes) == 0 or mode == 'none' or any((node[2] == 'qcurve' for node in nodes)):
+        return [(list(nodes), True) for nodes in nodes_list]
+    closed = nodes[0][2] != 'move'
+    paths = [make_bezier_path_from_nodes(nodes, closed=closed) for nodes in nodes_list]
+    distances = [make_shear_distance_func(shear_angle, std_vw, std_hw, mode=mode, strength=strength, vertical=vertical) for std_vw, std_hw in stems]
+    reference = make_rotation_reference(nodes)
+    return [make_offset_nodes(nodes, path, closed, reference) for nodes, path in zip(nodes_list, offset_compatible_paths(paths, distances, curve_segments_only=curve_segments_only, tolerance=tolerance))]
+
+def transform_nodes(nodes, transform):
+    a, b, c, d, tx, ty = transform
+    return [(a * x + c * y + tx, b * x + d * y + ty, node_type) for x, y, node_type in nodes]
+
+def shear_nodes(nodes, shear_angle, std_vw, std_hw, mode='medium', strength=1.0, curve_segments_only=False, vertical=False, skip_shear=False, tolerance=DEFAULT_TOLERANCE):
+    # Headless counterpart of shear_gspath(); see offset_nodes() for the nodes.
+    new_nodes, compatible = offset_nodes(nodes, shear_angle, std_vw, std_hw, mode=mode, strength=strength, curve_segments_only=curve_segments_only, vertical=vertical, tolerance=tolerance)
+    if not skip_shear:
+        new_nodes = transform_nodes(new_nodes, shear_transform(shear_angle, vertical=vertical))
+    return new_nodes, compatible
+
+def cubic_extrema(p0, p1, p2, p3):
+    # Parameters in (0, 1) where the derivative of a cubic bezier curve vanishes along one axis.
+    a = -p0 + 3.0 * p1 - 3.0 * p2 + p3
+    b = 2.0 * (p0 - 2.0 * p1 + p2)
+    c = p1 - p0
+    if abs(a) < 1e-12:
+        roots = [-c / b] if b != 0.0 else []
+    else:
+        discriminant = b * b - 4.0 * a * c
+        if discriminant < 0.0:
+            return []
+        sq = math.sqrt(discriminant)
+        roots = [(-b + sq) / (2.0 * a), (-b - sq) / (2.0 * a)]
+    return [t for t in roots if 0.0 < t < 1.0]
+
+def cubic_value(p0, p1, p2, p3, t):
+    mt = 1.0 - t
+    return mt * mt * mt * p0 + 3.0 * mt * mt * t * p1 + 3.0 * mt * t * t * p2 + t * t * t * p3
+
+def calc_nodes_bounds(contours, transform=None):
+    # Exact bounds of the contours, optionally after the affine transformation, as (xMin, yMin, xMax, yMax).
+    # The extrema of the cubic curves are computed analytically. Quadratic curves are bounded by their
+    # control points, which is good enough as they are never offset.
+    xs, ys = [], []
+    for nodes in contours:
+        if transform is not None:
+            nodes = transform_nodes(nodes, transform)
+        if any((node[2] == 'qcurve' for node in nodes)):
+            xs.extend((x for x, _, _ in nodes))
+            ys.extend((y for _, y, _ in nodes))
+            continue
+        for i, (x, y, node_type) in enumerate(nodes):
+            if node_type == 'offcurve':
+                continue
+            xs.append(x)
+            ys.append(y)
+            if node_type == 'curve' and len(nodes) >= 3:
+                (x0, y0, _), (x1, y1, _), (x2, y2, _) = nodes[i - 3], nodes[i - 2], nodes[i - 1]
+                xs.extend((cubic_value(x0, x1, x2, x, t) for t in cubic_extrema(x0, x1, x2, x)))
+                ys.extend((cubic_value(y0, y1, y2, y, t) for t in cubic_extrema(y0, y1, y2, y)))
+    if len(xs) == 0:
+        return None
+    return (min(xs), min(ys), max(xs), max(ys))
+
+def union_bounds(bounds_list):
+    bounds_list = [bounds for bounds in bounds_list if bounds is not None]
+    if len(bounds_list) == 0:
+        return None
+    return (min((b[0] for b in bounds_list)), min((b[1] for b in bounds_list)), max((b[2] for b in bounds_list)), max((b[3] for b in bounds_list)))
+
+def make_cache_params(shear_angle, std_vw, std_hw, optical_correction, strength, curve_segments_only, vertical, center, skip_shear, tolerance):
+    # Everything that affects the result goes into the cache key.
+    return {
+        'angle': float(shear_angle),
+        'std_vw': float(std_vw),
+        'std_hw': float(std_hw),
+        'opticalCorrection': optical_correction,
+        'strength': float(strength),
+        'curveSegmentsOnly': bool(curve_segments_only),
+        'vertical': bool(vertical),
+        'keepCenter': bool(center),
+        'applyWithoutSkewing': bool(skip_shear),
+        'tolerance': float(tolerance),
+    }
 
 #
 
-def shear_layer(layer, shear_angle, std_vw=40.0, std_hw=40.0, optical_correction='medium', strength=1.0, curve_segments_only=False, vertical=False, center=True, skip_shear=False):
+def count_cache_hit():
+    glyph_stats = betterObliqueStats.current()
+    if glyph_stats is not None:
+        glyph_stats.count('cache_hits')
+
+def shear_contours(contours, shear_angle, std_vw=40.0, std_hw=40.0, optical_correction='medium', strength=1.0, curve_segments_only=False, vertical=False, center=True, skip_shear=False, tolerance=DEFAULT_TOLERANCE, extra_bounds=None, cache=None):
+    # Headless counterpart of shear_layer(). Returns a list of (nodes, compatible) tuples.
+    # extra_bounds is a list of the bounds of the other elements that stay as they are (e.g. components),
+    # which are taken into account when keeping the center.
+    # The results are looked up in and stored to the cache (see betterObliqueCache.py) if given.
     if std_vw is None or std_hw is None:
         raise ValueError('StdVW and StdHW need to be defined to run this filter.')
-    orig_bounds = layer.bounds
-    for path in layer.paths:
-        shear_gspath(path, shear_angle, std_vw, std_hw, mode=optical_correction, strength=strength, curve_segments_only=curve_segments_only, vertical=vertical, skip_shear=skip_shear)
-    new_bounds = layer.bounds
+    extra_bounds = [tuple(bounds) for bounds in extra_bounds or ()]
+    if cache is not None:
+        cache_params = make_cache_params(shear_angle, std_vw, std_hw, optical_correction, strength, curve_segments_only, vertical, center, skip_shear, tolerance)
+        if center and extra_bounds:
+            cache_params['bounds'] = tuple(extra_bounds)
+        results = cache.get(contours, cache_params)
+        if results is not None:
+            count_cache_hit()
+            return results
+    results = [offset_nodes(nodes, shear_angle, std_vw, std_hw, mode=optical_correction, strength=strength, curve_segments_only=curve_segments_only, vertical=vertical, tolerance=tolerance) for nodes in contours]
+    results = transform_offset_contours(contours, results, shear_angle, vertical=vertical, center=center, skip_shear=skip_shear, extra_bounds=extra_bounds)
+    if cache is not None:
+        cache.put(contours, cache_params, results)
+    return results
+
+def shear_master_contours(contours_list, shear_angle, stems, optical_correction='medium', strength=1.0, curve_segments_only=False, vertical=False, center=True, skip_shear=False, tolerance=DEFAULT_TOLERANCE, extra_bounds_list=None, cache=None):
+    # shear_contours() for all the masters of a glyph at once. contours_list and stems have the contours
+    # and (std_vw, std_hw) of each master. Corresponding contours that are compatible share the subdivision
+    # and the merge plan, so the results stay compatible for interpolation. Returns the results of shear_contours()
+    # for each master.
+    if any((std_vw is None or std_hw is None for std_vw, std_hw in stems)):
+        raise ValueError('StdVW and StdHW need to be defined to run this filter.')
+    extra_bounds_list = [[tuple(bounds) for bounds in extra_bounds or ()] for extra_bounds in extra_bounds_list or [None] * len(contours_list)]
+    if cache is not None:
+        # The contours of all the masters make a single entry.
+        all_contours = [nodes for contours in contours_list for nodes in contours]
+        cache_params = make_cache_params(shear_angle, 0.0, 0.0, optical_correction, strength, curve_segments_only, vertical, center, skip_shear, tolerance)
+        cache_params['masters'] = tuple(((len(contours), float(std_vw), float(std_hw), tuple(extra_bounds) if center else ()) for contours, (std_vw, std_hw), extra_bounds in zip(contours_list, stems, extra_bounds_list)))
+        all_results = cache.get(all_contours, cache_params)
+        if all_results is not None:
+            count_cache_hit()
+            results_list = []
+            for contours in contours_list:
+                results_list.append(all_results[:len(contours)])
+                all_results = all_results[len(contours):]
+            return results_list
+    if len(set((len(contours) for contours in contours_list))) == 1:
+        offset_results_list = [[] for _ in contours_list]
+        for nodes_list in zip(*contours_list):
+            if len(set((calc_comparable_nodes_string(nodes) for nodes in nodes_list))) == 1:
+                results = offset_compatible_nodes(nodes_list, shear_angle, stems, mode=optical_correction, strength=strength, curve_segments_only=curve_segments_only, vertical=vertical, tolerance=tolerance)
+            else:
+                results = [offset_nodes(nodes, shear_angle, std_vw, std_hw, mode=optical_correction, strength=strength, curve_segments_only=curve_segments_only, vertical=vertical, tolerance=tolerance) for nodes, (std_vw, std_hw) in zip(nodes_list, stems)]
+            for offset_results, result in zip(offset_results_list, results):
+                offset_results.append(result)
+    else:
+        # The masters are not compatible at all; shear them one by one.
+        offset_results_list = [[offset_nodes(nodes, shear_angle, std_vw, std_hw, mode=optical_correction, strength=strength, curve_segments_only=curve_segments_only, vertical=vertical, tolerance=tolerance) for nodes in contours] for contours, (std_vw, std_hw) in zip(contours_list, stems)]
+    results_list = [transform_offset_contours(contours, offset_results, shear_angle, vertical=vertical, center=center, skip_shear=skip_shear, extra_bounds=extra_bounds) for contours, offset_results, extra_bounds in zip(contours_list, offset_results_list, extra_bounds_list)]
+    if cache is not None:
+        cache.put(all_contours, cache_params, [result for results in results_list for result in results])
+    return results_list
+
+def transform_offset_contours(contours, results, shear_angle, vertical=False, center=True, skip_shear=False, extra_bounds=()):
+    # The shear and the translation to keep the center are composed, and applied at once. The bounds
+    # after shearing are computed from the offset nodes in advance.
+    glyph_stats = betterObliqueStats.current()
+    t = glyph_stats and clock()
+    transform = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0) if skip_shear else shear_transform(shear_angle, vertical=vertical)
     if center:
-        orig_center = (orig_bounds.origin.x + orig_bounds.size.width / 2.0, orig_bounds.origin.y + orig_bounds.size.height / 2.0)
-        new_center  = (new_bounds.origin.x  + new_bounds.size.width / 2.0,  new_bounds.origin.y  + new_bounds.size.height / 2.0)
-        offset = (orig_center[0] - new_center[0], orig_center[1] - new_center[1])
-        for path in layer.paths:
-            path.applyTransform((1.0, 0.0, 0.0, 1.0, offset[0], offset[1]))
+        orig_bounds = union_bounds([calc_nodes_bounds(contours)] + list(extra_bounds))
+        new_bounds  = union_bounds([calc_nodes_bounds([nodes for nodes, _ in results], transform)] + list(extra_bounds))
+        if orig_bounds is not None and new_bounds is not None:
+            dx = (orig_bounds[0] + orig_bounds[2]) / 2.0 - (new_bounds[0] + new_bounds[2]) / 2.0
+            dy = (orig_bounds[1] + orig_bounds[3]) / 2.0 - (new_bounds[1] + new_bounds[3]) / 2.0
+            transform = translate_transform(transform, dx, dy)
+    results = [(transform_nodes(nodes, transform), compatible) for nodes, compatible in results]
+    if glyph_stats is not None:
+        glyph_stats.add_time('transform', clock() - t)
+    return results
+
+#
+
+def calc_control_box(segment):
+    xs = [p.x for p in segment.points]
+    ys = [p.y for p in segment.points]
+    return (min(xs), min(ys), max(xs), max(ys))
+
+def make_collision_segments(nodes):
+    # The segments of the contour and the boxes of their control points, or None for quadratic contours,
+    # which make_segments_from_nodes() doesn't deal with.
+    if len(nodes) == 0 or any((node[2] == 'qcurve' for node in nodes)):
+        return None
+    segments = make_segments_from_nodes(nodes, closed=nodes[0][2] != 'move')
+    return segments, [calc_control_box(segment) for segment in segments]
+
+def segments_collide(segments1, segments2):
+    # Whether the outlines cross or touch. Only the segments whose control boxes overlap are intersected.
+    (segments1, boxes1), (segments2, boxes2) = segments1, segments2
+    for i, j in overlapping_pairs(boxes1, boxes2):
+        for intersection in segments1[i].intersections(segments2[j], limited=False):
+            if -COLLISION_EPSILON <= intersection.t1 <= 1.0 + COLLISION_EPSILON and -COLLISION_EPSILON <= intersection.t2 <= 1.0 + COLLISION_EPSILON:
+                return True
+    return False
+
+def iter_contour_collisions(contours, original_contours=None):
+    # Yields the pairs (i, j), i < j, of the contours whose outlines cross or touch each other. With
+    # original_contours, the contours before processing, pairs that already collided there are left out.
+    # The contours are swept by their bounds first, so only the pairs whose bounds overlap are examined,
+    # and their segments are made once, when first needed. Quadratic contours are not checked.
+    def make_segments_getter(contours):
+        segments_list = {}
+        def get_segments(k):
+            if k not in segments_list:
+                segments_list[k] = make_collision_segments(contours[k])
+            return segments_list[k]
+        return get_segments
+    get_segments = make_segments_getter(contours)
+    get_original_segments = make_segments_getter(original_contours) if original_contours is not None else None
+    indices = [i for i, nodes in enumerate(contours) if nodes]
+    for a, b in overlapping_pairs([calc_nodes_bounds([contours[i]]) for i in indices]):
+        i, j = indices[a], indices[b]
+        segments_i, segments_j = get_segments(i), get_segments(j)
+        if segments_i is None or segments_j is None or not segments_collide(segments_i, segments_j):
+            continue
+        if get_original_segments is not None:
+            segments_i, segments_j = get_original_segments(i), get_original_segments(j)
+            if segments_i is not None and segments_j is not None and segments_collide(segments_i, segments_j):
+                continue
+        yield i, j
+
+def find_contour_collisions(contours, original_contours=None):
+    # Returns the pairs (i, j), i < j, of the contours whose outlines cross or touch each other, e.g. when
+    # the offsets have pushed neighbouring strokes into each other. With original_contours, the contours
+    # before processing, pairs that already collided there are left out, so that only the collisions made
+    # by the processing are reported (see iter_contour_collisions()).
+    glyph_stats = betterObliqueStats.current()
+    t = glyph_stats and clock()
+    collisions = list(iter_contour_collisions(contours, original_contours))
+    if glyph_stats is not None:
+        glyph_stats.add_time('collisions', clock() - t)
+        glyph_stats.count('contour_collisions', len(collisions))
+    return collisions
+
+#
+
+def calc_component_bounds(layer):
+    bounds_list = []
+    for component in layer.components:
+        rect = component.bounds
+        bounds_list.append((rect.origin.x, rect.origin.y, rect.origin.x + rect.size.width, rect.origin.y + rect.size.height))
+    return bounds_list
+
+def apply_contours_to_layer(layer, results):
+    # Put the results of shear_contours() into the layer, e.g. when they have been computed in the background.
+    for path, (nodes, compatible) in zip(layer.paths, results):
+        set_gspath_nodes(path, nodes, keep_names=compatible)
+
+def shear_layer(layer, shear_angle, std_vw=40.0, std_hw=40.0, optical_correction='medium', strength=1.0, curve_segments_only=False, vertical=False, center=True, skip_shear=False, tolerance=DEFAULT_TOLERANCE, cache=None):
+    # The components are not transformed, but their bounds affect the centering like layer.bounds does.
+    with betterObliqueStats.record(layer.parent.name if layer.parent is not None else None):
+        contours = [calc_gspath_nodes(path) for path in layer.paths]
+        results = shear_contours(contours, shear_angle, std_vw=std_vw, std_hw=std_hw, optical_correction=optical_correction, strength=strength, curve_segments_only=curve_segments_only, vertical=vertical, center=center, skip_shear=skip_shear, tolerance=tolerance, extra_bounds=calc_component_bounds(layer), cache=cache)
+        apply_contours_to_layer(layer, results)
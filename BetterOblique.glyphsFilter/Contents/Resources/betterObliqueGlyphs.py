@@ -0,0 +1,386 @@
+# -*- coding: utf-8 -*-
+
+# A pure-Python stand-in for the part of the GlyphsApp API used by betterObliqueFilter, so that the
+# filter runs outside Glyphs, e.g. in worker processes, on build machines or under a profiler.
+# betterObliqueFilter falls back to it when GlyphsApp cannot be imported.
+#
+# The objects behave like their counterparts in Glyphs 3 as far as the filter is concerned: node
+# types are strings, the nodes of a path are in the order of the point pen protocol with the start
+# of an open path as a 'line' node, and transformations are (a, b, c, d, tx, ty) tuples.
+
+from __future__ import division
+
+import math
+
+from fontTools.pens.pointPen import SegmentToPointPen, PointToSegmentPen
+
+__all__ = [
+    'LINE', 'CURVE', 'QCURVE', 'OFFCURVE', 'GSLINE', 'GSCURVE', 'GSQCURVE', 'GSOFFCURVE',
+    'NSPoint', 'NSSize', 'NSRect', 'NSMakePoint', 'NSMakeRect',
+    'GSNode', 'GSPath', 'GSComponent', 'GSLayer',
+]
+
+LINE = GSLINE = 'line'
+CURVE = GSCURVE = 'curve'
+QCURVE = GSQCURVE = 'qcurve'
+OFFCURVE = GSOFFCURVE = 'offcurve'
+
+COMPARE_CHARACTERS = {LINE: 'l', CURVE: 'c', QCURVE: 'q', OFFCURVE: 'o'}
+
+
+class NSPoint(object):
+    __slots__ = ('x', 'y')
+
+    def __init__(self, x=0.0, y=0.0):
+        self.x = x
+        self.y = y
+
+    def __iter__(self):
+        return iter((self.x, self.y))
+
+    def __eq__(self, other):
+        return tuple(self) == tuple(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return '<NSPoint x={0} y={1}>'.format(self.x, self.y)
+
+
+class NSSize(object):
+    __slots__ = ('width', 'height')
+
+    def __init__(self, width=0.0, height=0.0):
+        self.width = width
+        self.height = height
+
+
+class NSRect(object):
+    __slots__ = ('origin', 'size')
+
+    def __init__(self, origin=None, size=None):
+        self.origin = origin or NSPoint()
+        self.size = size or NSSize()
+
+    def __repr__(self):
+        return '<NSRect origin=({0}, {1}) size=({2}, {3})>'.format(self.origin.x, self.origin.y, self.size.width, self.size.height)
+
+def NSMakePoint(x, y):
+    return NSPoint(x, y)
+
+def NSMakeRect(x, y, width, height):
+    return NSRect(NSPoint(x, y), NSSize(width, height))
+
+def make_rect_from_bounds(bounds):
+    # The empty rect is returned for no bounds, like Glyphs does for an empty layer.
+    if bounds is None:
+        return NSRect()
+    x_min, y_min, x_max, y_max = bounds
+    return NSMakeRect(x_min, y_min, x_max - x_min, y_max - y_min)
+
+def transform_point(transform, x, y):
+    a, b, c, d, tx, ty = transform
+    return a * x + c * y + tx, b * x + d * y + ty
+
+
+class GSNode(object):
+
+    def __init__(self, pt=(0.0, 0.0), type=LINE):
+        self.position = NSPoint(pt[0], pt[1])
+        self.type = type
+        self.smooth = False
+        self.name = None
+        self.parent = None
+
+    @property
+    def x(self):
+        return self.position.x
+
+    @x.setter
+    def x(self, value):
+        self.position.x = value
+
+    @property
+    def y(self):
+        return self.position.y
+
+    @y.setter
+    def y(self, value):
+        self.position.y = value
+
+    def copy(self):
+        node = GSNode((self.position.x, self.position.y), self.type)
+        node.smooth = self.smooth
+        node.name = self.name
+        return node
+
+    def __repr__(self):
+        return '<GSNode x={0} y={1} {2}>'.format(self.position.x, self.position.y, self.type)
+
+
+class GSPath(object):
+
+    def __init__(self):
+        self._nodes = []
+        self.closed = True
+        self.parent = None
+
+    @property
+    def nodes(self):
+        return self._nodes
+
+    @nodes.setter
+    def nodes(self, nodes):
+        # Like in Glyphs, the nodes are owned by the path, so nodes that belong to another path are copied.
+        self._nodes = [node if node.parent is None or node.parent is self else node.copy() for node in nodes]
+        for node in self._nodes:
+            node.parent = self
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def __bool__(self):
+        return True
+
+    __nonzero__ = __bool__
+
+    def copy(self):
+        path = GSPath()
+        path.nodes = [node.copy() for node in self._nodes]
+        path.closed = self.closed
+        return path
+
+    def applyTransform(self, transform):
+        for node in self._nodes:
+            node.position.x, node.position.y = transform_point(transform, node.position.x, node.position.y)
+
+    @property
+    def bounds(self):
+        return make_rect_from_bounds(calc_bounds([self]))
+
+    def removeNodeCheckKeepShape_(self, node):
+        # Remove an on-curve node. Between two curves, the handles of the joined curve keep their directions
+        # and their lengths are chosen so that the shape changes as little as possible (see fit_joined_handles()).
+        nodes = self._nodes
+        i = nodes.index(node)
+        n = len(nodes)
+        if node.type == OFFCURVE:
+            raise ValueError('Only on-curve nodes can be removed.')
+        if node.type == CURVE and nodes[(i + 1) % n].type == OFFCURVE and nodes[(i + 3) % n].type == CURVE:
+            p = [nodes[(i + k) % n].position for k in range(-3, 4)]
+            h1, h2 = fit_joined_handles([(q.x, q.y) for q in p])
+            nodes[(i - 2) % n].position = NSPoint(*h1)
+            nodes[(i + 2) % n].position = NSPoint(*h2)
+            for k in sorted(((i - 1) % n, i, (i + 1) % n), reverse=True):
+                del nodes[k]
+        else:
+            # The segment that ends at the node is removed, including its handles.
+            remove = [i]
+            k = (i - 1) % n
+            while nodes[k].type == OFFCURVE and k != i:
+                remove.append(k)
+                k = (k - 1) % n
+            for k in sorted(remove, reverse=True):
+                del nodes[k]
+        node.parent = None
+
+    def __repr__(self):
+        return '<GSPath {0} nodes {1}>'.format(len(self._nodes), 'closed' if self.closed else 'open')
+
+
+class GSComponent(object):
+    # A component refers to a layer of the base glyph through `layer`, which the stand-in needs to compute
+    # the bounds; Glyphs looks the glyph up by name in the font instead.
+
+    def __init__(self, glyph_name, offset=(0.0, 0.0), layer=None):
+        self.name = self.componentName = glyph_name
+        self.transform = (1.0, 0.0, 0.0, 1.0, offset[0], offset[1])
+        self.layer = layer
+        self.parent = None
+
+    @property
+    def position(self):
+        return NSPoint(self.transform[4], self.transform[5])
+
+    def applyTransform(self, transform):
+        a1, b1, c1, d1, tx1, ty1 = self.transform
+        a2, b2, c2, d2, tx2, ty2 = transform
+        tx, ty = transform_point(transform, tx1, ty1)
+        self.transform = (a2 * a1 + c2 * b1, b2 * a1 + d2 * b1, a2 * c1 + c2 * d1, b2 * c1 + d2 * d1, tx, ty)
+
+    @property
+    def bounds(self):
+        if self.layer is None:
+            return NSRect()
+        return make_rect_from_bounds(calc_bounds(self.layer.paths, self.transform))
+
+
+class GSLayer(object):
+
+    def __init__(self):
+        self._paths = []
+        self._components = []
+        self.name = None
+        self.layerId = None
+        self.associatedMasterId = None
+        self.width = 600.0
+        self.parent = None
+
+    @property
+    def paths(self):
+        return self._paths
+
+    @paths.setter
+    def paths(self, paths):
+        self._paths = []
+        for path in paths:
+            self.addPath(path)
+
+    @property
+    def components(self):
+        return self._components
+
+    @components.setter
+    def components(self, components):
+        self._components = []
+        for component in components:
+            self.addComponent(component)
+
+    @property
+    def shapes(self):
+        return self._paths + self._components
+
+    def addPath(self, path):
+        path.parent = self
+        self._paths.append(path)
+
+    def addComponent(self, component):
+        component.parent = self
+        self._components.append(component)
+
+    def getPointPen(self):
+        return LayerPointPen(self)
+
+    def getPen(self):
+        return SegmentToPointPen(LayerPointPen(self))
+
+    def draw(self, pen):
+        self.drawPoints(PointToSegmentPen(pen))
+
+    def drawPoints(self, point_pen):
+        for path in self._paths:
+            point_pen.beginPath()
+            for i, node in enumerate(path.nodes):
+                node_type = node.type
+                if i == 0 and not path.closed:
+                    node_type = 'move'
+                point_pen.addPoint((node.position.x, node.position.y), segmentType=None if node_type == OFFCURVE else node_type, smooth=node.smooth, name=node.name)
+            point_pen.endPath()
+        for component in self._components:
+            point_pen.addComponent(component.componentName, component.transform)
+
+    def compareString(self):
+        # One character per node and '_' at the end of each path, as used to check the compatibility of layers.
+        return ''.join((''.join((COMPARE_CHARACTERS.get(node.type, 'l') for node in path.nodes)) + '_' for path in self._paths))
+
+    def applyTransform(self, transform):
+        for path in self._paths:
+            path.applyTransform(transform)
+        for component in self._components:
+            component.applyTransform(transform)
+
+    @property
+    def bounds(self):
+        bounds_list = [calc_bounds(self._paths)]
+        for component in self._components:
+            rect = component.bounds
+            if rect.size.width > 0.0 or rect.size.height > 0.0:
+                bounds_list.append((rect.origin.x, rect.origin.y, rect.origin.x + rect.size.width, rect.origin.y + rect.size.height))
+        bounds_list = [bounds for bounds in bounds_list if bounds is not None]
+        if len(bounds_list) == 0:
+            return NSRect()
+        return make_rect_from_bounds((min((b[0] for b in bounds_list)), min((b[1] for b in bounds_list)), max((b[2] for b in bounds_list)), max((b[3] for b in bounds_list))))
+
+    def copy(self):
+        layer = GSLayer()
+        layer.paths = [path.copy() for path in self._paths]
+        layer.components = [GSComponent(component.componentName, layer=component.layer) for component in self._components]
+        for new_component, component in zip(layer.components, self._components):
+            new_component.transform = component.transform
+        layer.width = self.width
+        return layer
+
+
+class LayerPointPen(object):
+    # Point pen that appends the drawn contours to the layer as paths.
+
+    def __init__(self, layer):
+        self.layer = layer
+        self._nodes = None
+
+    def beginPath(self, identifier=None, **kwargs):
+        self._nodes = []
+
+    def addPoint(self, pt, segmentType=None, smooth=False, name=None, identifier=None, **kwargs):
+        node = GSNode(pt, segmentType or OFFCURVE)
+        node.smooth = smooth
+        node.name = name
+        self._nodes.append(node)
+
+    def endPath(self):
+        path = GSPath()
+        nodes = self._nodes
+        self._nodes = None
+        if len(nodes) > 0 and nodes[0].type == 'move':
+            path.closed = False
+            nodes[0].type = LINE
+        path.nodes = nodes
+        self.layer.addPath(path)
+
+    def addComponent(self, baseGlyphName, transformation, identifier=None, **kwargs):
+        component = GSComponent(baseGlyphName)
+        component.transform = tuple(transformation)
+        self.layer.addComponent(component)
+
+#
+
+def calc_bounds(paths, transform=None):
+    # Exact bounds of the paths as (xMin, yMin, xMax, yMax), or None if there are no nodes. The extrema
+    # are found as in calc_nodes_bounds() of betterObliqueFilter, which imports this module in turn.
+    from betterObliqueFilter import cubic_extrema, cubic_value
+    xs, ys = [], []
+    for path in paths:
+        points = [(node.position.x, node.position.y, node.type) for node in path.nodes]
+        if transform is not None:
+            points = [transform_point(transform, x, y) + (node_type,) for x, y, node_type in points]
+        for i, (x, y, node_type) in enumerate(points):
+            if node_type == OFFCURVE:
+                continue
+            xs.append(x)
+            ys.append(y)
+            if node_type == CURVE and len(points) >= 3 and (path.closed or i >= 3):
+                (x0, y0, _), (x1, y1, _), (x2, y2, _) = points[i - 3], points[i - 2], points[i - 1]
+                xs.extend((cubic_value(x0, x1, x2, x, t) for t in cubic_extrema(x0, x1, x2, x)))
+                ys.extend((cubic_value(y0, y1, y2, y, t) for t in cubic_extrema(y0, y1, y2, y)))
+            elif node_type == QCURVE:
+                # Quadratic curves are bounded by their control points.
+                k = i - 1
+                while points[k][2] == OFFCURVE and k != i:
+                    xs.append(points[k][0])
+                    ys.append(points[k][1])
+                    k -= 1
+    if len(xs) == 0:
+        return None
+    return (min(xs), min(ys), max(xs), max(ys))
+
+def fit_joined_handles(points):
+    # points are the seven points of two adjacent cubic curves. Returns the two handles of a single curve
+    # from points[0] to points[6], assuming that the curves are the halves of a curve split at some t,
+    # which is estimated from the lengths of the handles at the joint. The result is exact in that case.
+    (x0, y0), (x1, y1), (x2, y2), (x3, y3), (x4, y4), (x5, y5), (x6, y6) = points
+    d1 = math.hypot(x3 - x2, y3 - y2)
+    d2 = math.hypot(x4 - x3, y4 - y3)
+    t = d1 / (d1 + d2) if d1 + d2 > 0.0 else 0.5
+    t = min(max(t, 0.01), 0.99)
+    return (x0 + (x1 - x0) / t, y0 + (y1 - y0) / t), (x6 + (x5 - x6) / (1.0 - t), y6 + (y5 - y6) / (1.0 - t))
@@ -0,0 +1,343 @@
+# -*- coding: utf-8 -*-
+
+# Overlap removal of whole layers with pyclipper.
+#
+# Only the closed contours that cross each other are merged, group by group along with the contours
+# around them; the others are passed through as they are, so that they keep their point attributes.
+# The contours of each group are flattened adaptively into polygons in integer coordinates (SCALE units
+# per font unit), and merged by a single union with the nonzero fill rule, so that counters drawn in the
+# opposite direction are kept. Every vertex of the polygons is recorded in a lookup table along with the
+# segment and the time it came from. The union keeps those vertices as they are, so each edge of the
+# result is traced back to its segment, and runs of edges along the same segment are replaced by the
+# part of the original line or curve between their ends. The vertices made by the union lie on an edge
+# of one of the polygons on either side; their times are interpolated along it, and then refined by
+# Newton's method to where the segments actually meet. Only the edges that can't be traced back, which
+# are shorter than the flattening tolerance, end up as lines. Open and quadratic contours are left as
+# they are.
+#
+#   from betterObliqueOverlaps import remove_overlaps
+#   contours = [nodes for nodes, _ in remove_overlaps(contours)]
+
+from __future__ import division
+
+import pyclipper
+
+import beziers.line
+
+import betterObliqueStats
+from betterObliqueStats import clock
+from betterObliqueFilter import make_segments_from_nodes, calc_nodes_bounds, iter_contour_collisions
+
+SCALE = 1024
+FLATTEN_TOLERANCE = 0.05
+MAX_FLATTEN_DEPTH = 10
+# Distance in clipper units within which a vertex made by the union is taken to be on an edge.
+SNAP_DISTANCE = 2.0
+# Difference in time within which an edge is taken to start where the one before it ends.
+CONTINUITY_TOLERANCE = 1e-9
+# Newton's method refines the vertices made by the union, which have to stay within this many times the
+# flattening tolerance.
+NEWTON_ITERATIONS = 4
+MAX_REFINEMENT = 20.0
+
+def split_cubic(points, t):
+    # de Casteljau's algorithm, unrolled as it is the bulk of the flattening.
+    (x0, y0), (x1, y1), (x2, y2), (x3, y3) = points
+    x01, y01 = x0 + (x1 - x0) * t, y0 + (y1 - y0) * t
+    x12, y12 = x1 + (x2 - x1) * t, y1 + (y2 - y1) * t
+    x23, y23 = x2 + (x3 - x2) * t, y2 + (y3 - y2) * t
+    x012, y012 = x01 + (x12 - x01) * t, y01 + (y12 - y01) * t
+    x123, y123 = x12 + (x23 - x12) * t, y12 + (y23 - y12) * t
+    p0123 = (x012 + (x123 - x012) * t, y012 + (y123 - y012) * t)
+    return (points[0], (x01, y01), (x012, y012), p0123), (p0123, (x123, y123), (x23, y23), points[3])
+
+def cubic_between(points, t0, t1):
+    # The part of the cubic curve between the times t0 < t1.
+    if t1 < 1.0:
+        points = split_cubic(points, t1)[0]
+    if t0 > 0.0:
+        points = split_cubic(points, t0 / t1)[1]
+    return points
+
+def evaluate(points, t):
+    # The point and the derivative of the line or the cubic curve at the time t.
+    if len(points) == 2:
+        (x0, y0), (x1, y1) = points
+        return (x0 + (x1 - x0) * t, y0 + (y1 - y0) * t), (x1 - x0, y1 - y0)
+    (x0, y0), (x1, y1), (x2, y2), (x3, y3) = points
+    mt = 1.0 - t
+    a, b, c, d = mt * mt * mt, 3.0 * mt * mt * t, 3.0 * mt * t * t, t * t * t
+    da, db, dc = 3.0 * mt * mt, 6.0 * mt * t, 3.0 * t * t
+    return ((a * x0 + b * x1 + c * x2 + d * x3, a * y0 + b * y1 + c * y2 + d * y3),
+            (da * (x1 - x0) + db * (x2 - x1) + dc * (x3 - x2), da * (y1 - y0) + db * (y2 - y1) + dc * (y3 - y2)))
+
+def refine_intersection(points1, t1, points2, t2, vertex, max_distance):
+    # Newton's method on the times at which the two segments meet, starting from those found on their
+    # polylines. Returns the new times and the point, or None unless it converges within max_distance
+    # of the vertex, e.g. where the segments are tangent.
+    for _ in range(NEWTON_ITERATIONS):
+        (x1, y1), (dx1, dy1) = evaluate(points1, t1)
+        (x2, y2), (dx2, dy2) = evaluate(points2, t2)
+        determinant = dx2 * dy1 - dx1 * dy2
+        if determinant == 0.0:
+            return None
+        ex, ey = x1 - x2, y1 - y2
+        t1 -= (ey * dx2 - ex * dy2) / determinant
+        t2 -= (ey * dx1 - ex * dy1) / determinant
+        if not (0.0 <= t1 <= 1.0 and 0.0 <= t2 <= 1.0):
+            return None
+    point = evaluate(points1, t1)[0]
+    if abs(point[0] - vertex[0]) > max_distance or abs(point[1] - vertex[1]) > max_distance:
+        return None
+    return t1, t2, point
+
+def is_flat(points, tolerance):
+    # Whether the control points are within the tolerance of the chord, which bounds the deviation of the curve.
+    (x0, y0), (x1, y1), (x2, y2), (x3, y3) = points
+    dx, dy = x3 - x0, y3 - y0
+    length_squared = dx * dx + dy * dy
+    if length_squared == 0.0:
+        return max(abs(x1 - x0), abs(y1 - y0), abs(x2 - x0), abs(y2 - y0)) <= tolerance
+    d1 = dx * (y1 - y0) - dy * (x1 - x0)
+    d2 = dx * (y2 - y0) - dy * (x2 - x0)
+    return max(d1 * d1, d2 * d2) <= tolerance * tolerance * length_squared
+
+def flatten_cubic(points, tolerance=FLATTEN_TOLERANCE, max_depth=MAX_FLATTEN_DEPTH):
+    # Returns the times and the points of the polyline, from the start to the end, subdivided where needed.
+    ts, flat_points = [0.0], [points[0]]
+    stack = [(points, 0.0, 1.0, 0)]
+    while stack:
+        piece, t0, t1, depth = stack.pop()
+        if depth >= max_depth or is_flat(piece, tolerance):
+            ts.append(t1)
+            flat_points.append(piece[3])
+            continue
+        left, right = split_cubic(piece, 0.5)
+        tm = (t0 + t1) / 2.0
+        stack.append((right, tm, t1, depth + 1))
+        stack.append((left, t0, tm, depth + 1))
+    return ts, flat_points
+
+class FlatSegment(object):
+    # A segment of a contour with its polyline.
+
+    def __init__(self, segment, tolerance):
+        self.points = tuple(((p.x, p.y) for p in segment.points))
+        self.is_line = isinstance(segment, beziers.line.Line)
+        if self.is_line:
+            self.ts, self.flat_points = [0.0, 1.0], [self.points[0], self.points[1]]
+        else:
+            self.ts, self.flat_points = flatten_cubic(self.points, tolerance)
+
+def to_clipper(point):
+    return (int(round(point[0] * SCALE)), int(round(point[1] * SCALE)))
+
+def flatten_contours(contours, tolerance=FLATTEN_TOLERANCE):
+    # Returns the polygons of the contours, the flattened segments and the lookup table from the vertices
+    # of the polygons to the (segment number, index in its polyline) pairs they come from.
+    polygons, flat_segments, lookup = [], [], {}
+    for nodes in contours:
+        polygon = []
+        for segment in make_segments_from_nodes(nodes):
+            flat_segment = FlatSegment(segment, tolerance)
+            number = len(flat_segments)
+            flat_segments.append(flat_segment)
+            for index, point in enumerate(flat_segment.flat_points):
+                vertex = to_clipper(point)
+                entries = lookup.setdefault(vertex, [])
+                if (number, index) not in entries:
+                    entries.append((number, index))
+                if index > 0 and (len(polygon) == 0 or polygon[-1] != vertex):
+                    polygon.append(vertex)
+        if len(polygon) > 1 and polygon[0] == polygon[-1]:
+            polygon.pop()
+        polygons.append(polygon)
+    return polygons, flat_segments, lookup
+
+def signed_area(polygon):
+    return sum((x0 * y1 - x1 * y0 for (x0, y0), (x1, y1) in zip(polygon, polygon[1:] + polygon[:1]))) / 2.0
+
+def locate_on_chord(vertex, flat_segment, index, neighbor):
+    # The time of the vertex if it lies on the chord between the points index and neighbor of the polyline.
+    if neighbor < 0 or neighbor >= len(flat_segment.ts):
+        return None
+    (x0, y0), (x1, y1) = to_clipper(flat_segment.flat_points[index]), to_clipper(flat_segment.flat_points[neighbor])
+    dx, dy = x1 - x0, y1 - y0
+    length_squared = dx * dx + dy * dy
+    if length_squared == 0:
+        return None
+    u = ((vertex[0] - x0) * dx + (vertex[1] - y0) * dy) / length_squared
+    if u < 0.0 or u > 1.0:
+        return None
+    cross = (vertex[1] - y0) * dx - (vertex[0] - x0) * dy
+    if cross * cross > SNAP_DISTANCE * SNAP_DISTANCE * length_squared:
+        return None
+    return flat_segment.ts[index] + (flat_segment.ts[neighbor] - flat_segment.ts[index]) * u
+
+def trace_edge(a, b, flat_segments, lookup):
+    # Returns (segment number, time at a, time at b) of the edge of the union from the vertex a to b, or
+    # None if it can't be traced back. Edges between vertices of the same polyline are found in the lookup
+    # table. A vertex made by the union lies on a chord next to the other end of its edges, and so may a
+    # vertex of one contour where another one crosses it.
+    entries_a, entries_b = lookup.get(a, ()), lookup.get(b, ())
+    for number, i in entries_a:
+        for other_number, j in entries_b:
+            if number == other_number and abs(i - j) == 1:
+                ts = flat_segments[number].ts
+                return number, ts[i], ts[j]
+    for number, i in entries_a:
+        for j in (i - 1, i + 1):
+            t = locate_on_chord(b, flat_segments[number], i, j)
+            if t is not None:
+                return number, flat_segments[number].ts[i], t
+    for number, j in entries_b:
+        for i in (j - 1, j + 1):
+            t = locate_on_chord(a, flat_segments[number], j, i)
+            if t is not None:
+                return number, t, flat_segments[number].ts[j]
+    return None
+
+def continues(edge, next_edge):
+    # Whether the next edge carries on along the same segment in the same direction.
+    if edge is None or next_edge is None:
+        return False
+    number, t0, t1 = edge
+    next_number, next_t0, next_t1 = next_edge
+    return number == next_number and abs(t1 - next_t0) <= CONTINUITY_TOLERANCE and (t1 - t0) * (next_t1 - next_t0) > 0.0
+
+def make_runs(edges):
+    # Groups the edges into runs along the same segments, as (first edge, last edge) index pairs. The path
+    # is closed, so the runs start where one doesn't continue the edge before it.
+    n = len(edges)
+    start = 0
+    for i in range(n):
+        if not continues(edges[i - 1], edges[i]):
+            start = i
+            break
+    runs = []
+    i = start
+    while i < start + n:
+        j = i
+        while j + 1 < start + n and continues(edges[j % n], edges[(j + 1) % n]):
+            j += 1
+        runs.append((i % n, j % n))
+        i = j + 1
+    return runs
+
+def reconstruct_path(path, flat_segments, lookup, tolerance=FLATTEN_TOLERANCE):
+    # Returns the nodes of the contour of the path, made of the original segments wherever possible.
+    n = len(path)
+    edges = [trace_edge(path[i], path[(i + 1) % n], flat_segments, lookup) for i in range(n)]
+    # The vertices that were in the contours are put back where they were, rather than rounded.
+    coordinates = []
+    for vertex in path:
+        entries = lookup.get(vertex)
+        if entries:
+            number, index = entries[0]
+            coordinates.append(flat_segments[number].flat_points[index])
+        else:
+            coordinates.append((vertex[0] / SCALE, vertex[1] / SCALE))
+    # The vertices made by the union are moved to where the segments on either side actually meet.
+    for k in range(n):
+        incoming, outgoing = edges[k - 1], edges[k]
+        if path[k] in lookup or incoming is None or outgoing is None:
+            continue
+        refined = refine_intersection(flat_segments[incoming[0]].points, incoming[2], flat_segments[outgoing[0]].points, outgoing[1], coordinates[k], MAX_REFINEMENT * tolerance)
+        if refined is not None:
+            t_in, t_out, coordinates[k] = refined
+            edges[k - 1] = (incoming[0], incoming[1], t_in)
+            edges[k] = (outgoing[0], t_out, outgoing[2])
+    nodes = []
+    for first, last in make_runs(edges):
+        end = coordinates[(last + 1) % n]
+        if edges[first] is None or flat_segments[edges[first][0]].is_line:
+            nodes.append((end[0], end[1], 'line'))
+            continue
+        number, t0, _ = edges[first]
+        t1 = edges[last][2]
+        if t0 < t1:
+            _, c1, c2, _ = cubic_between(flat_segments[number].points, t0, t1)
+        else:
+            _, c2, c1, _ = cubic_between(flat_segments[number].points, t1, t0)
+        nodes.append((c1[0], c1[1], 'offcurve'))
+        nodes.append((c2[0], c2[1], 'offcurve'))
+        nodes.append((end[0], end[1], 'curve'))
+    # Like make_nodes_from_bezier_path(), the closing node comes first.
+    return nodes[-1:] + nodes[:-1]
+
+def union_contours(contours, tolerance=FLATTEN_TOLERANCE):
+    # Returns the union of the closed contours with the nonzero fill rule, as lists of (x, y, type) nodes.
+    # The outer contours keep the direction of the input.
+    polygons, flat_segments, lookup = flatten_contours(contours, tolerance)
+    clipper = pyclipper.Pyclipper()
+    # The vertices are kept, even in straight runs, so that they can be looked up.
+    clipper.PreserveCollinear = True
+    area, added = 0.0, False
+    for polygon in polygons:
+        if len(polygon) < 3:
+            continue
+        try:
+            clipper.AddPath(polygon, pyclipper.PT_SUBJECT, True)
+        except pyclipper.ClipperException:
+            # Degenerate polygons, e.g. of zero area, are rejected.
+            continue
+        area += signed_area(polygon)
+        added = True
+    if not added:
+        return []
+    # Clipper orients the outer contours counter-clockwise; reverse them if the input had them clockwise.
+    clipper.ReverseSolution = area < 0.0
+    results = []
+    for path in clipper.Execute(pyclipper.CT_UNION, pyclipper.PFT_NONZERO, pyclipper.PFT_NONZERO):
+        if len(path) >= 3:
+            results.append(reconstruct_path([tuple(vertex) for vertex in path], flat_segments, lookup, tolerance))
+    return results
+
+def contains_bounds(outer, inner):
+    return outer[0] <= inner[0] and outer[1] <= inner[1] and inner[2] <= outer[2] and inner[3] <= outer[3]
+
+def find_overlapping_groups(contours):
+    # Returns the groups of the indices of the closed contours that cross each other, directly or through
+    # other contours, as sorted lists ordered by their first index. The contours that may enclose one of
+    # a group, by their bounds, join it too, as the union of a counter and a contour crossing it depends
+    # on the contour around them.
+    indices = [i for i, nodes in enumerate(contours) if nodes and nodes[0][2] != 'move' and not any((node[2] == 'qcurve' for node in nodes))]
+    groups = dict(((i, [i]) for i in indices))
+    def merge(i, j):
+        group_i, group_j = groups[i], groups[j]
+        if group_i is not group_j:
+            group_i.extend(group_j)
+            for k in group_j:
+                groups[k] = group_i
+    for a, b in iter_contour_collisions([contours[i] for i in indices]):
+        merge(indices[a], indices[b])
+    members = [i for i in indices if len(groups[i]) > 1]
+    if members:
+        bounds = dict(((i, calc_nodes_bounds([contours[i]])) for i in indices))
+        for i in indices:
+            if len(groups[i]) == 1:
+                for j in members:
+                    if contains_bounds(bounds[i], bounds[j]):
+                        merge(j, i)
+    unique_groups = dict(((id(group), group) for group in groups.values() if len(group) > 1))
+    return sorted((sorted(group) for group in unique_groups.values()))
+
+def remove_overlaps(contours, tolerance=FLATTEN_TOLERANCE):
+    # Removes the overlaps of the closed contours that cross each other, by uniting each group of them.
+    # Returns a list of (nodes, index) pairs in the order of the contours: the contours that don't cross
+    # any other are passed through as they are, with their index, and each group is replaced by its union,
+    # with an index of None, where its first contour was. Open and quadratic contours are never united,
+    # and neither are contours inside others that they don't cross.
+    glyph_stats = betterObliqueStats.current()
+    t = glyph_stats and clock()
+    groups = dict(((group[0], group) for group in find_overlapping_groups(contours)))
+    united = set((i for group in groups.values() for i in group))
+    results = []
+    for i, nodes in enumerate(contours):
+        if i in groups:
+            results.extend(((union, None) for union in union_contours([contours[k] for k in groups[i]], tolerance)))
+        elif i not in united:
+            results.append((nodes, i))
+    if glyph_stats is not None:
+        glyph_stats.add_time('overlaps', clock() - t)
+    return results
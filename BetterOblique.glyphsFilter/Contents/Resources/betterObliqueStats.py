@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+
+# Opt-in instrumentation of the filter. While enabled, the time spent in each stage and a few counters
+# are recorded per glyph:
+#
+#   stages    subdivide, translate, merge, draw, compatibility, transform, collisions, overlaps and total,
+#             in seconds
+#   counters  splits, joins, miter_fallbacks (corners sharper than 8 degrees), rotation_fixes,
+#             incompatible_contours, cache_hits and contour_collisions
+#
+# It is enabled by enable(), or by setting the BETTER_OBLIQUE_STATS environment variable to the path
+# of a JSON file, which is written at exit. While disabled, current() returns None, and the instrumented
+# code only checks for that. A single glyph can be recorded with record(local=True) without enabling
+# the collection, e.g. by the `stats` key of the custom parameter.
+#
+#   import betterObliqueStats
+#   stats = betterObliqueStats.enable()
+#   shear_layer(layer, ...)
+#   print(stats.as_dict()['glyphs'][-1]['counters']['splits'])
+
+from __future__ import division
+
+import atexit
+import json
+import multiprocessing
+import os
+import threading
+import time
+
+clock = getattr(time, 'perf_counter', time.time)
+
+ENVIRONMENT_VARIABLE = 'BETTER_OBLIQUE_STATS'
+
+
+class GlyphStats(object):
+
+    def __init__(self, name=None):
+        self.name = name
+        self.stages = {}
+        self.counters = {}
+
+    def add_time(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def count(self, counter, n=1):
+        self.counters[counter] = self.counters.get(counter, 0) + n
+
+    def as_dict(self):
+        return {'name': self.name, 'stages': dict(self.stages), 'counters': dict(self.counters)}
+
+
+class Stats(object):
+    # The records of all the glyphs processed while enabled. Glyphs may be processed in several threads,
+    # e.g. the preview of the plugin, so each thread records its own glyph.
+
+    def __init__(self):
+        self.glyphs = []
+        self._lock = threading.Lock()
+
+    def add(self, glyph_stats):
+        with self._lock:
+            self.glyphs.append(glyph_stats)
+
+    def totals(self):
+        stages, counters = {}, {}
+        with self._lock:
+            glyphs = list(self.glyphs)
+        for glyph_stats in glyphs:
+            for stage, seconds in glyph_stats.stages.items():
+                stages[stage] = stages.get(stage, 0.0) + seconds
+            for counter, n in glyph_stats.counters.items():
+                counters[counter] = counters.get(counter, 0) + n
+        return {'glyphs': len(glyphs), 'stages': stages, 'counters': counters}
+
+    def as_dict(self):
+        with self._lock:
+            glyphs = [glyph_stats.as_dict() for glyph_stats in self.glyphs]
+        return {'totals': self.totals(), 'glyphs': glyphs}
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.as_dict(), f, indent=2, sort_keys=True)
+
+    def clear(self):
+        with self._lock:
+            del self.glyphs[:]
+
+
+class NullRecord(object):
+    # Stands in for record() while disabled.
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *args):
+        return False
+
+
+class Record(object):
+
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.glyph_stats = GlyphStats(name)
+
+    def __enter__(self):
+        self.previous = getattr(_local, 'glyph_stats', None)
+        _local.glyph_stats = self.glyph_stats
+        self.start = clock()
+        return self.glyph_stats
+
+    def __exit__(self, *args):
+        self.glyph_stats.add_time('total', clock() - self.start)
+        _local.glyph_stats = self.previous
+        if self.stats is not None:
+            self.stats.add(self.glyph_stats)
+        return False
+
+
+_stats = None
+_local = threading.local()
+_null_record = NullRecord()
+
+def enable():
+    # Returns the Stats that collects the records from now on.
+    global _stats
+    if _stats is None:
+        _stats = Stats()
+    return _stats
+
+def disable():
+    global _stats
+    _stats = None
+
+def get_stats():
+    return _stats
+
+def record(name=None, local=False):
+    # Context manager that records the glyph processed in it, and gives its GlyphStats (or None).
+    # Within another record(), everything goes to the outer one. With local, the glyph is recorded
+    # even while disabled, in which case its GlyphStats is not kept anywhere else.
+    if (_stats is None and not local) or getattr(_local, 'glyph_stats', None) is not None:
+        return _null_record
+    return Record(_stats, name)
+
+def current():
+    # The GlyphStats of the glyph being processed in this thread, or None.
+    return getattr(_local, 'glyph_stats', None)
+
+def is_main_process():
+    parent_process = getattr(multiprocessing, 'parent_process', None)
+    if parent_process is not None:
+        return parent_process() is None
+    return multiprocessing.current_process().name == 'MainProcess'
+
+def enable_from_environment():
+    # Worker processes inherit the environment, and spawned ones import this module again. Only the main
+    # process writes the file; the workers return the record of each glyph to it instead (see
+    # betterObliqueBatch.run_tasks()).
+    path = os.environ.get(ENVIRONMENT_VARIABLE)
+    if not path or not is_main_process():
+        return None
+    stats = enable()
+    pid = os.getpid()
+    def dump():
+        # Forked processes inherit the handler too.
+        if os.getpid() == pid and stats.glyphs:
+            stats.dump(path)
+    atexit.register(dump)
+    return stats
+
+enable_from_environment()
@@ -5,16 +5,24 @@ from __future__ import division, print_function, unicode_literals
 import objc
 from GlyphsApp import *
 from GlyphsApp.plugins import *
-from AppKit import NSTextField, NSValueBinding, NSObservedObjectKey, NSObservedKeyPathKey, NSOptionsKey, NSContinuouslyUpdatesValueBindingOption
+from AppKit import NSObject, NSTextField, NSValueBinding, NSObservedObjectKey, NSObservedKeyPathKey, NSOptionsKey, NSContinuouslyUpdatesValueBindingOption
 
 import sys
 import os
 if os.path.join(os.path.dirname(__file__), 'site-packages') not in sys.path:
     sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'site-packages'))
-from betterObliqueFilter import shear_layer
+from betterObliqueFilter import DEFAULT_TOLERANCE, shear_layer, shear_contours, shear_master_contours, calc_gspath_nodes, calc_component_bounds, apply_contours_to_layer, find_contour_collisions
+from betterObliqueCache import ShearCache
+import betterObliqueStats
 del sys.path[0]
 
+import json
 import math
+import threading
+from collections import deque
+
+# Seconds to wait for further changes of the parameters before computing the preview.
+PREVIEW_DELAY = 0.15
 
 
 def get_hstems(master):
@@ -40,6 +48,14 @@ def get_vstems(master):
     return tuple(l)
 
 
+def make_cache():
+    # Sheared outlines are cached on disk when the directory is given by the environment variable.
+    directory = os.environ.get('BETTER_OBLIQUE_CACHE_DIR')
+    if directory:
+        return ShearCache(os.path.expanduser(directory))
+    return None
+
+
 class BetterObliqueFilterSteppingTextField(NSTextField):
     
     stepper = objc.IBOutlet()
@@ -86,7 +102,7 @@ class BetterObliqueFilter(FilterWithDialog):
             self.willChangeValueForKey_('angle')
             Glyphs.defaults['TransformSlant'] = value
             self.didChangeValueForKey_('angle')
-            self.update()
+            self.schedulePreview()
 
     def opticalCorrection(self):
         return Glyphs.defaults['jp.co.morisawa.BetterOblique.opticalCorrection'] or 0
@@ -97,7 +113,7 @@ class BetterObliqueFilter(FilterWithDialog):
             self.willChangeValueForKey_('opticalCorrection')
             Glyphs.defaults['jp.co.morisawa.BetterOblique.opticalCorrection'] = int(value)
             self.didChangeValueForKey_('opticalCorrection')
-            self.update()
+            self.schedulePreview()
     
     def strengthFactor(self):
         return Glyphs.defaults['jp.co.morisawa.BetterOblique.strengthFactor'] or 0
@@ -108,7 +124,7 @@ class BetterObliqueFilter(FilterWithDialog):
             self.willChangeValueForKey_('strengthFactor')
             Glyphs.defaults['jp.co.morisawa.BetterOblique.strengthFactor'] = int(value)
             self.didChangeValueForKey_('strengthFactor')
-            self.update()
+            self.schedulePreview()
     
     def curveSegmentsOnly(self):
         return Glyphs.boolDefaults['jp.co.morisawa.BetterOblique.curveSegmentsOnly'] or False
@@ -119,7 +135,7 @@ class BetterObliqueFilter(FilterWithDialog):
             self.willChangeValueForKey_('curveSegmentsOnly')
             Glyphs.defaults['jp.co.morisawa.BetterOblique.curveSegmentsOnly'] = bool(value)
             self.didChangeValueForKey_('curveSegmentsOnly')
-            self.update()
+            self.schedulePreview()
     
     def vertical(self):
         return Glyphs.boolDefaults['jp.co.morisawa.BetterOblique.vertical'] or False
@@ -130,7 +146,7 @@ class BetterObliqueFilter(FilterWithDialog):
             self.willChangeValueForKey_('vertical')
             Glyphs.defaults['jp.co.morisawa.BetterOblique.vertical'] = bool(value)
             self.didChangeValueForKey_('vertical')
-            self.update()
+            self.schedulePreview()
     
     def shouldKeepCenter(self):
         return Glyphs.boolDefaults['jp.co.morisawa.BetterOblique.shouldKeepCenter'] or False
@@ -141,7 +157,7 @@ class BetterObliqueFilter(FilterWithDialog):
             self.willChangeValueForKey_('shouldKeepCenter')
             Glyphs.defaults['jp.co.morisawa.BetterOblique.shouldKeepCenter'] = bool(value)
             self.didChangeValueForKey_('shouldKeepCenter')
-            self.update()
+            self.schedulePreview()
     
     def shouldApplyWithoutSkewing(self):
         return Glyphs.boolDefaults['jp.co.morisawa.BetterOblique.shouldApplyWithoutSkewing'] or False
@@ -152,7 +168,29 @@ class BetterObliqueFilter(FilterWithDialog):
             self.willChangeValueForKey_('shouldApplyWithoutSkewing')
             Glyphs.defaults['jp.co.morisawa.BetterOblique.shouldApplyWithoutSkewing'] = bool(value)
             self.didChangeValueForKey_('shouldApplyWithoutSkewing')
-            self.update()
+            self.schedulePreview()
+
+    def tolerance(self):
+        return Glyphs.defaults['jp.co.morisawa.BetterOblique.tolerance'] or DEFAULT_TOLERANCE
+    
+    def setTolerance_(self, value):
+        value = float(value)
+        if value != Glyphs.defaults['jp.co.morisawa.BetterOblique.tolerance']:
+            self.willChangeValueForKey_('tolerance')
+            Glyphs.defaults['jp.co.morisawa.BetterOblique.tolerance'] = value
+            self.didChangeValueForKey_('tolerance')
+            self.schedulePreview()
+
+    def multiMaster(self):
+        return Glyphs.boolDefaults['jp.co.morisawa.BetterOblique.multiMaster'] or False
+    
+    def setMultiMaster_(self, value):
+        value = bool(value)
+        if value != Glyphs.boolDefaults['jp.co.morisawa.BetterOblique.multiMaster']:
+            self.willChangeValueForKey_('multiMaster')
+            Glyphs.defaults['jp.co.morisawa.BetterOblique.multiMaster'] = bool(value)
+            self.didChangeValueForKey_('multiMaster')
+            self.schedulePreview()
 
     @objc.python_method
     def settings(self):
@@ -161,12 +199,20 @@ class BetterObliqueFilter(FilterWithDialog):
 
     @objc.python_method
     def start(self):
+        self._final = False
+        self._cache = make_cache()
+        self._preview_generation = 0
+        self._preview_results = deque()
+        self._master_results = {}
+        
         Glyphs.registerDefault('jp.co.morisawa.BetterOblique.opticalCorrection', 1)
         Glyphs.registerDefault('jp.co.morisawa.BetterOblique.strengthFactor', 0)
         Glyphs.registerDefault('jp.co.morisawa.BetterOblique.curveSegmentsOnly', False)
         Glyphs.registerDefault('jp.co.morisawa.BetterOblique.vertical', False)
         Glyphs.registerDefault('jp.co.morisawa.BetterOblique.shouldKeepCenter', True)
         Glyphs.registerDefault('jp.co.morisawa.BetterOblique.shouldApplyWithoutSkewing', False)
+        Glyphs.registerDefault('jp.co.morisawa.BetterOblique.tolerance', DEFAULT_TOLERANCE)
+        Glyphs.registerDefault('jp.co.morisawa.BetterOblique.multiMaster', False)
 
         self.setAngle_(self.angle())
         self.setOpticalCorrection_(self.opticalCorrection())
@@ -176,29 +222,101 @@ class BetterObliqueFilter(FilterWithDialog):
         self.setShouldKeepCenter_(self.shouldKeepCenter())
         self.setShouldApplyWithoutSkewing_(self.shouldApplyWithoutSkewing())
         
-        self._final = False
+        # The initial preview is computed in the background as well.
+        self.schedulePreview()
         
     def final(self):
         self._final = True
+        # Cancel the preview in flight; the final result is computed synchronously in filter().
+        self.cancelPreview()
     
     def process_(self, sender):
         super(BetterObliqueFilter, self).process_(sender)
+        if self._final:
+            self._master_results = {}
         self._final = False
     
+    @objc.python_method
+    def isDialogOpen(self):
+        # The dialog is open while its view is in a visible window. Once it is closed, whether applied or
+        # cancelled, the preview stops and filter() runs as usual, e.g. from scripts or custom parameters.
+        dialog = self.dialog
+        window = dialog.window() if dialog is not None else None
+        return window is not None and window.isVisible()
+    
+    @objc.python_method
+    def cancelPreview(self):
+        # Workers check the generation between layers and drop their results once it has changed.
+        self._preview_generation += 1
+        NSObject.cancelPreviousPerformRequestsWithTarget_selector_object_(self, 'startPreview:', None)
+    
+    @objc.python_method
+    def schedulePreview(self):
+        # Changes made while dragging a slider are coalesced into a single preview.
+        self.cancelPreview()
+        self.performSelector_withObject_afterDelay_('startPreview:', None, PREVIEW_DELAY)
+    
+    def startPreview_(self, sender):
+        # Snapshot the outlines on the main thread and shear them in a background thread.
+        if not self.isDialogOpen():
+            return
+        generation = self._preview_generation
+        jobs = []
+        for index, (layer, shadow_layer) in enumerate(zip(self.valueForKey_('layers') or (), self.valueForKey_('shadowLayers') or ())):
+            try:
+                arguments = self.shearArguments(layer, {})
+            except ValueError:
+                continue
+            contours = [calc_gspath_nodes(path) for path in shadow_layer.paths]
+            master_layers = self.masterLayers(layer, {})
+            if master_layers is not None:
+                master_index = master_layers.index(layer)
+                jobs.append((index, master_index) + self.masterArguments(master_layers, master_index, contours, {}))
+            else:
+                arguments['extra_bounds'] = calc_component_bounds(shadow_layer)
+                jobs.append((index, None, contours, arguments))
+        thread = threading.Thread(target=self.runPreviewJobs, args=(generation, jobs))
+        thread.daemon = True
+        thread.start()
+    
+    @objc.python_method
+    def runPreviewJobs(self, generation, jobs):
+        for index, master_index, contours, arguments in jobs:
+            if generation != self._preview_generation:
+                return
+            try:
+                if master_index is not None:
+                    results = shear_master_contours(contours, cache=self._cache, **arguments)[master_index]
+                else:
+                    results = shear_contours(contours, cache=self._cache, **arguments)
+            except Exception as e:
+                print('BetterOblique: failed to make the preview: {0}'.format(e))
+                continue
+            # Each layer is applied as soon as it is ready.
+            self._preview_results.append((generation, index, results))
+            self.performSelectorOnMainThread_withObject_waitUntilDone_('applyPreview:', None, False)
+    
+    def applyPreview_(self, sender):
+        layers = self.valueForKey_('layers') or ()
+        updated = False
+        while self._preview_results:
+            generation, index, results = self._preview_results.popleft()
+            # Results that arrive after the dialog has been closed are dropped.
+            if generation != self._preview_generation or index >= len(layers) or not self.isDialogOpen():
+                continue
+            layer = layers[index]
+            if len(layer.paths) != len(results):
+                continue
+            apply_contours_to_layer(layer, results)
+            updated = True
+        if updated:
+            Glyphs.redraw()
+    
     def sliderValueRange(self):
         return self.slider.maxValue() - self.slider.minValue() + 1
     
     @objc.python_method
-    def filter(self, layer, inEditView, customParameters):
-        
-        # This filter is painfully slow for batch processing, and making a preview is too expensive.
-        # When the custom parameter dict is empty and multiple glyphs are selected in the font view,
-        # execute the transformation only right after the user presses the apply button in the dialog.
-        if not customParameters and not inEditView:
-            if len(Glyphs.font.selection) > 1:
-                if not self._final:
-                    return
-        
+    def shearArguments(self, layer, customParameters):
         font = layer.parent.parent
         master_dict = dict(((master.id, master) for master in font.masters))
         master = master_dict.get(layer.layerId, master_dict.get(layer.associatedMasterId))
@@ -209,19 +327,98 @@ class BetterObliqueFilter(FilterWithDialog):
             std_vw = vstems[0]
         if hstems and len(hstems) > 0:
             std_hw = hstems[0]
-        shear_angle = math.radians(customParameters.get('angle', self.angle()))
-        optical_correction = ('none', 'thin', 'medium', 'thick')[int(customParameters.get('opticalCorrection', self.opticalCorrection()))]
-        strength = (self.sliderValueRange() - customParameters.get('strengthFactor', self.strengthFactor())) / self.sliderValueRange()
-        curve_segments_only = customParameters.get('curveSegmentsOnly', self.curveSegmentsOnly())
-        vertical = customParameters.get('vertical', self.vertical())
-        keep_center = customParameters.get('keepCenter', self.shouldKeepCenter())
-        skip_shear = customParameters.get('applyWithoutSkewing', self.shouldApplyWithoutSkewing())
+        if std_vw is None or std_hw is None:
+            raise ValueError('StdVW and StdHW need to be defined to run this filter.')
+        return {
+            'shear_angle': math.radians(customParameters.get('angle', self.angle())),
+            'std_vw': std_vw,
+            'std_hw': std_hw,
+            'optical_correction': ('none', 'thin', 'medium', 'thick')[int(customParameters.get('opticalCorrection', self.opticalCorrection()))],
+            'strength': (self.sliderValueRange() - customParameters.get('strengthFactor', self.strengthFactor())) / self.sliderValueRange(),
+            'curve_segments_only': customParameters.get('curveSegmentsOnly', self.curveSegmentsOnly()),
+            'vertical': customParameters.get('vertical', self.vertical()),
+            'center': customParameters.get('keepCenter', self.shouldKeepCenter()),
+            'skip_shear': customParameters.get('applyWithoutSkewing', self.shouldApplyWithoutSkewing()),
+            'tolerance': float(customParameters.get('tolerance', self.tolerance())),
+        }
+    
+    @objc.python_method
+    def masterLayers(self, layer, customParameters):
+        # Returns the layers of all the masters of the glyph, with the given layer in place of its master,
+        # when the masters are to be processed together and the layer is one of them.
+        if not customParameters.get('multiMaster', self.multiMaster()):
+            return None
+        glyph = layer.parent
+        font = glyph.parent if glyph is not None else None
+        if font is None or len(font.masters) < 2:
+            return None
+        master_ids = [master.id for master in font.masters]
+        if layer.layerId not in master_ids:
+            return None
+        return [layer if master_id == layer.layerId else glyph.layers[master_id] for master_id in master_ids]
+    
+    @objc.python_method
+    def masterArguments(self, master_layers, master_index, contours, customParameters):
+        # Returns the contours of all the masters and the arguments for shear_master_contours(). The contours
+        # of the master at master_index are given, as they may come from the shadow layer of the preview.
+        arguments_list = [self.shearArguments(layer, customParameters) for layer in master_layers]
+        contours_list = [contours if i == master_index else [calc_gspath_nodes(path) for path in layer.paths] for i, layer in enumerate(master_layers)]
+        arguments = dict(arguments_list[master_index])
+        del arguments['std_vw'], arguments['std_hw']
+        arguments['stems'] = [(a['std_vw'], a['std_hw']) for a in arguments_list]
+        arguments['extra_bounds_list'] = [calc_component_bounds(layer) for layer in master_layers]
+        return contours_list, arguments
+    
+    @objc.python_method
+    def shearMasterLayer(self, layer, master_layers, customParameters):
+        # The results for all the masters are kept while the filter runs over them, so that the glyph
+        # is analysed only once, and dropped once all of them are written. They are recomputed if the
+        # outline of the layer has changed since.
+        master_index = master_layers.index(layer)
+        contours = [calc_gspath_nodes(path) for path in layer.paths]
+        arguments = self.shearArguments(layer, customParameters)
+        key = (layer.parent.name, repr(sorted(((name, value) for name, value in arguments.items() if name not in ('std_vw', 'std_hw')))))
+        master_results = self._master_results.get(key)
+        if master_results is None or master_results[0][master_index] != contours:
+            contours_list, arguments = self.masterArguments(master_layers, master_index, contours, customParameters)
+            master_results = (contours_list, shear_master_contours(contours_list, cache=self._cache, **arguments), set())
+            self._master_results[key] = master_results
+        apply_contours_to_layer(layer, master_results[1][master_index])
+        master_results[2].add(master_index)
+        if len(master_results[2]) == len(master_layers):
+            del self._master_results[key]
+    
+    @objc.python_method
+    def filter(self, layer, inEditView, customParameters):
+        
+        # While the dialog is open, the preview is computed in the background (see startPreview_()),
+        # so the transformation is executed here only right after the user presses the apply button.
+        if not customParameters and not getattr(self, '_final', False) and self.isDialogOpen():
+            return
         
-        shear_layer(layer, shear_angle, std_vw=std_vw, std_hw=std_hw, optical_correction=optical_correction, strength=strength, curve_segments_only=curve_segments_only, vertical=vertical, center=keep_center, skip_shear=skip_shear)
+        if not hasattr(self, '_master_results'):
+            self._master_results = {}
+        # With the checkCollisions key, the contours that collide after shearing but did not before are
+        # printed to the Macro panel.
+        glyph_name = layer.parent.name if layer.parent is not None else None
+        contours = [calc_gspath_nodes(path) for path in layer.paths] if customParameters.get('checkCollisions') else None
+        # With the stats key of the custom parameter, the stats of each glyph are printed as JSON. They are
+        # recorded for the glyph alone, so that nothing accumulates over the session.
+        with betterObliqueStats.record(glyph_name, local=bool(customParameters.get('stats'))) as glyph_stats:
+            master_layers = self.masterLayers(layer, customParameters)
+            if master_layers is not None:
+                self.shearMasterLayer(layer, master_layers, customParameters)
+            else:
+                shear_layer(layer, cache=self._cache, **self.shearArguments(layer, customParameters))
+            if contours is not None:
+                for i, j in find_contour_collisions([calc_gspath_nodes(path) for path in layer.paths], contours):
+                    print('BetterOblique: {0}: contours {1} and {2} collide after shearing'.format(glyph_name, i, j))
+        if glyph_stats is not None and customParameters.get('stats'):
+            print(json.dumps(glyph_stats.as_dict(), sort_keys=True))
     
     @objc.python_method
     def generateCustomParameter(self):
-        return "{0}; angle:{1}; opticalCorrection:{2}; strengthFactor:{3}; curveSegmentsOnly:{4}; vertical:{5}; keepCenter:{6}; applyWithoutSkewing:{7}".format(
+        return "{0}; angle:{1}; opticalCorrection:{2}; strengthFactor:{3}; curveSegmentsOnly:{4}; vertical:{5}; keepCenter:{6}; applyWithoutSkewing:{7}; tolerance:{8}; multiMaster:{9}".format(
             'BetterObliqueFilter',
             self.angle() or 0.0,
             self.opticalCorrection() or 0,
@@ -229,7 +426,9 @@ class BetterObliqueFilter(FilterWithDialog):
             1 if self.curveSegmentsOnly() else 0,
             1 if self.vertical() else 0,
             1 if self.shouldKeepCenter() else 0,
-            1 if self.shouldApplyWithoutSkewing() else 0
+            1 if self.shouldApplyWithoutSkewing() else 0,
+            self.tolerance(),
+            1 if self.multiMaster() else 0
             )
 
     @objc.python_method
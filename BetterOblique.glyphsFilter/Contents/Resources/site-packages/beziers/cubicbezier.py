@@ -9,9 +9,12 @@ from beziers.utils.legendregauss import Tvalues, Cvalues
 from beziers.utils import quadraticRoots
 
 class CubicBezier(ArcLengthMixin,Segment):
+  __slots__ = ()
+
   def __init__(self, start, c1,c2,end):
     self.points = [start,c1,c2,end]
-    self._range = [0,1]
+    self._coefficients = None
+    self._cache = None
 
   def __repr__(self):
     return "B<%s-%s-%s-%s>" % (self[0],self[1],self[2],self[3])
@@ -24,11 +27,16 @@ class CubicBezier(ArcLengthMixin,Segment):
     points = [ Point.fromRepr(m.group(t)) for t in range(1,5) ]
     return klass(*points)
 
+  def _powerCoefficients(self):
+    p0, p1, p2, p3 = self.points
+    return ((p0.x, 3 * (p1.x - p0.x), 3 * (p0.x - 2 * p1.x + p2.x), p3.x - p0.x + 3 * (p1.x - p2.x)),
+            (p0.y, 3 * (p1.y - p0.y), 3 * (p0.y - 2 * p1.y + p2.y), p3.y - p0.y + 3 * (p1.y - p2.y)))
+
   def pointAtTime(self,t):
     """Returns the point at time t (0->1) along the curve."""
-    x = (1 - t) * (1 - t) * (1 - t) * self[0].x + 3 * (1 - t) * (1 - t) * t * self[1].x + 3 * (1 - t) * t * t * self[2].x + t * t * t * self[3].x;
-    y = (1 - t) * (1 - t) * (1 - t) * self[0].y + 3 * (1 - t) * (1 - t) * t * self[1].y + 3 * (1 - t) * t * t * self[2].y + t * t * t * self[3].y;
-    return Point(x,y)
+    if t == 1: return Point(self[3].x, self[3].y)
+    (x0, x1, x2, x3), (y0, y1, y2, y3) = self.coefficients
+    return Point(((x3 * t + x2) * t + x1) * t + x0, ((y3 * t + y2) * t + y1) * t + y0)
 
   def tOfPoint(self,p):
     precision = 1.0/50.0
@@ -75,7 +83,11 @@ class CubicBezier(ArcLengthMixin,Segment):
     raise "Not implemented"
 
   def derivative(self):
-    """Returns a `QuadraticBezier` representing the derivative of this curve."""
+    """Returns a `QuadraticBezier` representing the derivative of this curve.
+    It is cached along with the curve, so treat it as read-only."""
+    return self._cached("derivative", self._derivative)
+
+  def _derivative(self):
     return QuadraticBezier(
       (self[1]-self[0])*3,
       (self[2]-self[1])*3,
@@ -159,17 +171,32 @@ class CubicBezier(ArcLengthMixin,Segment):
 
   def findExtremes(self, inflections = False):
     """Returns a list of time `t` values for extremes of the curve."""
+    return list(self._cached(("extremes", inflections), lambda: self._findExtremes(inflections)))
+
+  def _findExtremes(self, inflections):
     r = self._findDRoots()
     if inflections:
       r.extend(self.derivative()._findDRoots())
     r.sort()
-    return [ root for root in r if root >= 0.01 and root <= 0.99 ]
+    return tuple([ root for root in r if root >= 0.01 and root <= 0.99 ])
+
+  def tangentAtTime(self,t):
+    """Returns a `Point` representing the unit vector of tangent at time `t`."""
+    # The same as evaluating the derivative, but without building (and
+    # caching) it, as tangents are mostly taken once at each end.
+    p0, p1, p2, p3 = self.points
+    d0x, d1x, d2x = (p1.x - p0.x) * 3, (p2.x - p1.x) * 3, (p3.x - p2.x) * 3
+    d0y, d1y, d2y = (p1.y - p0.y) * 3, (p2.y - p1.y) * 3, (p3.y - p2.y) * 3
+    if t == 1: return Point(d2x, d2y).toUnitVector()
+    x = ((d0x - 2 * d1x + d2x) * t + 2 * (d1x - d0x)) * t + d0x
+    y = ((d0y - 2 * d1y + d2y) * t + 2 * (d1y - d0y)) * t + d0y
+    return Point(x, y).toUnitVector()
 
   def curvatureAtTime(self,t):
     """Returns the C curvature at time `t`.."""
     d = self.derivative()
-    d2 = d.derivative()
-    return d.pointAtTime(t).x * d2.pointAtTime(t).y - d.pointAtTime(t).y * d2.pointAtTime(t).x
+    p, q = d.pointAtTime(t), d.derivative().pointAtTime(t)
+    return p.x * q.y - p.y * q.x
 
   @property
   def tunniPoint(self):
@@ -7,9 +7,13 @@ import sys
 
 class Line(Segment):
   """Represents a line segment within a Bezier path."""
+  __slots__ = ('_orig',)
+
   def __init__(self, start, end):
     self.points = [start,end]
     self._orig = None
+    self._coefficients = None
+    self._cache = None
 
   def __repr__(self):
     return "L<%s--%s>" % (self.points[0], self.points[1])
@@ -21,6 +25,10 @@ class Line(Segment):
     m = p.match(text)
     return klass(Point.fromRepr(m.group(1)),Point.fromRepr(m.group(2)))
 
+  def _powerCoefficients(self):
+    s, e = self.points
+    return ((s.x, e.x - s.x), (s.y, e.y - s.y))
+
   def pointAtTime(self,t):
     """Returns the point at time t (0->1) along the line."""
     return self.start.lerp(self.end, t)
@@ -83,6 +91,16 @@ class Line(Segment):
   def length(self):
     return self[0].distanceFrom(self[1])
 
+  def lengthAtTime(self, t):
+    """Returns the length of the line from the start up to time t (0->1)."""
+    return self.length * min(max(t, 0.0), 1.0)
+
+  def timeAtLength(self, length):
+    """Returns the time t (0->1) at which the given length along the line is reached."""
+    total = self.length
+    if total == 0: return 0.0
+    return min(max(length / total, 0.0), 1.0)
+
   def findExtremes(self):
     return []
 
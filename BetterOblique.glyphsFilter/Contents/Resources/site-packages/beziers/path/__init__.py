@@ -3,6 +3,7 @@ from beziers.path.representations.Nodelist import NodelistRepresentation, Node
 from beziers.point import Point
 from beziers.boundingbox import BoundingBox
 from beziers.utils.samplemixin import SampleMixin
+from beziers.utils.pointindex import PointIndex
 try:
     from beziers.utils.booleanoperationsmixin import BooleanOperationsMixin
 except ImportError:
@@ -13,6 +14,7 @@ from beziers.line import Line
 from beziers.cubicbezier import CubicBezier
 
 import math
+from bisect import bisect_right
 
 if not hasattr(math, "isclose"):
   def isclose(a, b, rel_tol=1e-9, abs_tol=0.0):
@@ -285,12 +287,11 @@ class BezierPath(BooleanOperationsMixin,SampleMixin,object):
     segs = self.asSegments()
     newsegs = []
     # Cluster splitlist by seg
-    newsplitlist = {}
+    newsplitlist = PointIndex()
     for (seg,t) in splitlist:
-      if not seg in newsplitlist: newsplitlist[seg] = []
-      newsplitlist[seg].append(t)
-    for k in newsplitlist:
-      newsplitlist[k] = sorted(newsplitlist[k])
+      newsplitlist.setdefault(seg, []).append(t)
+    for tList in newsplitlist.values():
+      tList.sort()
     # Now walk the path
     for seg in segs:
       if seg in newsplitlist:
@@ -317,13 +318,18 @@ class BezierPath(BooleanOperationsMixin,SampleMixin,object):
     self.splitAtPoints(splitlist)
     return self
 
+  def _lengthIndex(self):
+    # The segments and the lengths of the path up to the start of each of
+    # them, plus the length of the whole path, built in a single sweep.
+    segs = self.asSegments()
+    prefix = [0]
+    for s in segs: prefix.append(prefix[-1] + s.length)
+    return segs, prefix
+
   @property
   def length(self):
     """Returns the length of the whole path."""
-    segs = self.asSegments()
-    length = 0
-    for s in segs: length += s.length
-    return length
+    return self._lengthIndex()[1][-1]
 
   def pointAtTime(self,t):
     """Returns the point at time t (0->1) along the curve, where 1 is the end of the whole curve."""
@@ -337,14 +343,33 @@ class BezierPath(BooleanOperationsMixin,SampleMixin,object):
   def lengthAtTime(self,t):
     """Returns the length of the subset of the path from the start
     up to the point t (0->1), where 1 is the end of the whole curve."""
-    segs = self.asSegments()
-    t *= len(segs)
-    length = 0
-    for s in segs[:int(math.floor(t))]: length += s.length
-    seg = segs[int(math.floor(t))]
-    s1,s2 = seg.splitAtTime(t-math.floor(t))
-    length += s1.length
-    return length
+    return self.lengthsAtTimes([t])[0]
+
+  def lengthsAtTimes(self,ts):
+    """Returns the lengths of the path from the start up to each of the
+    times `ts` (0->1), building the index of the segments only once."""
+    segs, prefix = self._lengthIndex()
+    lengths = []
+    for t in ts:
+      t *= len(segs)
+      i = min(int(math.floor(t)), len(segs) - 1)
+      lengths.append(prefix[i] + segs[i].lengthAtTime(t - i))
+    return lengths
+
+  def timeAtLength(self,length):
+    """Returns the time t (0->1) at which the length of the path from the
+    start reaches the given length. This is the inverse of `lengthAtTime`."""
+    return self.timesAtLengths([length])[0]
+
+  def timesAtLengths(self,lengths):
+    """Returns the times (0->1) at which the length of the path from the
+    start reaches each of the given lengths."""
+    segs, prefix = self._lengthIndex()
+    ts = []
+    for length in lengths:
+      i = min(max(bisect_right(prefix, length) - 1, 0), len(segs) - 1)
+      ts.append((i + segs[i].timeAtLength(length - prefix[i])) / float(len(segs)))
+    return ts
 
   def offset(self, vector, rotateVector = True):
     """Returns a new BezierPath which approximates offsetting the
@@ -478,8 +503,8 @@ class BezierPath(BooleanOperationsMixin,SampleMixin,object):
     granularity = self.length
     newpaths = []
     points = []
-    for t in self.regularSampleTValue(granularity):
-      lenSoFar = self.lengthAtTime(t) # Super inefficient. But simple!
+    ts = self.regularSampleTValue(granularity)
+    for t, lenSoFar in zip(ts, self.lengthsAtTimes(ts)):
       lenSoFar = lenSoFar % (lineLength + gapLength)
       if lenSoFar >= lineLength and len(points) > 0:
         # When all you have is a hammer...
@@ -7,9 +7,12 @@ from beziers.utils.arclengthmixin import ArcLengthMixin
 my_epsilon = 2e-7
 
 class QuadraticBezier(ArcLengthMixin,Segment):
+  __slots__ = ()
+
   def __init__(self, start, c1,end):
     self.points = [start,c1,end]
-    self._range = [0,1]
+    self._coefficients = None
+    self._cache = None
 
   def __repr__(self):
     return "B<%s-%s-%s>" % (self[0],self[1],self[2])
@@ -22,11 +25,16 @@ class QuadraticBezier(ArcLengthMixin,Segment):
     points = [ Point.fromRepr(m.group(t)) for t in range(1,4) ]
     return klass(*points)
 
+  def _powerCoefficients(self):
+    p0, p1, p2 = self.points
+    return ((p0.x, 2 * (p1.x - p0.x), p0.x - 2 * p1.x + p2.x),
+            (p0.y, 2 * (p1.y - p0.y), p0.y - 2 * p1.y + p2.y))
+
   def pointAtTime(self,t):
     """Returns the point at time t (0->1) along the curve."""
-    x = (1 - t) * (1 - t) * self[0].x + 2 * (1 - t) * t * self[1].x + t * t * self[2].x;
-    y = (1 - t) * (1 - t) * self[0].y + 2 * (1 - t) * t * self[1].y + t * t * self[2].y;
-    return Point(x,y)
+    if t == 1: return Point(self[2].x, self[2].y)
+    (x0, x1, x2), (y0, y1, y2) = self.coefficients
+    return Point((x2 * t + x1) * t + x0, (y2 * t + y1) * t + y0)
 
   def tOfPoint(self,p):
     """Returns the time t (0->1) of a point on the curve."""
@@ -48,7 +56,11 @@ class QuadraticBezier(ArcLengthMixin,Segment):
     return (QuadraticBezier(self[0],p4,p7), QuadraticBezier(p7,p5,self[2]))
 
   def derivative(self):
-    """Returns a `Line` representing the derivative of this curve."""
+    """Returns a `Line` representing the derivative of this curve.
+    It is cached along with the curve, so treat it as read-only."""
+    return self._cached("derivative", self._derivative)
+
+  def _derivative(self):
     return Line(
       (self[1]-self[0])*2,
       (self[2]-self[1])*2
@@ -85,7 +97,7 @@ class QuadraticBezier(ArcLengthMixin,Segment):
 
   def findExtremes(self):
     """Returns a list of time `t` values for extremes of the curve."""
-    return self._findDRoots()
+    return list(self._cached("extremes", lambda: tuple(self._findDRoots())))
 
   @property
   def area(self):
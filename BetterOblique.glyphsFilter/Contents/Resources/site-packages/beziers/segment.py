@@ -3,6 +3,7 @@ from beziers.affinetransformation import AffineTransformation
 from beziers.utils.samplemixin import SampleMixin
 from beziers.utils.intersectionsmixin import IntersectionsMixin
 from beziers.boundingbox import BoundingBox
+from beziers.utils import polyval, polyvals
 
 class Segment(IntersectionsMixin,SampleMixin,object):
 
@@ -36,10 +37,18 @@ class Segment(IntersectionsMixin,SampleMixin,object):
 
   """
 
+  # Segments are allocated by the thousand, so they and their mixins
+  # keep their attributes in slots rather than in a __dict__. The derived
+  # geometry (hodographs, extremes, bounds, arc lengths) is computed on
+  # demand and kept in _cache, which is only allocated when first used.
+  # removeOverlap() marks the segments with next, visited and windingNumber.
+  __slots__ = ('points', '_coefficients', '_cache', 'next', 'visited', 'windingNumber')
+
   def __getitem__(self, item):
     return self.points[item]
   def __setitem__(self, key, item):
       self.points[key] = item
+      self._invalidate()
   def __len__(self):
     return len(self.points)
   def __eq__(self,other):
@@ -60,6 +69,56 @@ class Segment(IntersectionsMixin,SampleMixin,object):
   def round(self):
     """Rounds the points of segment to integer coordinates."""
     self.points = [ p.rounded() for p in self.points ]
+    self._invalidate()
+
+  def _invalidate(self):
+    # Forget the derived geometry, as the points have changed.
+    self._coefficients = self._cache = None
+
+  def _cached(self, key, compute):
+    # Returns the derived geometry under the key, computing it on first use.
+    cache = self._cache
+    if cache is None:
+      cache = self._cache = {}
+    if key not in cache:
+      cache[key] = compute()
+    return cache[key]
+
+  @property
+  def coefficients(self):
+    """Returns the coefficients of the segment in the power basis, as a
+    tuple of the x coefficients and the y coefficients, lowest power first,
+    i.e. x(t) = xs[0] + xs[1] t + xs[2] t^2 + ... They are computed once
+    and cached; change the points with `segment[i] = point` rather than by
+    mutating them, so that the cache is kept up to date."""
+    if self._coefficients is None:
+      self._coefficients = self._powerCoefficients()
+    return self._coefficients
+
+  def pointsAtTimes(self, ts):
+    """Returns the x and y co-ordinates of the points at the given times
+    (0->1) along the segment, as two lists. This is much cheaper than calling
+    `pointAtTime` for each time, as no Point objects are made. If `ts` is a
+    numpy array, the co-ordinates are returned as arrays, computed in a single
+    vectorized pass::
+
+      >>> c = CubicBezier(Point(0,0), Point(0,100), Point(100,100), Point(100,0))
+      >>> c.pointsAtTimes([0, 0.5, 1])
+      ([0.0, 50.0, 100.0], [0.0, 75.0, 0.0])
+
+    """
+    xs, ys = self.coefficients
+    end = self.points[-1]
+    # The end point is returned as is, rather than as the sum of the coefficients.
+    if hasattr(ts, "__array__"):
+      x, y = polyval(xs, ts), polyval(ys, ts)
+      x[ts == 1], y[ts == 1] = end.x, end.y
+      return x, y
+    x, y = polyvals(xs, ts), polyvals(ys, ts)
+    if 1 in ts:
+      for i, t in enumerate(ts):
+        if t == 1: x[i], y[i] = end.x, end.y
+    return x, y
 
   @property
   def order(self):
@@ -161,6 +220,11 @@ class Segment(IntersectionsMixin,SampleMixin,object):
     s1,_ = self.splitAtTime(t)
     return s1.length
 
+  def timesAtLengths(self, lengths):
+    """Returns the times (0->1) at which the length of the segment from
+    the start reaches each of the given lengths (see `timeAtLength`)."""
+    return [ self.timeAtLength(l) for l in lengths ]
+
   def reversed(self):
     """Returns a new segment with the points reversed."""
     klass = self.__class__
@@ -168,13 +232,21 @@ class Segment(IntersectionsMixin,SampleMixin,object):
 
   def bounds(self):
     """Returns a BoundingBox object for this segment."""
+    # The extents are cached, but each call gets a box of its own to modify.
+    left, bottom, right, top = self._cached("bounds", self._extents)
+    bounds = BoundingBox()
+    bounds.bl = Point(left, bottom)
+    bounds.tr = Point(right, top)
+    return bounds
+
+  def _extents(self):
     bounds = BoundingBox()
     ex = self.findExtremes()
     ex.append(0)
     ex.append(1)
     for t in ex:
       bounds.extend(self.pointAtTime(t))
-    return bounds
+    return (bounds.left, bounds.bottom, bounds.right, bounds.top)
 
   @property
   def hasLoop(self):
@@ -5,6 +5,28 @@ except ImportError:
     def isclose(a, b):
         return -1e-9 < a - b < 1e-9
 
+def polyval(coefficients, t):
+  """Evaluates the polynomial c0 + c1 t + c2 t^2 + ... with the given
+  coefficients at t, which may be a number or a numpy array, by Horner's method."""
+  result = coefficients[-1]
+  for c in coefficients[-2::-1]:
+    result = result * t + c
+  return result
+
+def polyvals(coefficients, ts):
+  """Evaluates the polynomial with the given coefficients at each of the
+  times ts, returning a list. Lines and Beziers are expanded inline."""
+  if len(coefficients) == 4:
+    c0, c1, c2, c3 = coefficients
+    return [ ((c3 * t + c2) * t + c1) * t + c0 for t in ts ]
+  if len(coefficients) == 3:
+    c0, c1, c2 = coefficients
+    return [ (c2 * t + c1) * t + c0 for t in ts ]
+  if len(coefficients) == 2:
+    c0, c1 = coefficients
+    return [ c1 * t + c0 for t in ts ]
+  return [ polyval(coefficients, t) for t in ts ]
+
 def quadraticRoots(a, b, c):
   """Returns real roots of at^2 + bt + c = 0 if 0 < root < 1"""
   roots = []
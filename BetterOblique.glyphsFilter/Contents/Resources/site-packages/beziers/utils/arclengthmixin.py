@@ -1,15 +1,91 @@
+from beziers.utils import polyval
 from beziers.utils.legendregauss import Tvalues, Cvalues
-import math
+from bisect import bisect_right
+
+# The length of a curve is integrated in one go by the fixed-order
+# Legendre-Gauss quadrature of `legendregauss`. Lengths and times part way
+# along are found from the arc lengths at ARC_LENGTH_INTERVALS evenly spaced
+# times, each interval integrated by 5-point Gauss-Legendre quadrature, the
+# times by Newton's method. That table is only built when they are asked for.
+ARC_LENGTH_INTERVALS = 16
+GAUSS_NODES = (0.0, -0.5384693101056831, 0.5384693101056831, -0.9061798459386640, 0.9061798459386640)
+GAUSS_WEIGHTS = (0.5688888888888889, 0.4786286704993665, 0.4786286704993665, 0.2369268850561891, 0.2369268850561891)
+NEWTON_ITERATIONS = 8
+NEWTON_TOLERANCE = 1e-9
 
 class ArcLengthMixin:
+  __slots__ = ()
+
+  def _speedCoefficients(self):
+    return self._cached("speed", self._computeSpeedCoefficients)
+
+  def _computeSpeedCoefficients(self):
+    xs, ys = self.coefficients
+    return ([ i * c for i, c in enumerate(xs) ][1:], [ i * c for i, c in enumerate(ys) ][1:])
+
+  def _integrateSpeed(self, dxs, dys, t0, t1, nodes=GAUSS_NODES, weights=GAUSS_WEIGHTS):
+    half, mid = (t1 - t0) / 2.0, (t1 + t0) / 2.0
+    total = 0.0
+    for node, weight in zip(nodes, weights):
+      t = mid + half * node
+      dx, dy = polyval(dxs, t), polyval(dys, t)
+      total += weight * (dx * dx + dy * dy) ** 0.5
+    return total * half
+
+  def arcLengthTable(self):
+    """Returns the cumulative arc lengths of the curve at the times
+    i / ARC_LENGTH_INTERVALS, i.e. a list that starts with 0 and ends with
+    the length of the curve. It is built in a single sweep and cached, like
+    the coefficients."""
+    return self._cached("arcLengths", self._arcLengthTable)
+
+  def _arcLengthTable(self):
+    dxs, dys = self._speedCoefficients()
+    n = ARC_LENGTH_INTERVALS
+    table = [0.0]
+    for i in range(n):
+      table.append(table[-1] + self._integrateSpeed(dxs, dys, i / float(n), (i + 1) / float(n)))
+    return table
+
   @property
   def length(self):
-    d = self.derivative()
-    z = 0.5
-    _sum = 0
-    for i in range(0,len(Tvalues)):
-      t = z * Tvalues[i] + z
-      p = d.pointAtTime(t)
-      arc = math.sqrt(p.x * p.x + p.y * p.y)
-      _sum += Cvalues[i] * arc
-    return _sum * z
\ No newline at end of file
+    return self._cached("length", self._length)
+
+  def _length(self):
+    dxs, dys = self._speedCoefficients()
+    return self._integrateSpeed(dxs, dys, 0.0, 1.0, Tvalues, Cvalues)
+
+  def lengthAtTime(self, t):
+    """Returns the length of the curve from the start up to time t (0->1)."""
+    table = self.arcLengthTable()
+    n = ARC_LENGTH_INTERVALS
+    if t <= 0: return 0.0
+    if t >= 1: return table[-1]
+    i = min(int(t * n), n - 1)
+    dxs, dys = self._speedCoefficients()
+    return table[i] + self._integrateSpeed(dxs, dys, i / float(n), t)
+
+  def timeAtLength(self, length):
+    """Returns the time t (0->1) at which the length of the curve from the
+    start reaches the given length. This is the inverse of `lengthAtTime`."""
+    table = self.arcLengthTable()
+    n = ARC_LENGTH_INTERVALS
+    if length <= 0: return 0.0
+    if length >= table[-1]: return 1.0
+    i = min(bisect_right(table, length) - 1, n - 1)
+    start = lo = i / float(n)
+    hi = (i + 1) / float(n)
+    span = table[i + 1] - table[i]
+    t = lo + (hi - lo) * (length - table[i]) / span if span > 0 else lo
+    dxs, dys = self._speedCoefficients()
+    # Newton's method, falling back to bisection when a step leaves the bracket.
+    for _ in range(NEWTON_ITERATIONS):
+      error = table[i] + self._integrateSpeed(dxs, dys, start, t) - length
+      if abs(error) < NEWTON_TOLERANCE: break
+      if error > 0: hi = t
+      else: lo = t
+      dx, dy = polyval(dxs, t), polyval(dys, t)
+      speed = (dx * dx + dy * dy) ** 0.5
+      newT = t - error / speed if speed > 0 else lo
+      t = newT if lo < newT < hi else (lo + hi) / 2.0
+    return t
@@ -5,6 +5,19 @@ import logging
 import pyclipper
 from beziers.line import Line
 from beziers.point import Point
+from beziers.utils.linesweep import overlapping_pairs
+
+# The boxes of the broad phase are padded by this fraction of their size,
+# as the narrow phase accepts points a little way past the ends of lines.
+SWEEP_MARGIN = 1e-6
+
+def _sweepBox(seg):
+  # The box of the control points, which encloses the segment.
+  xs = [ p.x for p in seg.points ]
+  ys = [ p.y for p in seg.points ]
+  left, bottom, right, top = min(xs), min(ys), max(xs), max(ys)
+  margin = SWEEP_MARGIN * (1 + right - left + top - bottom)
+  return (left - margin, bottom - margin, right + margin, top + margin)
 
 class BooleanOperationsMixin:
 
@@ -17,11 +30,11 @@ class BooleanOperationsMixin:
       l = seg.hasLoop
       if l and l[0]>0 and l[0]<1 and l[1]>0 and l[0]<1:
         intersections.append(Intersection(seg,l[0], seg,l[1]))
-    for i1 in range(0, len(segs)):
-      for i2 in range (i1+1, len(segs)):
-        for i in segs[i1].intersections(segs[i2]):
-          if i.t1 > 1e-2 and i.t1 < 1-1e-2:
-            intersections.append(i)
+    # Only the pairs of segments whose boxes overlap can intersect.
+    for i1, i2 in overlapping_pairs([ _sweepBox(seg) for seg in segs ]):
+      for i in segs[i1].intersections(segs[i2]):
+        if i.t1 > 1e-2 and i.t1 < 1-1e-2:
+          intersections.append(i)
     return intersections
 
   def removeOverlap(self):
@@ -55,16 +68,16 @@ class BooleanOperationsMixin:
         splitpoints[roundoff(seg.start)]["out"].append(seg)
     newsegs = []
     copying = True
-    logging.debug("Split points:", splitpoints)
+    logging.debug("Split points: %s", splitpoints)
     seg = segs[0]
     while not seg.visited:
-      logging.debug("Starting at %s, visiting %s" % (seg.start, seg))
+      logging.debug("Starting at %s, visiting %s", seg.start, seg)
       newsegs.append(seg)
       seg.visited = True
       if roundoff(seg.end) in splitpoints and len(splitpoints[roundoff(seg.end)]["out"]) > 0:
-        logging.debug("\nI am at %s and have a decision: " % seg.end)
+        logging.debug("\nI am at %s and have a decision: ", seg.end)
         inAngle = seg.tangentAtTime(1).angle
-        logging.debug("My angle is %s" % inAngle)
+        logging.debug("My angle is %s", inAngle)
         # logging.debug("Options are: ")
         # for s in splitpoints[roundoff(seg.end)]["out"]:
           # logging.debug(s.end, s.tangentAtTime(0).angle, self.windingNumberOfPoint(s.pointAtTime(0.5)))
@@ -99,8 +112,8 @@ class BooleanOperationsMixin:
               splitlist1.append((i.seg2,i.t2))
             intersections[i.point] = i
 
-    logging.debug("Split list: %s" % splitlist1)
-    logging.debug("Split list 2: %s" % splitlist2)
+    logging.debug("Split list: %s", splitlist1)
+    logging.debug("Split list 2: %s", splitlist2)
     cloned.splitAtPoints(splitlist1)
     clip.splitAtPoints(splitlist2)
     logging.debug("Self:")
@@ -4,6 +4,84 @@ from beziers.utils import isclose
 
 my_epsilon = 2e-7
 
+# Bezier clipping splits a curve when clipping removes less than a fifth
+# of it. The splits are counted along the way to each piece, whether or
+# not clipping made progress in between, and pieces that still overlap
+# after MAX_SPLIT_DEPTH splits are reported: this bounds the work on
+# overlapping curves to 2 ** MAX_SPLIT_DEPTH pieces, while crossing curves
+# are separated within a few splits. Intersections whose ranges are within
+# MERGE_TOLERANCE of each other are reported once.
+MAX_CLIPPED_FRACTION = 0.8
+MAX_SPLIT_DEPTH = 12
+MERGE_TOLERANCE = 1e-6
+FAT_LINE_MARGIN = 1e-9
+
+def _controlBox(points):
+  xs = [ x for x, _ in points ]
+  ys = [ y for _, y in points ]
+  return (min(xs), min(ys), max(xs), max(ys))
+
+def _boxesOverlap(a, b):
+  return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+def _splitControlPoints(points, t):
+  # de Casteljau's algorithm on (x, y) tuples.
+  left, right = [ points[0] ], [ points[-1] ]
+  while len(points) > 1:
+    points = [ (ax + (bx - ax) * t, ay + (by - ay) * t) for (ax, ay), (bx, by) in zip(points, points[1:]) ]
+    left.append(points[0])
+    right.append(points[-1])
+  return left, right[::-1]
+
+def _controlPointsBetween(points, t0, t1):
+  if t1 < 1.0:
+    points = _splitControlPoints(points, t1)[0]
+  if t0 > 0.0:
+    points = _splitControlPoints(points, t0 / t1)[1]
+  return points
+
+def _fatLineClip(p, q):
+  # Returns the range of times of p within the fat line of q, i.e. the
+  # band around the line through the ends of q that contains q, or None if
+  # p misses it. The distances of the control points of p from the line,
+  # plotted against their times i/n, form a polygon whose convex hull
+  # bounds the distance of p; its extent within the band is found from
+  # every pair of its vertices, which covers the edges of the hull.
+  (x0, y0), (x1, y1) = q[0], q[-1]
+  dx, dy = x1 - x0, y1 - y0
+  length = (dx * dx + dy * dy) ** 0.5
+  if length == 0: return (0.0, 1.0)
+  a, b, c = -dy / length, dx / length, (dy * x0 - dx * y0) / length
+  distances = [ a * x + b * y + c for x, y in q ]
+  # The band is widened by FAT_LINE_MARGIN so that rounding errors in the
+  # distances can't clip an intersection away once the curves are tiny.
+  dmin, dmax = min(distances) - FAT_LINE_MARGIN, max(distances) + FAT_LINE_MARGIN
+  n = len(p) - 1
+  hull = [ (i / float(n), a * x + b * y + c) for i, (x, y) in enumerate(p) ]
+  tmin, tmax = 2.0, -1.0
+  for i, (ti, ei) in enumerate(hull):
+    if dmin <= ei <= dmax:
+      tmin, tmax = min(tmin, ti), max(tmax, ti)
+    for tj, ej in hull[i + 1:]:
+      for bound in (dmin, dmax):
+        if (ei - bound) * (ej - bound) < 0:
+          t = ti + (tj - ti) * (bound - ei) / (ej - ei)
+          tmin, tmax = min(tmin, t), max(tmax, t)
+  if tmin > tmax: return None
+  return (max(tmin, 0.0), min(tmax, 1.0))
+
+def _mergeRanges(found):
+  # Merges the ranges that touch on both curves, returning the middle of each.
+  merged = []
+  for p0, p1, q0, q1 in sorted(found):
+    for m in merged:
+      if p0 <= m[1] + MERGE_TOLERANCE and m[0] <= p1 + MERGE_TOLERANCE and q0 <= m[3] + MERGE_TOLERANCE and m[2] <= q1 + MERGE_TOLERANCE:
+        m[0], m[1], m[2], m[3] = min(m[0], p0), max(m[1], p1), min(m[2], q0), max(m[3], q1)
+        break
+    else:
+      merged.append([p0, p1, q0, q1])
+  return [ [ (p0 + p1) / 2.0, (q0 + q1) / 2.0 ] for p0, p1, q0, q1 in merged ]
+
 class Intersection:
   """An object representing an intersection between two segments.
   The location of the intersection on the first segment is accessible
@@ -21,6 +99,7 @@ class Intersection:
 class IntersectionsMixin:
   # This isn't something we mix into different classes but I'm
   # just putting it here to keep the code tidy.
+  __slots__ = ()
 
   def intersections(self, other, limited = True):
     """Returns an array of `Intersection` objects representing the intersections
@@ -99,39 +178,43 @@ class IntersectionsMixin:
       inter.append(Intersection(self,t,line,line.tOfPoint(self.pointAtTime(t))))
     return inter
 
-  def _curve_curve_intersections_t(self,other, precision=1e-3):
+  def _curve_curve_intersections_t(self,other, precision=1e-6):
+    """Returns the [t1, t2] pairs at which this curve and another curve
+    intersect, found by Bezier clipping (Sederberg and Nishita): each curve
+    is clipped in turn to the fat line enclosing the other, and split in half
+    when that removes less than a fifth of it. Pieces are rejected when the
+    bounding boxes of their control points, which enclose their convex hulls,
+    don't overlap, and reported when both are smaller than `precision`."""
     assert(len(self.points) > 2 and len(other.points) > 2)
-    if not (self.bounds().overlaps(other.bounds())): return []
-    if self.bounds().area < precision and other.bounds().area < precision:
-      return [ [
-      0.5*(self._range[0] + self._range[1]),
-      0.5*(other._range[0] + other._range[1]),
-     ] ]
-    def xmap(v,ts,te): return ts+(te-ts)*v
-    c11, c12 = self.splitAtTime(0.5)
-    c11._range = [ self._range[0], xmap(0.5,self._range[0],self._range[1])]
-    c12._range = [ xmap(0.5,self._range[0],self._range[1]), self._range[1]]
-    c21, c22 = other.splitAtTime(0.5)
-    c21._range = [ other._range[0], xmap(0.5,other._range[0],other._range[1])]
-    c22._range = [xmap(0.5,other._range[0],other._range[1]), other._range[1]]
-    assert(c11._range[0] < c11._range[1])
-    assert(c12._range[0] < c12._range[1])
-    assert(c21._range[0] < c21._range[1])
-    assert(c22._range[0] < c22._range[1])
-
     found = []
-    for this in [c11,c12]:
-      for that in [c21,c22]:
-        if this.bounds().overlaps(that.bounds()):
-          found.extend(this._curve_curve_intersections_t(that, precision))
-    seen = {}
-    def filterSeen(n):
-      key = '%.5f' % n[0]
-      if key in seen: return False
-      seen[key] = 1
-      return True
-    found = filter(filterSeen, found)
-    return found
+    # Each entry is (curve to clip, its range, the other curve, its range,
+    # number of splits that led to them, whether the curves are swapped).
+    stack = [([ (p.x, p.y) for p in self.points ], 0.0, 1.0, [ (p.x, p.y) for p in other.points ], 0.0, 1.0, 0, False)]
+    while stack:
+      p, p0, p1, q, q0, q1, depth, swapped = stack.pop()
+      pBox, qBox = _controlBox(p), _controlBox(q)
+      if not _boxesOverlap(pBox, qBox): continue
+      if (pBox[2] - pBox[0] < precision and pBox[3] - pBox[1] < precision and
+          qBox[2] - qBox[0] < precision and qBox[3] - qBox[1] < precision) or depth > MAX_SPLIT_DEPTH:
+        found.append((q0, q1, p0, p1) if swapped else (p0, p1, q0, q1))
+        continue
+      clipped = _fatLineClip(p, q)
+      if clipped is None: continue
+      tmin, tmax = clipped
+      if tmax - tmin > MAX_CLIPPED_FRACTION:
+        # Clipping hardly helps, e.g. with several intersections: split
+        # the longer curve, and clip both halves against the other.
+        if p1 - p0 < q1 - q0:
+          p, p0, p1, q, q0, q1, swapped = q, q0, q1, p, p0, p1, not swapped
+        left, right = _splitControlPoints(p, 0.5)
+        pm = (p0 + p1) / 2.0
+        stack.append((q, q0, q1, right, pm, p1, depth + 1, not swapped))
+        stack.append((q, q0, q1, left, p0, pm, depth + 1, not swapped))
+        continue
+      p = _controlPointsBetween(p, tmin, tmax)
+      p0, p1 = p0 + (p1 - p0) * tmin, p0 + (p1 - p0) * tmax
+      stack.append((q, q0, q1, p, p0, p1, depth, not swapped))
+    return _mergeRanges(found)
 
   def _curve_curve_intersections(self,other):
     assert(len(self.points) > 2 and len(other.points) > 2)
@@ -1,41 +1,47 @@
-from collections import deque
+import heapq
 
-def dequefilter(deck, condition):
-    for _ in range(0, len(deck)):
-        item = deck.popleft()
-        if condition(item):
-            deck.append(item)
+def overlapping_pairs(boxes, other_boxes=None):
+	"""Returns the sorted pairs of indices (i, j) of the boxes that overlap,
+	where each box is a (left, bottom, right, top) tuple and boxes that only
+	touch count as overlapping. With other_boxes, i indexes boxes and j
+	other_boxes, and only pairs across the two lists are returned; otherwise
+	the pairs are within boxes, with i < j.
 
-def bbox_intersections(seta, setb):
-	active_a = deque([])
-	active_b = deque([])
-	instructions = []
-	intersections = []
-	def add_to(o, bounds, l):
-		l.append( (o, bounds) )
-		if l == active_a:
-			other = active_b
-		else:
-			other = active_a
-		for (o2, bounds2) in other:
-			if bounds.overlaps(bounds2):
-				intersections.append( (o, o2) )
+	The boxes are swept from left to right. The active boxes of each list are
+	kept in a heap ordered by their right edges, so that those left behind are
+	dropped from the top, and only boxes which overlap horizontally are ever
+	compared."""
+	events = [ (box[0], 0, i) for i, box in enumerate(boxes) ]
+	if other_boxes is not None:
+		events.extend((box[0], 1, j) for j, box in enumerate(other_boxes))
+	events.sort()
+	lists = (boxes, boxes if other_boxes is None else other_boxes)
+	active = ([], [])
+	pairs = []
+	for left, side, i in events:
+		for heap in active:
+			while heap and heap[0][0] < left:
+				heapq.heappop(heap)
+		box = lists[side][i]
+		other_side = 0 if other_boxes is None else 1 - side
+		for _, j in active[other_side]:
+			other = lists[other_side][j]
+			if other[1] <= box[3] and box[1] <= other[3]:
+				pairs.append((j, i) if side or (other_boxes is None and j < i) else (i, j))
+		heapq.heappush(active[side], (box[2], i))
+	pairs.sort()
+	return pairs
 
-	def remove_from(o, bounds, l):
-		dequefilter(l, lambda i: i[0] != o)
+def _bounds_box(o):
+	bounds = o.bounds()
+	return (bounds.left, bounds.bottom, bounds.right, bounds.top)
 
-	for a in seta:
-		bounds = a.bounds()
-		instructions.append((bounds.left, a, bounds, add_to, active_a))
-		instructions.append((bounds.right, a, bounds, remove_from, active_a))
-	for b in setb:
-		bounds = b.bounds()
-		instructions.append((bounds.left, b, bounds, add_to, active_b))
-		instructions.append((bounds.right, b, bounds, remove_from, active_b))
-	instructions = sorted(instructions, key=lambda i:i[0])
-	for key, o, bounds, verb, activelist in instructions:
-		verb(o, bounds, activelist)
-	return intersections
+def bbox_intersections(seta, setb):
+	"""Returns the pairs (a, b) of objects from seta and setb whose bounds()
+	overlap, in the order of seta and then setb."""
+	seta, setb = list(seta), list(setb)
+	pairs = overlapping_pairs([ _bounds_box(a) for a in seta ], [ _bounds_box(b) for b in setb ])
+	return [ (seta[i], setb[j]) for i, j in pairs ]
 
 if __name__ == "__main__":
 	from beziers.path.geometricshapes import Rectangle
@@ -0,0 +1,67 @@
+from beziers.point import Point
+
+class PointIndex(object):
+  """A dictionary keyed by the coordinates of `Point` objects, quantized to
+  integers on a grid of `quantum` units. Lookups neither depend on the exact
+  float values (which is what `Point.__hash__` uses) nor go through the
+  tolerant comparison of `Point.__eq__`, so they are fast and give the same
+  answer every time::
+
+    >>> index = PointIndex()
+    >>> index[Point(0.1 + 0.2, 1)] = "a"
+    >>> index[Point(0.3, 1)]
+    'a'
+
+  Segments (or any sequence of points) can be used as keys too, in which
+  case all of their points are quantized.
+  """
+
+  def __init__(self, quantum=1e-6):
+    self.quantum = quantum
+    self._scale = 1.0 / quantum
+    self._values = {}
+    self._points = {}
+
+  def key(self, item):
+    """Returns the quantized key of a point or a sequence of points."""
+    if isinstance(item, Point):
+      return (round(item.x * self._scale), round(item.y * self._scale))
+    return tuple(self.key(p) for p in getattr(item, "points", item))
+
+  def __getitem__(self, item):
+    return self._values[self.key(item)]
+
+  def __setitem__(self, item, value):
+    key = self.key(item)
+    self._values[key] = value
+    self._points[key] = item
+
+  def __delitem__(self, item):
+    key = self.key(item)
+    del self._values[key]
+    del self._points[key]
+
+  def __contains__(self, item):
+    return self.key(item) in self._values
+
+  def __len__(self):
+    return len(self._values)
+
+  def __iter__(self):
+    return iter(list(self._points.values()))
+
+  def get(self, item, default=None):
+    return self._values.get(self.key(item), default)
+
+  def setdefault(self, item, default=None):
+    key = self.key(item)
+    if key not in self._values:
+      self._values[key] = default
+      self._points[key] = item
+    return self._values[key]
+
+  def items(self):
+    return [(self._points[key], value) for key, value in self._values.items()]
+
+  def values(self):
+    return list(self._values.values())
@@ -1,4 +1,14 @@
+from beziers.point import Point
+
 class SampleMixin(object):
+  __slots__ = ()
+
+  def pointsAtTimes(self, ts):
+    """Returns the x and y co-ordinates of the points at the given times as
+    two lists. Segments override this with a cheaper evaluation."""
+    points = [ self.pointAtTime(t) for t in ts ]
+    return [ p.x for p in points ], [ p.y for p in points ]
+
   def sample(self,samples):
     """Samples a segment or path a given number of times, returning a list of Point objects.
     Remember that for a Bezier path, the points are not guaranteed to be distributed
@@ -19,43 +29,36 @@ class SampleMixin(object):
     """
     step = 1.0 / float(samples)
     t = 0.0
-    samples = []
+    ts = []
     while t <= 1.0:
-      samples.append(self.pointAtTime(t))
+      ts.append(t)
       t += step
     if t != 1.0:
-      samples.append(self.pointAtTime(1))
-    return samples
+      ts.append(1)
+    xs, ys = self.pointsAtTimes(ts)
+    return [ Point(x, y) for x, y in zip(xs, ys) ]
 
   def regularSample(self,samples):
     """Samples a segment or path a given number of times, returning a list of Point objects,
     but ensuring that the points are regularly distributed along the length
-    of the curve. This is an expensive operation because I am a lazy programmer."""
+    of the curve."""
 
-    return [ self.pointAtTime(t) for t in self.regularSampleTValue(samples) ]
+    xs, ys = self.pointsAtTimes(self.regularSampleTValue(samples))
+    return [ Point(x, y) for x, y in zip(xs, ys) ]
 
   def regularSampleTValue(self,samples):
     """Sometimes you don't want the points, you just want a set of time values (t) which
     represent regular spaced samples along the curve. Use this method to get a list of time
     values instead of Point objects."""
-    # Build LUT; could cache it *if* we knew when to invalidate
-    lut = []
+    # The times are found from the arc length table (see ArcLengthMixin), in linear time.
     length = self.length
     if length == 0: return []
-    step = 1.0 / length
-    t = 0
-    while t <= 1.0:
-      lut.append( (t,self.lengthAtTime(t)) ) # Inefficient algorithm but computers are getting faster
-      t += step
     desiredLength = 0.0
-    rSamples = []
+    lengths = []
     while desiredLength < length:
-      while len(lut) > 0 and lut[0][1] < desiredLength:
-        lut.pop(0)
-      if len(lut) == 0:
-        break
-      rSamples.append(lut[0][0])
+      lengths.append(desiredLength)
       desiredLength += length / samples
+    rSamples = self.timesAtLengths(lengths)
     if rSamples[-1] != 1.0:
       rSamples.append(1.0)
     return rSamples
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+
+# Benchmarks of the Better Oblique pipeline on synthetic CJK-style outlines:
+#
+#   python -m benchmarks -o before.json
+#   python -m benchmarks -o after.json
+#   python -m benchmarks compare before.json after.json
+#
+# The modules of the plugin are imported from the bundle, so the benchmarks measure exactly
+# what is shipped.
+
+import os
+import sys
+
+RESOURCES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'BetterOblique.glyphsFilter', 'Contents', 'Resources')
+
+for path in (os.path.join(RESOURCES_DIR, 'site-packages'), RESOURCES_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
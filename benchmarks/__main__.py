@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, print_function
+
+import argparse
+import json
+import math
+import sys
+
+from benchmarks import glyphs, pipeline
+
+
+def format_value(metric, value):
+    if value is None:
+        return '-'
+    if metric in ('peak_memory', 'mean_peak_memory', 'object_memory', 'dict_object_memory'):
+        return '{0:.1f} KiB'.format(value / 1024.0)
+    if metric in ('retained_blocks', 'allocations'):
+        return '{0:.0f}'.format(value)
+    return '{0:.3f} ms'.format(value * 1000.0)
+
+def run(args):
+    settings = pipeline.default_settings(shear_angle=math.radians(args.angle), tolerance=args.tolerance)
+    settings['optical_correction'] = args.optical_correction
+    settings['seed'] = args.seed
+    selected_glyphs = glyphs.make_glyphs(args.count, seed=args.seed, categories=args.categories)
+    def log(message):
+        print(message, file=sys.stderr)
+    results = pipeline.run_benchmarks(selected_glyphs, settings, stages=args.stages, repeat=args.repeat, memory=not args.no_memory, log=log)
+    data = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(data)
+    else:
+        print(data)
+    return 0
+
+def compare(args):
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    if old['settings'] != new['settings']:
+        print('warning: the settings differ, so the results may not be comparable', file=sys.stderr)
+    number_of_regressions = 0
+    for stage, metric, a, b, ratio in pipeline.compare_results(old, new):
+        flag = ''
+        if ratio is not None and ratio > args.threshold:
+            flag = '  regression'
+            number_of_regressions += 1
+        print('{0:<16}{1:<18}{2:>14}{3:>14}{4:>9}{5}'.format(stage, metric, format_value(metric, a), format_value(metric, b), '-' if ratio is None else '{0:.2f}x'.format(ratio), flag))
+    return 1 if number_of_regressions > 0 else 0
+
+def make_argument_parser():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Benchmark the Better Oblique pipeline on synthetic CJK-style glyphs.')
+    subparsers = parser.add_subparsers(dest='command')
+    run_parser = subparsers.add_parser('run', help='run the benchmarks (default)')
+    run_parser.add_argument('-o', '--output', help='JSON file to write the results to (default: stdout)')
+    run_parser.add_argument('-n', '--count', type=int, default=100, help='number of glyphs (default: %(default)s)')
+    run_parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic glyphs (default: %(default)s)')
+    run_parser.add_argument('--categories', nargs='+', choices=glyphs.CATEGORIES, default=glyphs.CATEGORIES, help='kinds of glyphs to generate (default: all)')
+    run_parser.add_argument('--stages', nargs='+', choices=pipeline.STAGES, default=pipeline.STAGES, help='stages to time (default: all)')
+    run_parser.add_argument('-r', '--repeat', type=int, default=3, help='runs per glyph and stage; the fastest is taken (default: %(default)s)')
+    run_parser.add_argument('-a', '--angle', type=float, default=12.0, help='oblique angle in degrees (default: %(default)s)')
+    run_parser.add_argument('-c', '--optical-correction', choices=('thin', 'medium', 'thick'), default='medium', help='optical correction (default: %(default)s)')
+    run_parser.add_argument('--tolerance', type=float, default=pipeline.DEFAULT_TOLERANCE, help='tolerance of the subdivision (default: %(default)s)')
+    run_parser.add_argument('--no-memory', action='store_true', help='do not measure the memory, the retained blocks and the allocations, which takes an extra run')
+    compare_parser = subparsers.add_parser('compare', help='compare two results and report the regressions')
+    compare_parser.add_argument('old', help='JSON file of the baseline')
+    compare_parser.add_argument('new', help='JSON file to compare with the baseline')
+    compare_parser.add_argument('--threshold', type=float, default=1.1, help='ratio above which a metric counts as a regression (default: %(default)s)')
+    return parser
+
+def main(args=None):
+    if args is None:
+        args = sys.argv[1:]
+    if not args or args[0] not in ('run', 'compare', '-h', '--help'):
+        args = ['run'] + list(args)
+    args = make_argument_parser().parse_args(args)
+    if args.command == 'compare':
+        return compare(args)
+    return run(args)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+
+# Synthetic glyphs that resemble the outlines the filter is used on. Each glyph is a list of
+# closed contours in the node format of betterObliqueFilter, i.e. (x, y, type) tuples.
+#
+#   diagonal  strokes at various angles, where the optical correction matters the most
+#   serif     Mincho-style horizontal and vertical strokes with uroko serifs and hooks
+#   kanji     many strokes laid out on a grid
+#   kana      curved strokes and loops made of cubic curves only
+#
+# The glyphs are generated from a seed, so every run sees the same outlines.
+
+from __future__ import division
+
+import math
+import random
+
+CATEGORIES = ('diagonal', 'serif', 'kanji', 'kana')
+
+EM = 1000
+STEM = 80
+
+
+class ContourBuilder(object):
+    # Collects the segments of a closed contour and returns the nodes in the same order as
+    # make_nodes_from_bezier_path() does, i.e. starting with the node that closes the contour.
+
+    def __init__(self, x, y):
+        self.start = (x, y)
+        self.nodes = []
+
+    def line_to(self, x, y):
+        self.nodes.append((x, y, 'line'))
+        return self
+
+    def curve_to(self, x1, y1, x2, y2, x3, y3):
+        self.nodes.extend(((x1, y1, 'offcurve'), (x2, y2, 'offcurve'), (x3, y3, 'curve')))
+        return self
+
+    def close(self):
+        nodes = list(self.nodes)
+        if len(nodes) > 0 and nodes[-1][:2] == self.start:
+            return [nodes[-1]] + nodes[:-1]
+        return [(self.start[0], self.start[1], 'line')] + nodes
+
+
+def rotate(points, angle, cx, cy):
+    cos_a, sin_a = math.cos(angle), math.sin(angle)
+    return [(cx + (x - cx) * cos_a - (y - cy) * sin_a, cy + (x - cx) * sin_a + (y - cy) * cos_a) for x, y in points]
+
+def rectangle(x, y, w, h):
+    return ContourBuilder(x, y).line_to(x + w, y).line_to(x + w, y + h).line_to(x, y + h).close()
+
+def diagonal_stroke(cx, cy, length, width, angle, taper=0.5):
+    # A stroke along the given angle, tapering towards the end like a left-falling stroke.
+    points = rotate([
+        (cx - length / 2.0, cy - width / 2.0),
+        (cx + length / 2.0, cy - width * taper / 2.0),
+        (cx + length / 2.0, cy + width * taper / 2.0),
+        (cx - length / 2.0, cy + width / 2.0),
+    ], angle, cx, cy)
+    builder = ContourBuilder(*points[0])
+    for x, y in points[1:]:
+        builder.line_to(x, y)
+    return builder.close()
+
+def horizontal_serif_stroke(x, y, length, width):
+    # A horizontal stroke ending in a triangular uroko serif with curved shoulders.
+    serif = width * 1.6
+    return (ContourBuilder(x, y)
+        .line_to(x + length - serif, y)
+        .curve_to(x + length - serif * 0.5, y, x + length, y + width * 0.2, x + length, y + width * 0.6)
+        .curve_to(x + length, y + width * 0.9, x + length - serif * 0.3, y + width * 1.4, x + length - serif * 0.6, y + width * 1.9)
+        .line_to(x + length - serif * 1.1, y + width)
+        .line_to(x, y + width)
+        .close())
+
+def vertical_hook_stroke(x, y, length, width):
+    # A vertical stroke with a rounded top and a hook to the left at the bottom.
+    hook = width * 1.5
+    return (ContourBuilder(x, y + hook)
+        .line_to(x, y + length)
+        .curve_to(x, y + length + width * 0.4, x + width * 0.6, y + length + width * 0.5, x + width, y + length + width * 0.2)
+        .line_to(x + width, y + hook * 0.6)
+        .curve_to(x + width, y + hook * 0.1, x + width * 0.7, y, x + width * 0.3, y)
+        .line_to(x - hook, y + hook * 0.9)
+        .curve_to(x - hook * 0.6, y + hook * 1.0, x - hook * 0.2, y + hook * 1.0, x, y + hook)
+        .close())
+
+def curved_stroke(spine, width):
+    # Outline a stroke along a chain of cubic curves by offsetting the control polygon to both sides,
+    # which is close enough to a brush stroke for benchmarking.
+    def offset_control_points(points, d):
+        result = []
+        for i, (x, y) in enumerate(points):
+            x0, y0 = points[max(i - 1, 0)]
+            x1, y1 = points[min(i + 1, len(points) - 1)]
+            dx, dy = x1 - x0, y1 - y0
+            norm = math.hypot(dx, dy) or 1.0
+            result.append((x - dy / norm * d, y + dx / norm * d))
+        return result
+    left = offset_control_points(spine, width / 2.0)
+    right = offset_control_points(spine, -width / 2.0)[::-1]
+    builder = ContourBuilder(*left[0])
+    for points in (left, right):
+        if points is right:
+            builder.line_to(*points[0])
+        for i in range(1, len(points) - 1, 3):
+            builder.curve_to(points[i][0], points[i][1], points[i + 1][0], points[i + 1][1], points[i + 2][0], points[i + 2][1])
+    return builder.close()
+
+def ellipse(cx, cy, rx, ry, clockwise=False):
+    # Four quarter arcs between the points on the axes, with the handles towards the corners of the bounding box.
+    k = 0.5523
+    points = [(cx + rx, cy), (cx, cy + ry), (cx - rx, cy), (cx, cy - ry)]
+    if clockwise:
+        points = points[:1] + points[:0:-1]
+    builder = ContourBuilder(*points[0])
+    for (x0, y0), (x3, y3) in zip(points, points[1:] + points[:1]):
+        corner_x, corner_y = x0 + x3 - cx, y0 + y3 - cy
+        builder.curve_to(x0 + (corner_x - x0) * k, y0 + (corner_y - y0) * k, x3 + (corner_x - x3) * k, y3 + (corner_y - y3) * k, x3, y3)
+    return builder.close()
+
+def make_diagonal_glyph(r):
+    contours = []
+    for _ in range(r.randint(2, 4)):
+        angle = math.radians(r.choice((r.uniform(20, 70), r.uniform(110, 160))))
+        contours.append(diagonal_stroke(r.uniform(300, 700), r.uniform(250, 750), r.uniform(300, 600), STEM * r.uniform(0.8, 1.4), angle, taper=r.uniform(0.2, 1.0)))
+    return contours
+
+def make_serif_glyph(r):
+    contours = []
+    for i in range(r.randint(1, 3)):
+        contours.append(horizontal_serif_stroke(r.uniform(80, 200), 200 + i * 250 + r.uniform(-30, 30), r.uniform(500, 750), STEM * 0.6))
+    for i in range(r.randint(1, 2)):
+        contours.append(vertical_hook_stroke(250 + i * 350 + r.uniform(-30, 30), r.uniform(60, 120), r.uniform(600, 780), STEM))
+    return contours
+
+def make_kanji_glyph(r):
+    # A grid of cells, each with a horizontal or vertical stroke, a diagonal stroke or a dot.
+    contours = []
+    cells = r.randint(3, 5)
+    size = (EM - 100) / cells
+    for i in range(cells):
+        for j in range(cells):
+            x, y = 50 + i * size, 50 + j * size
+            kind = r.random()
+            if kind < 0.35:
+                contours.append(rectangle(x + size * 0.1, y + size * 0.45, size * 0.8, STEM * 0.5))
+            elif kind < 0.6:
+                contours.append(rectangle(x + size * 0.45, y + size * 0.1, STEM * 0.7, size * 0.8))
+            elif kind < 0.85:
+                contours.append(diagonal_stroke(x + size / 2.0, y + size / 2.0, size * 0.8, STEM * 0.8, math.radians(r.uniform(25, 155))))
+            else:
+                contours.append(ellipse(x + size / 2.0, y + size / 2.0, size * 0.15, size * 0.12))
+    return contours
+
+def make_kana_glyph(r):
+    contours = []
+    for _ in range(r.randint(1, 3)):
+        spine = [(r.uniform(150, 850), r.uniform(150, 850))]
+        for _ in range(r.randint(2, 4)):
+            x, y = spine[-1]
+            for _ in range(3):
+                x = min(max(x + r.uniform(-250, 250), 50), 950)
+                y = min(max(y + r.uniform(-250, 250), 50), 950)
+                spine.append((x, y))
+        contours.append(curved_stroke(spine, STEM * r.uniform(0.7, 1.1)))
+    if r.random() < 0.5:
+        cx, cy = r.uniform(350, 650), r.uniform(300, 600)
+        rx, ry = r.uniform(150, 250), r.uniform(150, 250)
+        contours.append(ellipse(cx, cy, rx, ry))
+        contours.append(ellipse(cx, cy, rx - STEM, ry - STEM * 0.8, clockwise=True))
+    return contours
+
+GENERATORS = {
+    'diagonal': make_diagonal_glyph,
+    'serif': make_serif_glyph,
+    'kanji': make_kanji_glyph,
+    'kana': make_kana_glyph,
+}
+
+def make_glyphs(count=100, seed=0, categories=CATEGORIES):
+    # Returns a list of (name, category, contours), cycling through the categories.
+    r = random.Random(seed)
+    glyphs = []
+    for i in range(count):
+        category = categories[i % len(categories)]
+        glyphs.append(('{0}{1:04d}'.format(category, i), category, GENERATORS[category](r)))
+    return glyphs
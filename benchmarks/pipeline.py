@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+
+# Per-stage timing of the pipeline. Every stage is given a glyph at a time and timed on its own:
+#
+#   offset_path      the optical correction of each contour
+#   shear_path       the optical correction and the skew of each contour
+#   merge            merge_subdivided_segments() on contours that have been subdivided and offset beforehand
+#   shear_contours   the whole headless pipeline for a glyph, including the centering
+#   shear_layer      the same on a GSLayer, which is the stand-in of betterObliqueGlyphs outside Glyphs
+#   collisions       find_contour_collisions() on the results of shear_contours(), against the original contours
+#   overlaps         remove_overlaps() on the results of shear_contours(); skipped without pyclipper
+#
+# The inputs of each stage are prepared outside of the timed region. Unless disabled, each stage is run once
+# more per glyph under tracemalloc, to measure its peak memory and the number of blocks its results take up.
+# That run also counts the points and segments of beziers made by the stage, and adds up their size as they
+# are, with slots, and as they would be with a __dict__ instead, which shows what the slots save.
+
+from __future__ import division
+
+import gc
+import math
+import platform
+import time
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from beziers.point import Point
+from beziers.segment import Segment
+
+import betterObliqueFilter
+from betterObliqueFilter import (
+    DEFAULT_TOLERANCE, make_bezier_path_from_nodes, make_shear_distance_func, offset_path, shear_path,
+    subdivide_segments, translate_segments, merge_subdivided_segments, shear_contours, shear_layer, find_contour_collisions,
+    GSLayer, GSPath, GSNode,
+)
+
+STAGES = ('offset_path', 'shear_path', 'merge', 'shear_contours', 'shear_layer', 'collisions', 'overlaps')
+PERCENTILES = (50, 90, 95, 99)
+
+clock = getattr(time, 'perf_counter', time.time)
+
+
+def make_glyphs_layer(contours):
+    layer = GSLayer()
+    for nodes in contours:
+        path = GSPath()
+        for x, y, node_type in nodes:
+            path.nodes.append(GSNode((x, y), node_type))
+        path.closed = True
+        layer.paths.append(path)
+    return layer
+
+def has_glyphs():
+    try:
+        import GlyphsApp
+    except ImportError:
+        return False
+    return True
+
+def has_pyclipper():
+    try:
+        import pyclipper
+    except ImportError:
+        return False
+    return True
+
+def prepare_stage(stage, contours, settings):
+    # Returns a function that runs the stage on the glyph once.
+    shear_angle = settings['shear_angle']
+    std_vw, std_hw = settings['std_vw'], settings['std_hw']
+    mode, tolerance = settings['optical_correction'], settings['tolerance']
+    distance_func = make_shear_distance_func(shear_angle, std_vw, std_hw, mode=mode)
+    if stage == 'offset_path':
+        paths = [make_bezier_path_from_nodes(nodes) for nodes in contours]
+        return lambda: [offset_path(path, distance_func, tolerance=tolerance) for path in paths]
+    if stage == 'shear_path':
+        paths = [make_bezier_path_from_nodes(nodes) for nodes in contours]
+        return lambda: [shear_path(path, shear_angle, std_vw, std_hw, mode=mode, tolerance=tolerance) for path in paths]
+    if stage == 'merge':
+        jobs = []
+        for nodes in contours:
+            original_segments = make_bezier_path_from_nodes(nodes).asSegments()
+            segments, provenance = subdivide_segments(original_segments, distance_func, tolerance=tolerance)
+            jobs.append((translate_segments(segments, distance_func, provenance), provenance, original_segments))
+        return lambda: [merge_subdivided_segments(segments, provenance, original_segments) for segments, provenance, original_segments in jobs]
+    if stage == 'shear_contours':
+        return lambda: shear_contours(contours, shear_angle, std_vw=std_vw, std_hw=std_hw, optical_correction=mode, tolerance=tolerance)
+    if stage == 'shear_layer':
+        # shear_layer() works in place, so each run gets a fresh layer.
+        layers = []
+        def run():
+            shear_layer(layers.pop(), shear_angle, std_vw=std_vw, std_hw=std_hw, optical_correction=mode, tolerance=tolerance)
+        run.prepare = lambda: layers.append(make_glyphs_layer(contours))
+        return run
+    if stage == 'collisions':
+        sheared_contours = [nodes for nodes, _ in shear_contours(contours, shear_angle, std_vw=std_vw, std_hw=std_hw, optical_correction=mode, tolerance=tolerance)]
+        return lambda: find_contour_collisions(sheared_contours, contours)
+    if stage == 'overlaps':
+        from betterObliqueOverlaps import remove_overlaps
+        sheared_contours = [nodes for nodes, _ in shear_contours(contours, shear_angle, std_vw=std_vw, std_hw=std_hw, optical_correction=mode, tolerance=tolerance)]
+        return lambda: remove_overlaps(sheared_contours)
+    raise ValueError('Unknown stage: {0}'.format(stage))
+
+def time_stage(func, repeat):
+    # The fastest of the runs is taken as the latency, as the slower ones are slowed down by noise.
+    best = None
+    for _ in range(repeat):
+        prepare = getattr(func, 'prepare', None)
+        if prepare is not None:
+            prepare()
+        t = clock()
+        func()
+        elapsed = clock() - t
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def geometry_classes(classes=(Point, Segment)):
+    # The classes of points and segments, with their subclasses.
+    for cls in classes:
+        yield cls
+        for subclass in geometry_classes(cls.__subclasses__()):
+            yield subclass
+
+class AllocationCounter(object):
+    # Counts the points and segments made while it is active, by class, through the __init__ methods of
+    # their classes, and keeps one of each class to measure.
+
+    def __init__(self):
+        self.counts = {}
+        self.samples = {}
+        self.methods = []
+
+    def __enter__(self):
+        counts, samples = self.counts, self.samples
+        def make_counting_init(init):
+            def counting_init(instance, *args, **kwargs):
+                init(instance, *args, **kwargs)
+                cls = type(instance)
+                counts[cls] = counts.get(cls, 0) + 1
+                samples.setdefault(cls, instance)
+            return counting_init
+        for cls in geometry_classes():
+            init = cls.__dict__.get('__init__')
+            if init is not None:
+                self.methods.append((cls, init))
+                cls.__init__ = make_counting_init(init)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        for cls, init in self.methods:
+            cls.__init__ = init
+        self.methods = []
+
+_object_sizes = {}
+
+def measure_object_sizes(instance, number=1000):
+    # The bytes taken up by an object of the class of the instance, with the same attributes set, with slots
+    # and with a __dict__ instead, not counting the values of the attributes. Both are measured with
+    # tracemalloc, as objects with a __dict__ take up more than sys.getsizeof() tells.
+    cls = type(instance)
+    if cls not in _object_sizes:
+        slots = [name for klass in cls.__mro__ for name in getattr(klass, '__slots__', ())]
+        attributes = [(name, getattr(instance, name)) for name in slots if hasattr(instance, name)]
+        without_slots = type(cls.__name__, (object,), {})
+        def make_objects(make):
+            objects = []
+            tracemalloc.start()
+            try:
+                start = tracemalloc.get_traced_memory()[0]
+                for _ in range(number):
+                    obj = make()
+                    for name, value in attributes:
+                        setattr(obj, name, value)
+                    objects.append(obj)
+                size = tracemalloc.get_traced_memory()[0] - start
+            finally:
+                tracemalloc.stop()
+            # The list holding the objects is counted too, at a pointer per object.
+            return size / number - 8
+        _object_sizes[cls] = (make_objects(lambda: object.__new__(cls)), make_objects(without_slots))
+    return _object_sizes[cls]
+
+def measure_memory(func):
+    # Returns a dictionary of:
+    #
+    #   peak_memory          peak of the memory allocated by Python while the stage runs, in bytes
+    #   retained_blocks      number of blocks still allocated when it returns, i.e. the objects its results
+    #                        are made of
+    #   allocations          number of points and segments made while it runs
+    #   object_memory        bytes those objects take up, not counting their attributes
+    #   dict_object_memory   bytes they would take up with a __dict__ instead of slots
+    if tracemalloc is None:
+        return None
+    prepare = getattr(func, 'prepare', None)
+    if prepare is not None:
+        prepare()
+    counter = AllocationCounter()
+    tracemalloc.start()
+    try:
+        with counter:
+            result = func()
+        peak = tracemalloc.get_traced_memory()[1]
+        snapshot = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    del result
+    memory = {
+        'peak_memory': peak,
+        'retained_blocks': sum((statistic.count for statistic in snapshot.statistics('filename'))),
+        'allocations': sum(counter.counts.values()),
+        'object_memory': 0.0,
+        'dict_object_memory': 0.0,
+    }
+    for cls, count in counter.counts.items():
+        size, dict_size = measure_object_sizes(counter.samples[cls])
+        memory['object_memory'] += count * size
+        memory['dict_object_memory'] += count * dict_size
+    return memory
+
+def mean(values):
+    return sum(values) / len(values) if values else None
+
+def percentile(sorted_values, p):
+    # Linear interpolation between the closest ranks.
+    if len(sorted_values) == 0:
+        return None
+    k = (len(sorted_values) - 1) * p / 100.0
+    i = int(math.floor(k))
+    j = min(i + 1, len(sorted_values) - 1)
+    return sorted_values[i] + (sorted_values[j] - sorted_values[i]) * (k - i)
+
+def summarize(latencies):
+    values = sorted(latencies)
+    summary = {
+        'glyphs': len(values),
+        'total': sum(values),
+        'mean': sum(values) / len(values) if values else None,
+        'min': values[0] if values else None,
+        'max': values[-1] if values else None,
+    }
+    for p in PERCENTILES:
+        summary['p{0}'.format(p)] = percentile(values, p)
+    return summary
+
+def run_benchmarks(glyphs, settings, stages=STAGES, repeat=3, memory=True, log=None):
+    # Returns the results as a dictionary that can be saved as JSON.
+    results = {
+        'environment': {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'glyphs': has_glyphs(),
+            'pyclipper': has_pyclipper(),
+            'filter': betterObliqueFilter.__file__,
+        },
+        'settings': dict(settings, repeat=repeat, glyphs=len(glyphs)),
+        'stages': {},
+    }
+    for stage in stages:
+        if stage == 'overlaps' and not results['environment']['pyclipper']:
+            if log:
+                log('{0}: skipped, as pyclipper is not installed'.format(stage))
+            continue
+        latencies = []
+        latencies_by_category = {}
+        memory_list = []
+        for name, category, contours in glyphs:
+            func = prepare_stage(stage, contours, settings)
+            gc.collect()
+            latency = time_stage(func, repeat)
+            latencies.append(latency)
+            latencies_by_category.setdefault(category, []).append(latency)
+            if memory:
+                glyph_memory = measure_memory(func)
+                if glyph_memory is not None:
+                    memory_list.append(glyph_memory)
+        summary = summarize(latencies)
+        # The peak is that of the glyph that needs the most memory, and the others are the means per glyph.
+        peaks = [glyph_memory['peak_memory'] for glyph_memory in memory_list]
+        summary['peak_memory'] = max(peaks) if peaks else None
+        summary['mean_peak_memory'] = mean(peaks)
+        for metric in ('retained_blocks', 'allocations', 'object_memory', 'dict_object_memory'):
+            summary[metric] = mean([glyph_memory[metric] for glyph_memory in memory_list])
+        summary['categories'] = dict(((category, summarize(values)) for category, values in latencies_by_category.items()))
+        results['stages'][stage] = summary
+        if log:
+            log('{0}: p50 {1:.2f} ms, p99 {2:.2f} ms'.format(stage, summary['p50'] * 1000.0, summary['p99'] * 1000.0))
+            if summary['allocations'] is not None:
+                log('{0}: {1:.0f} points and segments per glyph, {2:.1f} KiB with slots, {3:.1f} KiB with a __dict__'.format(
+                    stage, summary['allocations'], summary['object_memory'] / 1024.0, summary['dict_object_memory'] / 1024.0))
+    return results
+
+def default_settings(shear_angle=math.radians(12.0), tolerance=DEFAULT_TOLERANCE):
+    return {
+        'shear_angle': shear_angle,
+        'std_vw': 80.0,
+        'std_hw': 60.0,
+        'optical_correction': 'medium',
+        'tolerance': tolerance,
+    }
+
+def compare_results(old, new, metrics=('p50', 'p90', 'p99', 'peak_memory', 'mean_peak_memory', 'retained_blocks', 'allocations', 'object_memory', 'dict_object_memory')):
+    # Returns (stage, metric, old value, new value, ratio) for the stages in both results.
+    rows = []
+    for stage in STAGES:
+        if stage not in old['stages'] or stage not in new['stages']:
+            continue
+        for metric in metrics:
+            a = old['stages'][stage].get(metric)
+            b = new['stages'][stage].get(metric)
+            ratio = b / a if a and b is not None else None
+            rows.append((stage, metric, a, b, ratio))
+    return rows
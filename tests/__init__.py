@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+
+# Tests of the Better Oblique pipeline:
+#
+#   python -m pytest tests
+#
+# As with the benchmarks, the modules of the plugin are imported from the bundle, so the tests cover
+# exactly what is shipped.
+
+import os
+import sys
+
+RESOURCES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'BetterOblique.glyphsFilter', 'Contents', 'Resources')
+
+for path in (os.path.join(RESOURCES_DIR, 'site-packages'), RESOURCES_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+
+# The glyphs sheared through the pipeline of threads or the pool of worker processes must come out the
+# same as when they are sheared one by one. Errors must be reported for their glyphs without stopping
+# the others, and anything else that fails in a worker process must reach the caller.
+
+from __future__ import division
+
+import math
+import multiprocessing
+import os
+import shutil
+import threading
+
+import pytest
+
+pytest.importorskip('fontTools')
+
+from fontTools.ufoLib import UFOWriter
+from betterObliqueBatch import GlyphRecord, GlyphTask, init_worker_process, run_pipeline, run_pool, run_task
+
+OPTIONS = {'shear_angle': math.radians(12), 'std_vw': 80.0, 'std_hw': 60.0}
+NUMBER_OF_GLYPHS = 30
+TIMEOUT = 60
+
+def draw_glyph(pen, i):
+    # A square and an ellipse that grow with the index, so that every glyph is different.
+    size = 100 + 10 * i
+    pen.beginPath()
+    for x, y in ((0, 0), (size, 0), (size, size), (0, size)):
+        pen.addPoint((x, y), segmentType='line')
+    pen.endPath()
+    cx, cy, rx, ry, k = 300 + i, 300, 150 + 5 * i, 100, 0.5523
+    pen.beginPath()
+    pen.addPoint((cx + rx, cy), segmentType='curve', smooth=True)
+    for (x0, y0), (x1, y1) in (((cx + rx, cy), (cx, cy + ry)), ((cx, cy + ry), (cx - rx, cy)), ((cx - rx, cy), (cx, cy - ry)), ((cx, cy - ry), (cx + rx, cy))):
+        corner_x, corner_y = x0 + x1 - cx, y0 + y1 - cy
+        pen.addPoint((x0 + (corner_x - x0) * k, y0 + (corner_y - y0) * k))
+        pen.addPoint((x1 + (corner_x - x1) * k, y1 + (corner_y - y1) * k))
+        if (x1, y1) != (cx + rx, cy):
+            pen.addPoint((x1, y1), segmentType='curve', smooth=True)
+    pen.endPath()
+
+def make_ufo(path):
+    writer = UFOWriter(path)
+    glyph_set = writer.getGlyphSet()
+    for i in range(NUMBER_OF_GLYPHS):
+        glyph = GlyphRecord()
+        glyph.width = 600
+        glyph_set.writeGlyph('g{0:02d}'.format(i), glyph, lambda pen, i=i: draw_glyph(pen, i))
+    glyph_set.writeContents()
+    writer.writeLayerContents()
+    return path
+
+def read_glifs(path):
+    glyphs_dir = os.path.join(path, 'glyphs')
+    return dict(((name, open(os.path.join(glyphs_dir, name), 'rb').read()) for name in os.listdir(glyphs_dir)))
+
+def make_tasks(source, path, task_class=GlyphTask):
+    shutil.copytree(source, path)
+    return [task_class(path, None, 'g{0:02d}'.format(i), OPTIONS) for i in range(NUMBER_OF_GLYPHS)]
+
+
+class FailingTask(GlyphTask):
+    # Fails to read, shear or write some of the glyphs.
+
+    def read(self):
+        if self.glyph_name == 'g03':
+            raise IOError('cannot read')
+        return GlyphTask.read(self)
+
+    def shear(self, glyph):
+        if self.glyph_name == 'g10':
+            raise ValueError('cannot shear')
+        return GlyphTask.shear(self, glyph)
+
+    def write(self, glyph):
+        if self.glyph_name == 'g17':
+            raise IOError('cannot write')
+        GlyphTask.write(self, glyph)
+
+
+class UnpicklableTask(GlyphTask):
+    # Returns a warning that cannot be sent back from the worker process, which fails outside run_task().
+
+    def shear(self, glyph):
+        return [lambda: None]
+
+
+def run_with_timeout(func):
+    # Runs func in a thread, so that a deadlock fails the test instead of hanging it.
+    results = []
+    thread = threading.Thread(target=lambda: results.append(func()))
+    thread.daemon = True
+    thread.start()
+    thread.join(TIMEOUT)
+    assert not thread.is_alive(), 'deadlocked'
+    return results[0]
+
+@pytest.fixture(scope='module')
+def source(tmp_path_factory):
+    return make_ufo(str(tmp_path_factory.mktemp('batch') / 'Source.ufo'))
+
+@pytest.fixture(scope='module')
+def pool():
+    pool = multiprocessing.Pool(2, initializer=init_worker_process, initargs=(None, 0, None, False))
+    yield pool
+    pool.close()
+    pool.join()
+
+@pytest.fixture(scope='module')
+def sequential(source, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('sequential') / 'Font.ufo')
+    results = [run_task(task) for task in make_tasks(source, path)]
+    assert read_glifs(path) != read_glifs(source)
+    return results, read_glifs(path)
+
+def test_pipeline(source, sequential, tmp_path):
+    path = str(tmp_path / 'Font.ufo')
+    tasks = make_tasks(source, path)
+    results = run_with_timeout(lambda: list(run_pipeline(tasks, queue_size=2)))
+    assert [result[:2] for result in results] == [result[:2] for result in sequential[0]]
+    assert read_glifs(path) == sequential[1]
+
+def test_pool(source, sequential, pool, tmp_path):
+    path = str(tmp_path / 'Font.ufo')
+    tasks = make_tasks(source, path)
+    results = run_with_timeout(lambda: list(run_pool(pool, tasks, 2, queue_size=1, chunk_size=3)))
+    assert [result[:2] for result in results] == [result[:2] for result in sequential[0]]
+    assert read_glifs(path) == sequential[1]
+
+def check_errors(results, path, sequential):
+    errors = dict(((name, error) for name, error, _, _ in results if error is not None))
+    assert sorted(errors) == ['g03', 'g10', 'g17']
+    assert 'cannot read' in errors['g03'] and 'cannot shear' in errors['g10'] and 'cannot write' in errors['g17']
+    assert len(results) == NUMBER_OF_GLYPHS
+    glifs = read_glifs(path)
+    assert dict(((name, glif) for name, glif in glifs.items() if name not in ('g03.glif', 'g10.glif', 'g17.glif'))) == dict(((name, glif) for name, glif in sequential[1].items() if name not in ('g03.glif', 'g10.glif', 'g17.glif')))
+
+def test_pipeline_errors(source, sequential, tmp_path):
+    path = str(tmp_path / 'Font.ufo')
+    tasks = make_tasks(source, path, FailingTask)
+    check_errors(run_with_timeout(lambda: list(run_pipeline(tasks, queue_size=2))), path, sequential)
+
+def test_pool_errors(source, sequential, pool, tmp_path):
+    path = str(tmp_path / 'Font.ufo')
+    tasks = make_tasks(source, path, FailingTask)
+    check_errors(run_with_timeout(lambda: list(run_pool(pool, tasks, 2, queue_size=1, chunk_size=3))), path, sequential)
+
+def test_pool_exception(source, pool, tmp_path):
+    # An exception raised in the worker process but outside run_task() reaches the caller.
+    path = str(tmp_path / 'Font.ufo')
+    tasks = make_tasks(source, path, UnpicklableTask)
+    def consume():
+        try:
+            list(run_pool(pool, tasks, 2, queue_size=1, chunk_size=3))
+        except Exception as e:
+            return e
+    assert isinstance(run_with_timeout(consume), Exception)
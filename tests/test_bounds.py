@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+
+# The bounds of the sheared contours are computed analytically, so that the shear and the centering can
+# be applied at once. They must agree with densely sampled bounds, and the centering must agree with
+# shearing each path and then centering the layer by its bounds, as the filter used to.
+
+from __future__ import division
+
+import math
+import random
+
+import pytest
+
+pytest.importorskip('fontTools')
+
+from fontTools.pens.boundsPen import BoundsPen
+from fontTools.pens.pointPen import PointToSegmentPen
+from fontTools.pens.transformPen import TransformPen
+from betterObliqueFilter import calc_nodes_bounds, cubic_value, shear_gspath, shear_layer, shear_transform, transform_nodes
+from betterObliqueGlyphs import GSComponent, GSLayer, GSNode, GSPath
+
+SAMPLES = 1000
+SHEAR_ANGLE = math.radians(12)
+
+def random_contour(rng):
+    # A closed contour of cubic curves and lines.
+    nodes = []
+    for _ in range(rng.randint(1, 4)):
+        if rng.random() < 0.8:
+            nodes.append((rng.uniform(-500, 500), rng.uniform(-500, 500), 'offcurve'))
+            nodes.append((rng.uniform(-500, 500), rng.uniform(-500, 500), 'offcurve'))
+            nodes.append((rng.uniform(-500, 500), rng.uniform(-500, 500), 'curve'))
+        else:
+            nodes.append((rng.uniform(-500, 500), rng.uniform(-500, 500), 'line'))
+    return nodes[-1:] + nodes[:-1] if nodes[-1][2] == 'curve' else nodes
+
+def sampled_bounds(contours):
+    xs, ys = [], []
+    for nodes in contours:
+        for i, (x, y, node_type) in enumerate(nodes):
+            if node_type == 'curve':
+                (x0, y0, _), (x1, y1, _), (x2, y2, _) = nodes[i - 3], nodes[i - 2], nodes[i - 1]
+                xs.extend((cubic_value(x0, x1, x2, x, j / SAMPLES) for j in range(SAMPLES + 1)))
+                ys.extend((cubic_value(y0, y1, y2, y, j / SAMPLES) for j in range(SAMPLES + 1)))
+            elif node_type == 'line':
+                xs.append(x)
+                ys.append(y)
+    return (min(xs), min(ys), max(xs), max(ys))
+
+@pytest.mark.parametrize('seed', [3, 5])
+@pytest.mark.parametrize('transform', [None, shear_transform(SHEAR_ANGLE), (0.8, 0.3, -0.4, 1.1, 50.0, -20.0)])
+def test_bounds_against_samples(seed, transform):
+    rng = random.Random(seed)
+    for _ in range(30):
+        contours = [random_contour(rng) for _ in range(rng.randint(1, 3))]
+        bounds = calc_nodes_bounds(contours, transform)
+        expected = sampled_bounds([transform_nodes(nodes, transform) for nodes in contours] if transform else contours)
+        for value, expected_value in zip(bounds[:2], expected[:2]):
+            assert expected_value - 1e-2 < value <= expected_value + 1e-9
+        for value, expected_value in zip(bounds[2:], expected[2:]):
+            assert expected_value - 1e-9 <= value < expected_value + 1e-2
+
+def make_path(nodes):
+    path = GSPath()
+    path.nodes = [GSNode((x, y), node_type) for x, y, node_type in nodes]
+    return path
+
+def make_layer():
+    # Two strokes and a dot as a component that sticks out to the right, so that it moves the center.
+    dot = GSLayer()
+    dot.addPath(make_path([(0, 0, 'curve'), (28, 0, 'offcurve'), (50, 22, 'offcurve'), (50, 50, 'curve'), (50, 78, 'offcurve'), (28, 100, 'offcurve'), (0, 100, 'curve'), (-28, 100, 'offcurve'), (-50, 78, 'offcurve'), (-50, 50, 'curve'), (-50, 22, 'offcurve'), (-28, 0, 'offcurve')]))
+    layer = GSLayer()
+    layer.addPath(make_path([(100, 0, 'line'), (180, 0, 'line'), (420, 700, 'line'), (340, 700, 'line')]))
+    layer.addPath(make_path([(150, 300, 'curve'), (250, 250, 'offcurve'), (400, 250, 'offcurve'), (500, 350, 'curve'), (450, 400, 'line'), (380, 330, 'offcurve'), (260, 330, 'offcurve'), (180, 370, 'curve')]))
+    layer.addComponent(GSComponent('dot', offset=(700.0, 600.0), layer=dot))
+    return layer
+
+def exact_bounds(layer):
+    # The bounds with the pen of fontTools, which flattens nothing either.
+    pen = BoundsPen(None)
+    point_pen = PointToSegmentPen(pen)
+    for path in layer.paths:
+        point_pen.beginPath()
+        for node in path.nodes:
+            point_pen.addPoint((node.x, node.y), segmentType=None if node.type == 'offcurve' else node.type)
+        point_pen.endPath()
+    for component in layer.components:
+        transform_pen = PointToSegmentPen(TransformPen(pen, component.transform))
+        for path in component.layer.paths:
+            transform_pen.beginPath()
+            for node in path.nodes:
+                transform_pen.addPoint((node.x, node.y), segmentType=None if node.type == 'offcurve' else node.type)
+            transform_pen.endPath()
+    return pen.bounds
+
+def baseline_shear_layer(layer, **kwargs):
+    # Shear each path, then move the paths so that the center of the layer stays where it was.
+    x_min, y_min, x_max, y_max = exact_bounds(layer)
+    for path in layer.paths:
+        shear_gspath(path, SHEAR_ANGLE, 80.0, 60.0, **kwargs)
+    new_x_min, new_y_min, new_x_max, new_y_max = exact_bounds(layer)
+    dx = (x_min + x_max) / 2.0 - (new_x_min + new_x_max) / 2.0
+    dy = (y_min + y_max) / 2.0 - (new_y_min + new_y_max) / 2.0
+    for path in layer.paths:
+        path.applyTransform((1.0, 0.0, 0.0, 1.0, dx, dy))
+
+@pytest.mark.parametrize('vertical', [False, True])
+def test_centering_with_components(vertical):
+    layer, expected = make_layer(), make_layer()
+    shear_layer(layer, SHEAR_ANGLE, std_vw=80.0, std_hw=60.0, vertical=vertical)
+    baseline_shear_layer(expected, vertical=vertical)
+    assert layer.components[0].transform == expected.components[0].transform
+    for path, expected_path in zip(layer.paths, expected.paths):
+        assert [node.type for node in path.nodes] == [node.type for node in expected_path.nodes]
+        for node, expected_node in zip(path.nodes, expected_path.nodes):
+            assert abs(node.x - expected_node.x) < 1e-6 and abs(node.y - expected_node.y) < 1e-6
+    # The component counts: without it, the paths would be moved elsewhere.
+    without_component = make_layer()
+    without_component.components = []
+    shear_layer(without_component, SHEAR_ANGLE, std_vw=80.0, std_hw=60.0, vertical=vertical)
+    node, other_node = layer.paths[0].nodes[0], without_component.paths[0].nodes[0]
+    assert abs(node.x - other_node.x) + abs(node.y - other_node.y) > 0.1
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+# The on-disk cache must return what was put in it, keep its running total in step with the files, and
+# evict the least recently used entries first.
+
+from __future__ import division
+
+import os
+
+from betterObliqueCache import ShearCache
+from betterObliqueFilter import make_cache_params
+
+CONTOURS = [[(0.0, 0.0, 'line'), (100.0, 0.0, 'line'), (100.0, 100.0, 'line')]]
+RESULTS = [([(0.5, 0.0, 'line'), (10.0, 20.0, 'offcurve'), (30.0, 40.0, 'offcurve'), (100.25, 100.0, 'curve')], True), ([(0.0, 0.0, 'move'), (1.0, 1.0, 'line')], False)]
+
+def make_params(**kwargs):
+    arguments = dict(shear_angle=0.2, std_vw=80.0, std_hw=60.0, optical_correction='medium', strength=1.0, curve_segments_only=False, vertical=False, center=True, skip_shear=False, tolerance=1.0)
+    arguments.update(kwargs)
+    return make_cache_params(**arguments)
+
+def make_contours(i):
+    return [[(float(i), 0.0, 'line'), (100.0, 0.0, 'line'), (100.0, 100.0, 'line')]]
+
+def test_round_trip(tmp_path):
+    cache = ShearCache(str(tmp_path))
+    assert cache.get(CONTOURS, make_params()) is None
+    cache.put(CONTOURS, make_params(), RESULTS)
+    assert cache.get(CONTOURS, make_params()) == RESULTS
+    assert ShearCache(str(tmp_path)).get(CONTOURS, make_params()) == RESULTS
+
+def test_key_changes_with_parameters(tmp_path):
+    cache = ShearCache(str(tmp_path))
+    key = cache.key(CONTOURS, make_params())
+    assert cache.key(CONTOURS, dict(reversed(list(make_params().items())))) == key
+    for name, value in (('shear_angle', 0.3), ('std_vw', 81.0), ('optical_correction', 'thick'), ('strength', 0.5), ('vertical', True), ('center', False), ('tolerance', 0.5)):
+        assert cache.key(CONTOURS, make_params(**{name: value})) != key
+    assert cache.key(make_contours(1), make_params()) != key
+    cache.put(CONTOURS, make_params(), RESULTS)
+    assert cache.get(CONTOURS, make_params(tolerance=0.5)) is None
+
+def test_overwrite_is_counted_once(tmp_path):
+    cache = ShearCache(str(tmp_path))
+    cache.put(CONTOURS, make_params(), RESULTS)
+    cache.put(CONTOURS, make_params(), RESULTS[:1])
+    cache.put(make_contours(1), make_params(), RESULTS)
+    cache.put(make_contours(1), make_params(), RESULTS)
+    assert cache.add_size(0) == cache.total_size()
+
+def test_eviction(tmp_path):
+    cache = ShearCache(str(tmp_path))
+    cache.put(make_contours(0), make_params(), RESULTS)
+    entry_size = cache.total_size()
+    cache = ShearCache(str(tmp_path), max_size=entry_size * 5)
+    for i in range(5):
+        cache.put(make_contours(i), make_params(), RESULTS)
+        path = cache.path_for_key(cache.key(make_contours(i), make_params()))
+        os.utime(path, (1000000 + i, 1000000 + i))
+    assert cache.total_size() == entry_size * 5
+    # A hit makes the oldest entry the most recently used.
+    assert cache.get(make_contours(0), make_params()) == RESULTS
+    cache.put(make_contours(5), make_params(), RESULTS)
+    assert [cache.get(make_contours(i), make_params()) is not None for i in range(6)] == [True, False, False, True, True, True]
+    assert cache.add_size(0) == cache.total_size() <= entry_size * 5 * 0.9
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+# The collision check must report the contours that cross or touch each other, and only those, whether or
+# not their bounds overlap, and leave out the pairs that already collided before processing.
+
+from __future__ import division
+
+import pytest
+
+pytest.importorskip('fontTools')
+
+import betterObliqueStats
+from betterObliqueFilter import find_contour_collisions, iter_contour_collisions
+
+def square(x, y, size):
+    return [(x, y, 'line'), (x + size, y, 'line'), (x + size, y + size, 'line'), (x, y + size, 'line')]
+
+def bowl(x, y):
+    # A closed contour with curves, 200 wide and 200 high.
+    return [
+        (x, y, 'line'), (x + 200, y, 'line'),
+        (x + 200, y + 100, 'offcurve'), (x + 150, y + 200, 'offcurve'), (x + 100, y + 200, 'curve'),
+        (x + 50, y + 200, 'offcurve'), (x, y + 100, 'offcurve'), (x, y, 'curve'),
+    ]
+
+def corner(x, y):
+    # An L-shaped contour, whose bounds cover the notch at the top right.
+    return [(x, y, 'line'), (x + 300, y, 'line'), (x + 300, y + 100, 'line'), (x + 100, y + 100, 'line'), (x + 100, y + 300, 'line'), (x, y + 300, 'line')]
+
+@pytest.mark.parametrize('contours, expected', [
+    # Crossing.
+    ([square(0, 0, 100), square(50, 50, 100)], [(0, 1)]),
+    ([bowl(0, 0), square(150, 150, 100)], [(0, 1)]),
+    ([bowl(0, 0), bowl(100, 100)], [(0, 1)]),
+    # Touching along an edge, at a corner, and at the top of a curve.
+    ([square(0, 0, 100), square(100, 0, 100)], [(0, 1)]),
+    ([square(0, 0, 100), square(100, 100, 100)], [(0, 1)]),
+    ([bowl(0, 0), square(50, 200, 100)], [(0, 1)]),
+    # Disjoint, with and without overlapping bounds.
+    ([square(0, 0, 100), square(300, 0, 100)], []),
+    ([corner(0, 0), square(150, 150, 100)], []),
+    ([bowl(0, 0), square(170, 170, 50)], []),
+    # A contour inside another doesn't touch it.
+    ([square(0, 0, 300), square(100, 100, 100)], []),
+])
+def test_collisions(contours, expected):
+    assert list(iter_contour_collisions(contours)) == expected
+    assert find_contour_collisions(contours) == expected
+
+def test_several_contours():
+    # Only the colliding pairs are reported, in order, and empty and quadratic contours are skipped.
+    quadratic = [(0, 0, 'line'), (100, 0, 'line'), (100, 100, 'offcurve'), (0, 100, 'qcurve')]
+    contours = [square(0, 0, 100), [], square(300, 0, 100), quadratic, square(50, 50, 100), square(350, 50, 100), square(600, 0, 100)]
+    assert find_contour_collisions(contours) == [(0, 4), (2, 5)]
+
+def test_original_contours():
+    # The pairs which already collided before processing are left out.
+    original_contours = [square(0, 0, 100), square(50, 50, 100), square(300, 0, 100), square(420, 0, 100)]
+    contours = [square(0, 0, 100), square(50, 50, 100), square(300, 0, 100), square(380, 0, 100)]
+    assert find_contour_collisions(contours) == [(0, 1), (2, 3)]
+    assert find_contour_collisions(contours, original_contours) == [(2, 3)]
+
+def test_stats():
+    with betterObliqueStats.record(local=True) as glyph_stats:
+        find_contour_collisions([square(0, 0, 100), square(50, 50, 100), square(300, 0, 100)])
+    assert glyph_stats.counters['contour_collisions'] == 1
+    assert 'collisions' in glyph_stats.stages
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+# Bezier clipping must find the same intersections as a brute force search on flattened curves.
+
+from __future__ import division
+
+import random
+
+import pytest
+
+from beziers.cubicbezier import CubicBezier
+from beziers.point import Point
+from beziers.quadraticbezier import QuadraticBezier
+
+STEPS = 100
+TOLERANCE = 1e-3
+
+def flatten(curve):
+    return [curve.pointAtTime(i / STEPS) for i in range(STEPS + 1)]
+
+def line_intersection(a, b, c, d):
+    d1x, d1y, d2x, d2y = b.x - a.x, b.y - a.y, d.x - c.x, d.y - c.y
+    denominator = d1x * d2y - d1y * d2x
+    if denominator == 0:
+        return None
+    s = ((c.x - a.x) * d2y - (c.y - a.y) * d2x) / denominator
+    u = ((c.x - a.x) * d1y - (c.y - a.y) * d1x) / denominator
+    if 0 <= s <= 1 and 0 <= u <= 1:
+        return s, u
+    return None
+
+def brute_force_intersections(c, d):
+    ps, qs = flatten(c), flatten(d)
+    found = []
+    for i in range(STEPS):
+        for j in range(STEPS):
+            times = line_intersection(ps[i], ps[i + 1], qs[j], qs[j + 1])
+            if times:
+                found.append(((i + times[0]) / STEPS, (j + times[1]) / STEPS))
+    return found
+
+def random_point(rng):
+    return Point(rng.uniform(0, 1000), rng.uniform(0, 1000))
+
+def make_curve_pairs(seed, count=20):
+    rng = random.Random(seed)
+    pairs = []
+    for k in range(count):
+        c = CubicBezier(*[random_point(rng) for _ in range(4)])
+        if k % 4:
+            d = CubicBezier(*[random_point(rng) for _ in range(4)])
+        else:
+            d = QuadraticBezier(*[random_point(rng) for _ in range(3)])
+        pairs.append((c, d))
+    return pairs
+
+@pytest.mark.parametrize('seed', [7, 11])
+def test_random_curves(seed):
+    for c, d in make_curve_pairs(seed):
+        intersections = c.intersections(d)
+        expected = brute_force_intersections(c, d)
+        assert len(intersections) == len(expected)
+        for i in intersections:
+            assert i.point.distanceFrom(i.seg2.pointAtTime(i.t2)) < TOLERANCE
+            assert min(i.point.distanceFrom(c.pointAtTime(t1)) for t1, _ in expected) < 1.0
+
+def test_coincident_curves():
+    # Overlapping curves stop splitting at MAX_SPLIT_DEPTH and are reported once.
+    c = CubicBezier(Point(0, 0), Point(100, 300), Point(200, -300), Point(300, 0))
+    assert len(c.intersections(c.clone())) == 1
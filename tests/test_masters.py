@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+# The masters of a glyph are subdivided wherever any of them needs it, and the pieces are merged back
+# in the same way, so the sheared masters stay point-compatible.
+
+from __future__ import division
+
+import math
+
+import pytest
+
+pytest.importorskip('fontTools')
+
+from betterObliqueFilter import apply_contours_to_layer, calc_component_bounds, calc_gspath_nodes, shear_master_contours
+from betterObliqueGlyphs import GSLayer, GSNode, GSPath
+
+SHEAR_ANGLE = math.radians(12)
+STEMS = [(40.0, 30.0), (160.0, 120.0)]
+
+def make_layer(weight):
+    # An o-like glyph, which is rounder and heavier in the bold master.
+    layer = GSLayer()
+    for x, y, rx, ry in ((300, 350, 250, 350), (300, 350, 250 - weight, 350 - weight * 0.8)):
+        path = GSPath()
+        nodes = []
+        for i in range(4):
+            a, b = math.pi / 2 * i, math.pi / 2 * (i + 1)
+            k = 0.55 + weight / 1000.0
+            nodes.append(GSNode((x + rx * (math.cos(a) - k * math.sin(a)), y + ry * (math.sin(a) + k * math.cos(a))), 'offcurve'))
+            nodes.append(GSNode((x + rx * (math.cos(b) + k * math.sin(b)), y + ry * (math.sin(b) - k * math.cos(b))), 'offcurve'))
+            nodes.append(GSNode((x + rx * math.cos(b), y + ry * math.sin(b)), 'curve'))
+        if len(layer.paths):
+            nodes = [GSNode((node.x, node.y), node.type) for node in reversed(nodes)]
+        path.nodes = nodes
+        layer.addPath(path)
+    return layer
+
+def node_types(layer):
+    return [[node[2] for node in calc_gspath_nodes(path)] for path in layer.paths]
+
+def test_masters_stay_compatible():
+    layers = [make_layer(40), make_layer(150)]
+    assert node_types(layers[0]) == node_types(layers[1])
+    contours_list = [[calc_gspath_nodes(path) for path in layer.paths] for layer in layers]
+    results_list = shear_master_contours(contours_list, SHEAR_ANGLE, STEMS, tolerance=0.2, extra_bounds_list=[calc_component_bounds(layer) for layer in layers])
+    for layer, results in zip(layers, results_list):
+        assert all((compatible for _, compatible in results))
+        apply_contours_to_layer(layer, results)
+    assert node_types(layers[0]) == node_types(layers[1]) == node_types(make_layer(40))
+    assert [calc_gspath_nodes(path) for path in layers[0].paths] != contours_list[0]
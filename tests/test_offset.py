@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+# The curves of compatible contours must be subdivided in the same way, and merged back into as many
+# segments as there were, so that the offset contours stay compatible. The subdivided pieces follow the
+# exact offset curve within the tolerance.
+
+from __future__ import division
+
+import math
+
+import pytest
+
+pytest.importorskip('fontTools')
+
+import betterObliqueStats
+from beziers.cubicbezier import CubicBezier
+from betterObliqueFilter import DEFAULT_TOLERANCE, make_bezier_path_from_nodes, make_nodes_from_bezier_path, make_distance_vector, merge_subdivided_segments, offset_compatible_paths, offset_point, shear_contours, subdivide_compatible_segments, translate_segments
+
+SAMPLES = 10
+
+def make_distance(scale):
+    # Varies with the angle, like the distance of the optical correction, but much larger.
+    def distance(angle, index, count):
+        return scale * (1.0 + 0.5 * math.cos(2.0 * angle))
+    return distance
+
+def make_blob(k):
+    # A smooth contour of four curves with the handles along the axes, so that every junction is smooth
+    # and the offset has no miter joints.
+    rx1, ry1, rx2, ry2, h = 400.0, 300.0 * k, 250.0 * k, 150.0, 0.3 + 0.4 * k
+    return make_bezier_path_from_nodes([
+        (rx1, 0, 'curve'), (rx1, ry1 * h, 'offcurve'), (rx1 * h, ry1, 'offcurve'),
+        (0, ry1, 'curve'), (-rx2 * h, ry1, 'offcurve'), (-rx2, ry1 * h, 'offcurve'),
+        (-rx2, 0, 'curve'), (-rx2, -ry2 * h, 'offcurve'), (-rx2 * h, -ry2, 'offcurve'),
+        (0, -ry2, 'curve'), (rx1 * h, -ry2, 'offcurve'), (rx1, -ry2 * h, 'offcurve'),
+    ])
+
+def make_masters():
+    return [make_blob(0.5), make_blob(1.0)], [make_distance(20.0), make_distance(40.0)]
+
+def exact_offset(segment, t, distance, index, count):
+    p = segment.pointAtTime(t)
+    d = segment.derivative().pointAtTime(t)
+    angle = math.atan2(d.y, d.x)
+    return offset_point(p.x, p.y, angle, make_distance_vector(distance(angle, index, count)))
+
+def offset_error(segments, pieces, provenance, distance):
+    # The largest distance from the exact offset of the segments to the offset pieces, sampled densely.
+    error = 0.0
+    for piece, (i, t0, t1) in zip(pieces, provenance):
+        points = [piece.pointAtTime(j / 200) for j in range(201)]
+        for j in range(1, SAMPLES):
+            x, y = exact_offset(segments[i], t0 + (t1 - t0) * j / SAMPLES, distance, i, len(segments))
+            error = max(error, min((math.hypot(p.x - x, p.y - y) for p in points)))
+    return error
+
+def test_subdivision_is_shared():
+    paths, distances = make_masters()
+    segments_list = [path.asSegments() for path in paths]
+    pieces_list, provenance = subdivide_compatible_segments(segments_list, distances)
+    assert len(provenance) > len(segments_list[0])
+    for segments, pieces in zip(segments_list, pieces_list):
+        assert len(pieces) == len(provenance)
+        assert [type(piece) for piece in pieces] == [type(segments[i]) for i, _, _ in provenance]
+        for piece, (i, t0, t1) in zip(pieces, provenance):
+            for t in (0.0, 0.5, 1.0):
+                assert piece.pointAtTime(t).distanceFrom(segments[i].pointAtTime(t0 + (t1 - t0) * t)) < 1e-6
+    # The pieces of each segment cover it from 0 to 1 in order.
+    for i in range(len(segments_list[0])):
+        ranges = [(t0, t1) for j, t0, t1 in provenance if j == i]
+        assert ranges[0][0] == 0.0 and ranges[-1][1] == 1.0
+        assert all((a[1] == b[0] for a, b in zip(ranges, ranges[1:])))
+
+def test_pieces_within_tolerance():
+    paths, distances = make_masters()
+    segments_list = [path.asSegments() for path in paths]
+    pieces_list, provenance = subdivide_compatible_segments(segments_list, distances)
+    for segments, pieces, distance in zip(segments_list, pieces_list, distances):
+        offset_pieces = translate_segments(pieces, distance, provenance)
+        # The error is estimated at three samples per piece, so it may be exceeded slightly in between.
+        assert offset_error(segments, offset_pieces, provenance, distance) < DEFAULT_TOLERANCE * 1.2
+        assert offset_error(segments, translate_segments(segments, distance), [(i, 0.0, 1.0) for i in range(len(segments))], distance) > DEFAULT_TOLERANCE * 5
+
+def test_merge_keeps_segment_count():
+    paths, distances = make_masters()
+    segments_list = [path.asSegments() for path in paths]
+    pieces_list, provenance = subdivide_compatible_segments(segments_list, distances)
+    for segments, pieces, distance in zip(segments_list, pieces_list, distances):
+        offset_pieces = translate_segments(pieces, distance, provenance)
+        merged = merge_subdivided_segments(offset_pieces, provenance, segments)
+        assert len(merged) == len(segments)
+        assert all((isinstance(segment, CubicBezier) for segment in merged))
+        # The merged segments start and end where the pieces of their parents do.
+        firsts = [piece for piece, (_, t0, _) in zip(offset_pieces, provenance) if t0 == 0.0]
+        lasts = [piece for piece, (_, _, t1) in zip(offset_pieces, provenance) if t1 == 1.0]
+        for segment, first, last in zip(merged, firsts, lasts):
+            assert segment[0].distanceFrom(first[0]) < 1e-9
+            assert segment[-1].distanceFrom(last[-1]) < 1e-9
+
+def test_offset_paths_stay_compatible():
+    paths, distances = make_masters()
+    results = offset_compatible_paths(paths, distances)
+    plain_results = offset_compatible_paths(paths, distances, subdivide=False)
+    for path, result, plain_result, distance in zip(paths, results, plain_results, distances):
+        segments = path.asSegments()
+        assert [type(segment) for segment in result.asSegments()] == [type(segment) for segment in segments]
+        # Merging a curve back into one loses some of the accuracy of the pieces, but the result still
+        # follows the offset much more closely than the plain Tiller-Hanson offset.
+        provenance = [(i, 0.0, 1.0) for i in range(len(segments))]
+        assert offset_error(segments, result.asSegments(), provenance, distance) < offset_error(segments, plain_result.asSegments(), provenance, distance) / 2.0
+
+def test_incompatible_paths():
+    with pytest.raises(ValueError):
+        offset_compatible_paths([make_blob(1.0), make_bezier_path_from_nodes([(0, 0, 'line'), (100, 0, 'line'), (100, 100, 'line')])], [10.0, 10.0])
+
+@pytest.mark.parametrize('tolerance', [0.25, 1.0, 4.0])
+def test_tolerance(tolerance):
+    paths, distances = make_masters()
+    segments_list = [path.asSegments() for path in paths]
+    pieces_list, provenance = subdivide_compatible_segments(segments_list, distances, tolerance=tolerance)
+    _, coarser_provenance = subdivide_compatible_segments(segments_list, distances, tolerance=tolerance * 2.0)
+    assert len(provenance) > len(coarser_provenance)
+    for segments, pieces, distance in zip(segments_list, pieces_list, distances):
+        assert offset_error(segments, translate_segments(pieces, distance, provenance), provenance, distance) < tolerance * 1.2
+
+def test_tolerance_reaches_subdivision():
+    # The tolerance given to shear_contours() is the one the curves are subdivided by.
+    contours = [make_nodes_from_bezier_path(make_blob(1.0))]
+    splits = []
+    for tolerance in (0.05, 0.2, 1.0):
+        with betterObliqueStats.record(local=True) as glyph_stats:
+            shear_contours(contours, math.radians(12), std_vw=200.0, std_hw=160.0, tolerance=tolerance)
+        splits.append(glyph_stats.counters.get('splits', 0))
+    assert splits[0] > splits[1] > splits[2]
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+# remove_overlaps() must only merge the contours that cross each other, and the batch must keep the point
+# attributes of the others.
+
+from __future__ import division
+
+import pytest
+
+pytest.importorskip('pyclipper')
+pytest.importorskip('fontTools')
+
+from betterObliqueBatch import GlyphRecord
+from betterObliqueOverlaps import remove_overlaps
+
+def draw_contour(glyph, points, identifier=None):
+    glyph.beginPath(identifier=identifier)
+    for x, y, node_type, smooth, name in points:
+        glyph.addPoint((x, y), segmentType=None if node_type == 'offcurve' else node_type, smooth=smooth, name=name)
+    glyph.endPath()
+
+def square(x, y, size):
+    return [(x, y, 'line', False, None), (x + size, y, 'line', False, None), (x + size, y + size, 'line', False, None), (x, y + size, 'line', False, None)]
+
+def bowl(x, y):
+    # A counter-clockwise contour with a smooth node at the top.
+    return [
+        (x, y, 'line', False, 'start'), (x + 200, y, 'line', False, None),
+        (x + 200, y + 100, 'offcurve', False, None), (x + 150, y + 200, 'offcurve', False, None), (x + 100, y + 200, 'curve', True, 'top'),
+        (x + 50, y + 200, 'offcurve', False, None), (x, y + 100, 'offcurve', False, None), (x, y, 'curve', False, None),
+    ]
+
+def make_glyph():
+    glyph = GlyphRecord()
+    draw_contour(glyph, bowl(0, 0), identifier='bowl')
+    draw_contour(glyph, square(150, 50, 100), identifier='square')
+    draw_contour(glyph, bowl(500, 0), identifier='apart')
+    return glyph
+
+def test_only_crossing_contours_are_merged():
+    contours = make_glyph().nodes()
+    results = remove_overlaps(contours)
+    assert [index for _, index in results] == [None, 2]
+    assert results[1][0] is contours[2]
+
+def test_contours_inside_others_are_merged_with_them():
+    # The square crosses the counter, so the union depends on the outer contour too.
+    contours = [[node[:3] for node in square(0, 0, 400)], [node[:3] for node in square(100, 100, 200)[::-1]], [node[:3] for node in square(250, 150, 100)]]
+    results = remove_overlaps(contours)
+    assert [index for _, index in results] == [None, None]
+
+def test_attributes_are_kept():
+    glyph = make_glyph()
+    apart = glyph.contours[2]
+    glyph.set_contours(remove_overlaps(glyph.nodes()))
+    assert len(glyph.contours) == 2
+    assert glyph.contours[1] is apart
+    merged = glyph.contours[0]['points']
+    assert [point[3] for point in merged if point[:2] == (100, 200)] == [True]
+    assert not any((point[3] for point in merged if point[:2] != (100, 200)))
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+# PointIndex looks points up by their coordinates quantized to a grid, which must find whatever an exact
+# lookup found, tolerate float noise within a cell, and keep points in different cells apart. The splits
+# of splitAtPoints() must come out as they did with a linear scan of the split list.
+
+from __future__ import division
+
+import random
+
+import pytest
+
+from beziers.cubicbezier import CubicBezier
+from beziers.line import Line
+from beziers.path import BezierPath
+from beziers.point import Point
+from beziers.utils.pointindex import PointIndex
+
+QUANTUM = 1e-6
+
+def test_float_noise():
+    index = PointIndex()
+    index[Point(0.1 + 0.2, 1.0)] = 'a'
+    assert index[Point(0.3, 1.0)] == 'a'
+    assert Point(0.3 + 1e-12, 1.0 - 1e-12) in index
+    assert Point(0.3 + 2 * QUANTUM, 1.0) not in index
+
+@pytest.mark.parametrize('x', [0.0, 1.0, -1.0, 123.456, -987.654321])
+def test_cell_boundaries(x):
+    # Values exactly on the boundary between two cells, and just on either side of it.
+    index = PointIndex()
+    boundary = x + QUANTUM / 2.0
+    below, above = boundary - QUANTUM / 100.0, boundary + QUANTUM / 100.0
+    index[Point(boundary, -boundary)] = 'boundary'
+    assert index[Point(boundary, -boundary)] == 'boundary'
+    index[Point(below, 0.0)] = 'below'
+    index[Point(above, 0.0)] = 'above'
+    # Points in different cells are kept apart, even when they are closer than a quantum.
+    assert index[Point(below, 0.0)] == 'below'
+    assert index[Point(above, 0.0)] == 'above'
+    assert index.get(Point(x, 0.0)) == 'below'
+    assert index.get(Point(x + QUANTUM, 0.0)) == 'above'
+
+def test_signed_zero():
+    index = PointIndex()
+    index[Point(0.0, -0.0)] = 'zero'
+    assert index[Point(-0.0, 0.0)] == 'zero'
+    assert index[Point(-QUANTUM / 3.0, QUANTUM / 3.0)] == 'zero'
+
+def test_quantum():
+    index = PointIndex(quantum=1.0)
+    index[Point(0.4, 10.0)] = 'a'
+    assert index[Point(-0.4, 10.3)] == 'a'
+    assert Point(0.6, 10.0) not in index
+
+def test_segments():
+    index = PointIndex()
+    segment = CubicBezier(Point(0.1, 0.2), Point(10.0 / 3.0, 1.0), Point(2.0, 2.0), Point(3.0, 0.0))
+    index[segment] = 'curve'
+    assert index[CubicBezier(Point(0.3 - 0.2, 0.2), Point(1.0 / 3.0 * 10.0, 1.0), Point(2.0, 2.0), Point(3.0, 0.0))] == 'curve'
+    assert index.get(segment.reversed()) is None
+    assert index.get(Line(Point(0.1, 0.2), Point(3.0, 0.0))) is None
+    assert [(item is segment, value) for item, value in index.items()] == [(True, 'curve')]
+
+def linear_scan_split(path, splitlist):
+    # splitAtPoints() with the split list scanned for each segment, comparing the segments with ==.
+    def mapx(v, ds): return (v - ds) / (1 - ds)
+    newsegs = []
+    for seg in path.asSegments():
+        tList = sorted((t for s, t in splitlist if s == seg))
+        while len(tList) > 0:
+            t = tList.pop(0)
+            if t < 1e-8: continue
+            seg1, seg2 = seg.splitAtTime(t)
+            newsegs.append(seg1)
+            seg = seg2
+            for i in range(0, len(tList)): tList[i] = mapx(tList[i], t)
+        newsegs.append(seg)
+    return newsegs
+
+def random_point(rng):
+    return Point(rng.uniform(-500, 500), rng.uniform(-500, 500))
+
+def make_path(rng):
+    points = [random_point(rng)]
+    segments = []
+    for _ in range(rng.randint(2, 8)):
+        end = random_point(rng)
+        if rng.random() < 0.7:
+            segments.append(CubicBezier(points[-1], random_point(rng), random_point(rng), end))
+        else:
+            segments.append(Line(points[-1], end))
+        points.append(end)
+    return BezierPath.fromSegments(segments)
+
+def with_noise(segment, rng):
+    # A copy of the segment whose coordinates differ by float noise.
+    return segment.__class__(*[Point(p.x * (1 + rng.uniform(-1e-14, 1e-14)), p.y * (1 + rng.uniform(-1e-14, 1e-14))) for p in segment.points])
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_split_at_points(seed):
+    rng = random.Random(seed)
+    for _ in range(30):
+        path = make_path(rng)
+        segments = path.asSegments()
+        splitlist = []
+        for segment in segments:
+            for t in sorted((rng.random() for _ in range(rng.randint(0, 3))), reverse=True):
+                splitlist.append((with_noise(segment, rng) if rng.random() < 0.5 else segment, t))
+        splitlist.append((segments[0], 0.0))
+        expected = linear_scan_split(path, splitlist)
+        path.splitAtPoints(splitlist)
+        result = path.asSegments()
+        assert len(result) == len(expected)
+        for segment, expected_segment in zip(result, expected):
+            assert [(p.x, p.y) for p in segment.points] == [(p.x, p.y) for p in expected_segment.points]
+
+@pytest.mark.parametrize('seed', [4, 5])
+def test_add_extremes(seed):
+    rng = random.Random(seed)
+    for _ in range(30):
+        path = make_path(rng)
+        expected = linear_scan_split(path, [(segment, t) for segment in path.asSegments() for t in segment.findExtremes()])
+        assert [[(p.x, p.y) for p in segment.points] for segment in path.addExtremes().asSegments()] == [[(p.x, p.y) for p in segment.points] for segment in expected]
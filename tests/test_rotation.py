@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+# The start node of a contour is matched by searching its signature in the doubled signature of the
+# result, which must find the same rotation as trying each of them in turn.
+
+from __future__ import division
+
+import itertools
+import random
+
+import pytest
+
+pytest.importorskip('fontTools')
+
+from betterObliqueFilter import calc_prefix_table, find_rotation, fix_nodes_compatibility, list_shift, make_rotation_reference
+
+def brute_force_prefix_table(pattern):
+    return [max((k for k in range(i + 1) if pattern[:k] == pattern[i + 1 - k:i + 1] and k <= i)) for i in range(len(pattern))]
+
+def brute_force_rotation(reference, target):
+    if reference == target:
+        return 0
+    rotations = [n for n in range(len(target)) if list_shift(target, n) == reference]
+    return rotations[-1] if rotations else -1
+
+def make_signatures(seed, count=300):
+    # Random signatures, and some made of a repeated unit like those of symmetric contours.
+    rng = random.Random(seed)
+    signatures = []
+    for _ in range(count):
+        unit = ''.join((rng.choice('lco') for _ in range(rng.randint(1, 6))))
+        signatures.append(unit * rng.randint(1, 4) if rng.random() < 0.5 else unit)
+    return signatures
+
+@pytest.mark.parametrize('pattern', ['', 'l', 'llll', 'lool', 'ooclooc', 'aabaaab'] + [''.join(p) for p in itertools.product('lc', repeat=5)])
+def test_prefix_table(pattern):
+    assert calc_prefix_table(pattern) == brute_force_prefix_table(pattern)
+
+@pytest.mark.parametrize('seed', [1, 2])
+def test_random_rotations(seed):
+    rng = random.Random(seed)
+    for reference in make_signatures(seed):
+        table = calc_prefix_table(reference)
+        targets = [list_shift(reference, n) for n in range(len(reference))]
+        targets.append(''.join((rng.choice('lco') for _ in reference)))
+        targets.append(reference + 'l')
+        for target in targets:
+            expected = brute_force_rotation(reference, target)
+            assert find_rotation(reference, target) == expected
+            assert find_rotation(reference, target, table) == expected
+
+def test_fix_nodes_compatibility():
+    nodes = [(0, 0, 'line'), (10, 0, 'offcurve'), (20, 10, 'offcurve'), (20, 20, 'curve'), (0, 20, 'line')]
+    reference = make_rotation_reference(nodes)
+    for n in range(len(nodes)):
+        assert fix_nodes_compatibility(nodes, list_shift(nodes, n)) == nodes
+        assert fix_nodes_compatibility(nodes, list_shift(nodes, n), reference) == nodes
+    assert fix_nodes_compatibility(nodes, nodes[:-1] + [(0, 20, 'curve')], reference) is None
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+# The segments of the vendored beziers keep their attributes in slots, which every attribute set on them
+# has to be declared in, and cache their coefficients, bounds and length, which must be recomputed whenever
+# their points change.
+
+from __future__ import division
+
+import pytest
+
+from beziers.path.geometricshapes import Circle, Rectangle
+from beziers.cubicbezier import CubicBezier
+from beziers.path import BezierPath
+from beziers.point import Point
+
+@pytest.mark.parametrize('make_path', [lambda: Rectangle(100, 100, Point(0, 0)), lambda: Circle(50, Point(0, 0))])
+def test_remove_overlap(make_path):
+    # removeOverlap() marks the segments as it walks around the path.
+    path = make_path()
+    segments = [segment.clone() for segment in path.asSegments()]
+    path.removeOverlap()
+    assert path.asSegments() == segments
+
+def make_curve():
+    return CubicBezier(Point(0.3, 0.2), Point(40.6, 80.4), Point(90.2, -30.7), Point(120.5, 50.1))
+
+def geometry(segment):
+    bounds = segment.bounds()
+    return segment.coefficients, (bounds.left, bounds.bottom, bounds.right, bounds.top), segment.length
+
+def assert_geometry(segment, expected):
+    # The cached geometry is the same as that of a segment made afresh from the points.
+    coefficients, bounds, length = geometry(segment)
+    expected_coefficients, expected_bounds, expected_length = geometry(expected)
+    for actual, wanted in zip(coefficients, expected_coefficients):
+        assert actual == pytest.approx(wanted)
+    assert bounds == pytest.approx(expected_bounds)
+    assert length == pytest.approx(expected_length)
+
+def test_setitem_invalidates():
+    curve = make_curve()
+    before = geometry(curve)
+    curve[2] = Point(90.2, 130.7)
+    assert geometry(curve) != before
+    assert_geometry(curve, CubicBezier(*[point.clone() for point in curve.points]))
+
+def test_round_invalidates():
+    curve = make_curve()
+    before = geometry(curve)
+    curve.round()
+    assert geometry(curve) != before
+    assert_geometry(curve, CubicBezier(*[point.rounded() for point in make_curve().points]))
+
+def test_translate_invalidates():
+    path = BezierPath.fromSegments([make_curve()])
+    for segment in path.asSegments():
+        geometry(segment)
+    path.translate(Point(15, -25))
+    [segment] = path.asSegments()
+    assert_geometry(segment, make_curve().translated(Point(15, -25)))
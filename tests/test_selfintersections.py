@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+# getSelfIntersections() only intersects the segments whose boxes overlap, and must find the same
+# intersections, in the same order, as intersecting every pair of segments.
+
+from __future__ import division
+
+import random
+
+import pytest
+
+from beziers.cubicbezier import CubicBezier
+from beziers.line import Line
+from beziers.path import BezierPath
+from beziers.point import Point
+from beziers.utils.linesweep import overlapping_pairs
+
+def random_point(rng):
+    return Point(rng.uniform(0, 1000), rng.uniform(0, 1000))
+
+def make_path(seed, count):
+    # A closed contour of random lines and curves, which crosses itself many times.
+    rng = random.Random(seed)
+    points = [random_point(rng) for _ in range(count)]
+    segments = []
+    for k, start in enumerate(points):
+        end = points[(k + 1) % count]
+        if k % 3:
+            segments.append(CubicBezier(start, random_point(rng), random_point(rng), end))
+        else:
+            segments.append(Line(start, end))
+    return BezierPath.fromSegments(segments)
+
+def brute_force_self_intersections(path):
+    segs = path.asSegments()
+    intersections = []
+    for seg in segs:
+        # The loops are found as in getSelfIntersections(), which does not check that l[1] < 1.
+        l = seg.hasLoop
+        if l and l[0] > 0 and l[0] < 1 and l[1] > 0:
+            intersections.append((seg, l[0], seg, l[1]))
+    for i1 in range(len(segs)):
+        for i2 in range(i1 + 1, len(segs)):
+            for i in segs[i1].intersections(segs[i2]):
+                if 1e-2 < i.t1 < 1 - 1e-2:
+                    intersections.append((i.seg1, i.t1, i.seg2, i.t2))
+    return intersections
+
+def random_box(rng):
+    left, bottom = rng.uniform(0, 1000), rng.uniform(0, 1000)
+    return (left, bottom, left + rng.uniform(0, 100), bottom + rng.uniform(0, 100))
+
+def overlaps(box, other):
+    return box[0] <= other[2] and other[0] <= box[2] and box[1] <= other[3] and other[1] <= box[3]
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_overlapping_pairs(seed):
+    rng = random.Random(seed)
+    boxes = [random_box(rng) for _ in range(200)]
+    # Boxes which only touch count as overlapping.
+    boxes.append((boxes[0][2], boxes[0][3], boxes[0][2] + 10, boxes[0][3] + 10))
+    other_boxes = [random_box(rng) for _ in range(50)]
+    expected = [(i, j) for i in range(len(boxes)) for j in range(i + 1, len(boxes)) if overlaps(boxes[i], boxes[j])]
+    assert (0, len(boxes) - 1) in expected
+    assert overlapping_pairs(boxes) == expected
+    expected = [(i, j) for i in range(len(boxes)) for j in range(len(other_boxes)) if overlaps(boxes[i], other_boxes[j])]
+    assert overlapping_pairs(boxes, other_boxes) == expected
+
+@pytest.mark.parametrize('seed, count', [(5, 12), (6, 40), (7, 60)])
+def test_random_paths(seed, count):
+    path = make_path(seed, count)
+    expected = brute_force_self_intersections(path)
+    assert expected
+    intersections = [(i.seg1, i.t1, i.seg2, i.t2) for i in path.getSelfIntersections()]
+    assert len(intersections) == len(expected)
+    for actual, wanted in zip(intersections, expected):
+        assert actual[0] is wanted[0] and actual[2] is wanted[2]
+        assert actual[1] == pytest.approx(wanted[1]) and actual[3] == pytest.approx(wanted[3])